@@ -1,13 +1,17 @@
 import streamlit as st
-import json
-import pandas as pd
+from data_layer import get_catalog, get_movie_cards, get_movie_listing, get_popularity, cache_stats, pin_snapshot
+from metrics import count, span
+from widgets import end_page, start_page
 
-# Load movie data
-def load_movies():
-    with open("movies.json", "r") as file:
-        return json.load(file)
+start_page("app")
 
-movies = load_movies()
+# Load data from one snapshot for the whole rerun; a new snapshot is built in
+# the background when the data files change
+with span("app.load_data"):
+    pin_snapshot()
+    catalog = get_catalog()
+    popularity = get_popularity()
+    movie_cards = get_movie_cards()
 
 st.set_page_config(page_title="Movie Recommender", layout="wide")
 
@@ -36,45 +40,47 @@ st.markdown('<p class="big-font">🎬 Movie Recommender System</p>', unsafe_allo
 st.write("Find movies that match your preferences! 🎥")
 
 st.sidebar.header("🎭 Filter Options")
-genres = list(set(genre for movie in movies for genre in movie["genre"]))
-selected_genre = st.sidebar.selectbox("Choose a genre", ["All"] + genres)
+selected_genre = st.sidebar.selectbox("Choose a genre", ["All"] + catalog.genres)
 sort_option = st.sidebar.selectbox("Sort by", ["Rating (High to Low)", "Rating (Low to High)", "Year (Newest First)", "Year (Oldest First)"])
 
-def filter_and_sort_movies(movies, genre, sort_option):
-    filtered = movies if genre == "All" else [movie for movie in movies if genre in movie["genre"]]
-    if sort_option == "Rating (High to Low)":
-        return sorted(filtered, key=lambda x: x["rating"], reverse=True)
-    elif sort_option == "Rating (Low to High)":
-        return sorted(filtered, key=lambda x: x["rating"])
-    elif sort_option == "Year (Newest First)":
-        return sorted(filtered, key=lambda x: x["release_year"], reverse=True)
-    elif sort_option == "Year (Oldest First)":
-        return sorted(filtered, key=lambda x: x["release_year"])
-    return filtered
+# Only one page of cards is rendered per rerun
+PAGE_SIZES = [10, 25, 50, 100]
+page_size = st.sidebar.selectbox("Movies per page", PAGE_SIZES, index=1)
 
-filtered_movies = filter_and_sort_movies(movies, selected_genre, sort_option)
+# Filtered and sorted once per genre/sort option, then only sliced per page
+with span("app.listing"):
+    movie_ids = get_movie_listing(selected_genre, sort_option)
+page_count = max(1, -(-len(movie_ids) // page_size))
+# A new key per listing starts every new filter on page 1
+page = st.sidebar.number_input(
+    f"Page (1-{page_count})", min_value=1, max_value=page_count, value=1, step=1,
+    key=f"page:{selected_genre}:{sort_option}:{page_size}",
+)
+
+with st.sidebar.expander("🗄️ Data Cache"):
+    st.write(cache_stats())
+    st.write({"movie_cards": movie_cards.stats()})
+
+start = (page - 1) * page_size
+page_ids = movie_ids[start:start + page_size]
 
 left_col, right_col = st.columns([3, 1])
 
 with left_col:
     st.subheader(f"🎬 Movies in {selected_genre} Genre")
-    for movie in filtered_movies:
-        st.markdown(f"""
-        <div class="movie-card">
-        <p class="movie-title">{movie['title']}</p>
-        <p class="movie-details"><b>Year:</b> {movie['release_year']}<br>
-        <b>Genre:</b> {', '.join(movie['genre'])}<br>
-        <b>Rating:</b> {'⭐' * int(movie['rating']//2)} ({movie['rating']})</p>
-        </div>
-        """, unsafe_allow_html=True)
+    if len(page_ids):
+        st.caption(f"Showing {start + 1}-{start + len(page_ids)} of {len(movie_ids)} movies")
+    # The whole page goes out as one HTML block of pre-rendered cards
+    with span("app.render"):
+        st.markdown(movie_cards.cards_for_ids(page_ids, layout="listing"), unsafe_allow_html=True)
+    count("app.cards_rendered", len(page_ids))
 
 with right_col:
-    st.subheader("🏆 Top 5 Rated Movies")
-    top_movies = sorted(movies, key=lambda x: x["rating"], reverse=True)[:5]
-    for idx, movie in enumerate(top_movies):
-        st.markdown(f"""
-        <div class="movie-card">
-        <p class="movie-title">{idx+1}. {movie['title']}</p>
-        <p class="movie-details"><b>Rating:</b> {'⭐' * int(movie['rating']//2)} ({movie['rating']})</p>
-        </div>
-        """, unsafe_allow_html=True)
\ No newline at end of file
+    st.subheader("🏆 Top 5 Popular Movies")
+    # Ratings weighted by how many users watched each movie (popularity.py)
+    with span("app.top_popular"):
+        top_movies = popularity.top(5)
+    with span("app.render"):
+        st.markdown(movie_cards.cards(top_movies, layout="rating", ranked=True), unsafe_allow_html=True)
+
+end_page()
@@ -0,0 +1,91 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from functools import partial
+import recommenders
+
+# Offline batch job: run all four strategies for every user and write the
+# results to a JSON-lines file (one user per line) that user_recommendations.py
+# serves directly while it is newer than movies.json and users.json.
+#
+# Users are split into chunks of rows and spread over a process pool. The
+# catalog, users and indexes are built once in the parent; with the "fork"
+# start method the workers share that memory read-only (copy-on-write), with
+# "spawn" each worker builds its own copy once in the pool initializer.
+# Finished chunks are written to disk as they arrive, in user order.
+
+RECOMMENDATIONS_FILE = "recommendations.jsonl"
+
+_context = None
+
+def _init_worker(movies_file, users_file):
+    global _context
+    if _context is None:
+        _context = recommenders.build_context(movies_file, users_file)
+
+def _recommend_rows(rows, k, neighbours=2):
+    # One sparse matrix product finds the similar users of the whole chunk
+    users = _context.users
+    similar_lists = _context.engine.neighbours_batch(list(rows), k=neighbours)
+    lines = []
+    for row, neighbour_list in zip(rows, similar_lists):
+        user = users[row]
+        similar = [{"user": users[n], "similarity_score": common} for n, _, common in neighbour_list]
+        recommendations = recommenders.recommend_all(_context, user, k=k, similar=similar)
+        lines.append(json.dumps({
+            "user_id": user["user_id"],
+            "recommendations": {name: recommenders.to_stored(recs) for name, recs in recommendations.items()},
+        }))
+    return "".join(line + "\n" for line in lines), len(lines)
+
+def run_batch(movies_file="movies.json", users_file="users.json", out_file=RECOMMENDATIONS_FILE,
+              workers=None, chunk_size=500, k=3, progress=True):
+    global _context
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size must be at least 1, got {chunk_size}")
+    _context = recommenders.build_context(movies_file, users_file)
+    total = len(_context.users)
+    chunks = [range(start, min(start + chunk_size, total)) for start in range(0, total, chunk_size)]
+
+    done = 0
+    start_time = time.perf_counter()
+    # Write to a temporary file and rename at the end so the pages never read
+    # a half-written result
+    temp_file = out_file + ".tmp"
+    try:
+        with open(temp_file, "w") as file:
+            with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(movies_file, users_file)) as pool:
+                for text, count in pool.imap(partial(_recommend_rows, k=k), chunks):
+                    file.write(text)
+                    done += count
+                    if progress:
+                        elapsed = time.perf_counter() - start_time
+                        print(f"\r{done}/{total} users ({done / elapsed:,.0f} users/s)", end="", file=sys.stderr)
+        os.replace(temp_file, out_file)
+    finally:
+        # A failed or interrupted run leaves the old results and no partial file
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+    elapsed = time.perf_counter() - start_time
+    if progress:
+        print(file=sys.stderr)
+    return {"users": done, "seconds": elapsed, "users_per_second": done / elapsed if elapsed else 0.0}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute all four recommendation strategies for every user.")
+    parser.add_argument("--movies", default="movies.json")
+    parser.add_argument("--users", default="users.json")
+    parser.add_argument("--out", default=RECOMMENDATIONS_FILE)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=500, help="users per task")
+    parser.add_argument("-k", type=int, default=3, help="recommendations per strategy")
+    args = parser.parse_args()
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be at least 1")
+
+    stats = run_batch(args.movies, args.users, args.out, args.workers, args.chunk_size, args.k)
+    print(f"Wrote recommendations for {stats['users']} users to {args.out} "
+          f"in {stats['seconds']:.2f}s ({stats['users_per_second']:,.0f} users/s)")
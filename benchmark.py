@@ -0,0 +1,192 @@
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import load_data
+import recommenders
+from metrics import percentile
+from synthetic_data import GENRES, generate_dataset
+
+# Benchmark suite: generates a synthetic catalog and user base at each scale,
+# times the load_data functions and the four recommendation strategies, and
+# saves the results as JSON so two runs can be compared.
+#
+# Every operation is run `repeat` times with varying arguments (random genres
+# and users from a seeded generator) and reported as latency percentiles in
+# milliseconds. Peak memory is measured in a separate tracemalloc pass, because
+# tracing every allocation slows the timed runs down.
+#
+#   python benchmark.py --scale small --out bench.json
+#   python benchmark.py --scale small --compare bench.json
+
+SCALES = {
+    "small": {"movies": 10_000, "users": 1_000},
+    "medium": {"movies": 100_000, "users": 100_000},
+    "large": {"movies": 1_000_000, "users": 100_000},
+}
+PERCENTILES = (50, 90, 95, 99)
+REGRESSION_THRESHOLD = 1.25
+# Slowdowns smaller than this are timer noise, whatever the ratio
+MIN_REGRESSION_MS = 0.1
+
+def summarize(seconds):
+    ms = sorted(s * 1000 for s in seconds)
+    summary = {"runs": len(ms), "min_ms": ms[0], "mean_ms": statistics.fmean(ms), "max_ms": ms[-1]}
+    for p in PERCENTILES:
+        summary[f"p{p}_ms"] = percentile(ms, p)
+    return summary
+
+def peak_memory(call):
+    # Peak Python heap (bytes) allocated while the call runs, beyond what was
+    # already allocated before it
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        call()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak - before
+
+def measure(call, args, repeat):
+    # call(*args[i % len(args)]) for each run; the first argument set is
+    # reused for the memory pass
+    seconds = []
+    for i in range(repeat):
+        arguments = args[i % len(args)]
+        start = time.perf_counter()
+        call(*arguments)
+        seconds.append(time.perf_counter() - start)
+    result = summarize(seconds)
+    result["peak_memory_bytes"] = peak_memory(lambda: call(*args[0]))
+    return result
+
+def _max_rss_bytes():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return rss if sys.platform == "darwin" else rss * 1024
+
+def run_scale(movie_count, user_count, seed=0, repeat=50, load_repeat=3, data_dir=None, log=print):
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory(dir=data_dir) as directory:
+        movies_file = os.path.join(directory, "movies.json")
+        users_file = os.path.join(directory, "users.json")
+        start = time.perf_counter()
+        generate_dataset(movies_file, users_file, movie_count, user_count, seed)
+        log(f"  generated data in {time.perf_counter() - start:.1f}s")
+
+        results = {}
+        def record(name, call, args, runs=repeat):
+            results[name] = measure(call, args, runs)
+            log(f"  {name:<32} p50 {results[name]['p50_ms']:10.3f} ms   p99 {results[name]['p99_ms']:10.3f} ms")
+
+        record("load_movies", load_data.load_movies, [(movies_file,)], load_repeat)
+        record("load_users", load_data.load_users, [(users_file,)], load_repeat)
+        movies = load_data.load_movies(movies_file)
+        users = load_data.load_users(users_file)
+
+        genre_args = [(movies, rng.choice(GENRES)) for _ in range(repeat)]
+        user_args = [(users, rng.choice(users)["user_id"]) for _ in range(repeat)]
+        record("get_movies_by_genre", load_data.get_movies_by_genre, genre_args)
+        record("get_top_rated_movies", load_data.get_top_rated_movies, [(movies,)])
+        record("get_user_favorites", load_data.get_user_favorites, user_args)
+
+        # The indexed paths the pages actually use
+        record("load_catalog", load_data.load_catalog, [(movies_file,)], load_repeat)
+        record("load_catalog[compact]", load_data.load_catalog, [(movies_file, True)], load_repeat)
+        catalog = load_data.load_catalog(movies_file)
+        record("get_movies_by_genre[catalog]", load_data.get_movies_by_genre,
+               [(catalog, genre) for _, genre in genre_args])
+        record("get_top_rated_movies[catalog]", load_data.get_top_rated_movies, [(catalog,)])
+
+        record("build_context", recommenders.build_context, [(movies_file, users_file)], load_repeat)
+        context = recommenders.build_context(movies_file, users_file)
+        sample_users = [(context, rng.choice(users)) for _ in range(repeat)]
+        for name, strategy in recommenders.ALL_STRATEGIES.items():
+            record(f"strategy.{name}", strategy, sample_users)
+
+    return {
+        "movies": movie_count,
+        "users": user_count,
+        "watched_entries": sum(len(user["watched_movies"]) for user in users),
+        "operations": results,
+    }
+
+def run_benchmarks(scales, seed=0, repeat=50, load_repeat=3, data_dir=None, log=print):
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": seed,
+            "repeat": repeat,
+            "load_repeat": load_repeat,
+        },
+        "scales": {},
+    }
+    for name, sizes in scales.items():
+        log(f"{name}: {sizes['movies']:,} movies, {sizes['users']:,} users")
+        report["scales"][name] = run_scale(sizes["movies"], sizes["users"], seed, repeat, load_repeat, data_dir, log)
+    report["meta"]["max_rss_bytes"] = _max_rss_bytes()
+    return report
+
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD, metric="p50_ms", min_ms=MIN_REGRESSION_MS):
+    # [(scale, operation, baseline_value, current_value, ratio), ...] for every
+    # operation that got slower than threshold times its baseline
+    regressions = []
+    for scale, result in current["scales"].items():
+        old_operations = baseline.get("scales", {}).get(scale, {}).get("operations", {})
+        for operation, stats in result["operations"].items():
+            old = old_operations.get(operation)
+            if not old or old[metric] <= 0:
+                continue
+            ratio = stats[metric] / old[metric]
+            if ratio > threshold and stats[metric] - old[metric] >= min_ms:
+                regressions.append((scale, operation, old[metric], stats[metric], ratio))
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the data functions and recommendation strategies on synthetic data.")
+    parser.add_argument("--scale", action="append", choices=sorted(SCALES),
+                        help="preset size to run, may be repeated (default: small)")
+    parser.add_argument("--movies", type=int, help="custom number of movies (use with --users)")
+    parser.add_argument("--users", type=int, help="custom number of users (use with --movies)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=50, help="runs per query operation")
+    parser.add_argument("--load-repeat", type=int, default=3, help="runs per load/build operation")
+    parser.add_argument("--data-dir", help="where to write the temporary data files")
+    parser.add_argument("--out", default="benchmark_results.json")
+    parser.add_argument("--compare", metavar="BASELINE", help="earlier results file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="p50 slowdown ratio counted as a regression")
+    args = parser.parse_args()
+
+    if args.movies or args.users:
+        if not (args.movies and args.users):
+            parser.error("--movies and --users must be given together")
+        scales = {f"custom-{args.movies}x{args.users}": {"movies": args.movies, "users": args.users}}
+    else:
+        scales = {name: SCALES[name] for name in args.scale or ["small"]}
+
+    report = run_benchmarks(scales, args.seed, args.repeat, args.load_repeat, args.data_dir)
+    with open(args.out, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {args.out}")
+
+    if args.compare:
+        with open(args.compare, "r") as file:
+            baseline = json.load(file)
+        regressions = compare(baseline, report, args.threshold)
+        for scale, operation, old, new, ratio in regressions:
+            print(f"REGRESSION {scale} {operation}: p50 {old:.3f} ms -> {new:.3f} ms ({ratio:.2f}x)")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions above {args.threshold:.2f}x")
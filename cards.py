@@ -0,0 +1,95 @@
+# Movie-card HTML shared by the Streamlit pages.
+# Every page shows movies as the same "movie-card" block (title, genres, star
+# rating, year). The static part of a card only depends on the movie, so it is
+# rendered once and kept; a rerun just joins the stored fragments and fills in
+# the per-page slots (a rank before the title, a "Recommended because" line).
+#
+# One MovieCards instance belongs to one catalog version: data_layer builds a
+# new one, with an empty fragment cache, whenever movies.json changes.
+
+FIELDS = {
+    "year": lambda movie: f"<b>Year:</b> {movie['release_year']}",
+    "genre": lambda movie: f"<b>Genre:</b> {', '.join(movie['genre'])}",
+    "rating": lambda movie: f"<b>Rating:</b> {'⭐' * int(movie['rating']//2)} ({movie['rating']})",
+    "release_year": lambda movie: f"<b>Release Year:</b> {movie['release_year']}",
+}
+
+# Which detail lines each kind of card shows, in order
+LAYOUTS = {
+    "full": ("genre", "rating", "release_year"),
+    "listing": ("year", "genre", "rating"),
+    "genre_rating": ("genre", "rating"),
+    "rating_year": ("rating", "release_year"),
+    "rating": ("rating",),
+}
+
+_HEAD = '<div class="movie-card">\n<p class="movie-title">'
+_TAIL = '\n</p>\n</div>\n'
+
+def _fragment(movie, layout):
+    # Everything between the opening of the title and the end of the details
+    details = "<br>\n".join(FIELDS[field](movie) for field in LAYOUTS[layout])
+    return f'{movie["title"]}</p>\n<p class="movie-details">\n{details}'
+
+class MovieCards:
+    def __init__(self, catalog, version=None):
+        self.catalog = catalog
+        self.version = version
+        # (movie_id, layout) -> title and detail lines, ready to join
+        self.fragments = {}
+        self.hits = 0
+        self.misses = 0
+
+    def fragment(self, movie_id, layout="full"):
+        key = (movie_id, layout)
+        fragment = self.fragments.get(key)
+        if fragment is not None:
+            self.hits += 1
+            return fragment
+        self.misses += 1
+        fragment = _fragment(self.catalog[movie_id], layout)
+        self.fragments[key] = fragment
+        return fragment
+
+    def card(self, movie, reason=None, layout="full", rank=None, reason_label="Recommended because"):
+        # Movies that are not in the catalog (should not happen) are rendered
+        # directly instead of cached
+        movie_id = self.catalog.movie_id(movie["title"])
+        if movie_id is None:
+            fragment = _fragment(movie, layout)
+        else:
+            fragment = self.fragment(movie_id, layout)
+        prefix = f"{rank}. " if rank is not None else ""
+        reason_line = f"<br>\n<b>{reason_label}:</b> {reason}" if reason is not None else ""
+        return f"{_HEAD}{prefix}{fragment}{reason_line}{_TAIL}"
+
+    def cards_for_ids(self, movie_ids, layout="full"):
+        # Cards straight from movie IDs: cached fragments never touch the movie
+        return "\n".join(f"{_HEAD}{self.fragment(int(movie_id), layout)}{_TAIL}" for movie_id in movie_ids)
+
+    def cards(self, movies, layout="full", reasons=None, ranked=False, reason_label="Recommended because"):
+        # One HTML block for a whole list, for a single st.markdown call
+        parts = []
+        for position, movie in enumerate(movies):
+            reason = reasons[position] if reasons is not None else None
+            rank = position + 1 if ranked else None
+            parts.append(self.card(movie, reason, layout, rank, reason_label))
+        return "\n".join(parts)
+
+    def recommendations(self, recommendations, layout="full"):
+        # [{"movie": ..., "reason": ...}, ...] as returned by recommenders.py
+        return self.cards(
+            [rec["movie"] for rec in recommendations],
+            layout,
+            reasons=[rec["reason"] for rec in recommendations],
+        )
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "version": self.version,
+            "fragments": len(self.fragments),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
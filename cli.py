@@ -0,0 +1,195 @@
+import argparse
+import json
+import subprocess
+import sys
+from load_data import get_movies_by_year, load_catalog, load_users
+import recommenders
+
+# Headless command line for the recommendation logic:
+#   python -m cli movies --genre Sci-Fi --since 2010 --sort year
+#   python -m cli top-rated -n 5 --genre Drama
+#   python -m cli favorites 101
+#   python -m cli recommend 101 --strategy similar_users
+#   python -m cli import-budget
+# Only the standard library and the modules it uses are imported up front (plus
+# NumPy when a compiled catalog is opened). SciPy is imported only by the
+# strategies that need the user x movie matrix (similar_users, hybrid), and
+# Streamlit, pandas and the plotting libraries never.
+#
+# import-budget runs a command in a fresh interpreter with -X importtime and
+# fails if its imports take longer than the budget or pull in a package that
+# has no business in a headless start (--allow scipy when measuring one of the
+# SciPy strategies).
+
+IMPORT_BUDGET_SECONDS = 0.25
+FORBIDDEN_MODULES = ("streamlit", "pandas", "scipy", "sklearn", "matplotlib", "plotly")
+SORT_KEYS = {"rating": "rating_order", "year": "year_order"}
+
+def _print_json(value):
+    # default=dict: movies of a compact catalog are read-only mappings, not dicts
+    print(json.dumps(value, indent=2, ensure_ascii=False, default=dict))
+
+def _print_movies(movies):
+    for movie in movies:
+        print(f"{movie['title']} ({movie['release_year']}) - {', '.join(movie['genre'])} - {movie['rating']}")
+
+def _show(movies, args):
+    if args.json:
+        _print_json(movies)
+    else:
+        _print_movies(movies)
+
+def _context(catalog, users, strategies):
+    # The collaborative engine and the hybrid scorer need SciPy; build them
+    # only for the strategies that use them
+    from ranking import Leaderboards
+    from profiles import UserProfileStore
+    engine = scorer = None
+    if {"similar_users", "hybrid"} & set(strategies):
+        from collaborative import CollaborativeEngine
+        engine = CollaborativeEngine(users, catalog)
+    if "hybrid" in strategies:
+        from hybrid import HybridScorer
+        scorer = HybridScorer(catalog, engine)
+    return recommenders.RecommenderContext(
+        catalog, users, engine, Leaderboards(catalog), UserProfileStore(catalog, users), scorer)
+
+def _user(users, user_id):
+    for user in users:
+        if user["user_id"] == user_id:
+            return user
+    sys.exit(f"Unknown user: {user_id}")
+
+def movies_command(args):
+    catalog = load_catalog(args.movies, compact=args.compact)
+    if args.genre is not None:
+        if args.genre not in catalog.genres:
+            sys.exit(f"Unknown genre: {args.genre} (expected one of {', '.join(catalog.genres)})")
+        movie_ids = catalog.sort_ids(catalog.genre_index.ids(args.genre), by=args.sort)
+    else:
+        movie_ids = getattr(catalog, SORT_KEYS[args.sort])
+    movies = (catalog[i] for i in movie_ids)
+    if args.since is not None:
+        movies = get_movies_by_year(movies, args.since)
+    _show(list(movies)[:args.limit], args)
+
+def top_rated_command(args):
+    from ranking import Leaderboards
+    catalog = load_catalog(args.movies, compact=args.compact)
+    _show(Leaderboards(catalog).top(args.n, genre=args.genre), args)
+
+def favorites_command(args):
+    titles = _user(load_users(args.users), args.user_id)["watched_movies"]
+    if args.json:
+        _print_json(titles)
+    else:
+        print("\n".join(titles))
+
+def recommend_command(args):
+    catalog = load_catalog(args.movies, compact=args.compact)
+    users = load_users(args.users)
+    user = _user(users, args.user_id)
+    names = [args.strategy] if args.strategy else list(recommenders.STRATEGIES)
+    context = _context(catalog, users, names)
+    results = {name: recommenders.ALL_STRATEGIES[name](context, user, k=args.k) for name in names}
+    if args.json:
+        _print_json({name: [{"movie": r["movie"], "reason": r["reason"]} for r in recs]
+                     for name, recs in results.items()})
+        return
+    for name, recs in results.items():
+        print(f"{name}:")
+        for rec in recs:
+            print(f"  {rec['movie']['title']} - {rec['reason']}")
+
+def import_report(command, python=sys.executable):
+    # Top-level imports of `python -X importtime -m cli <command>` as
+    # (seconds in total, every module imported)
+    completed = subprocess.run(
+        [python, "-X", "importtime", "-m", "cli"] + command,
+        capture_output=True, text=True,
+    )
+    total_us = 0
+    modules = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules.append(name.strip())
+        if not name.startswith("  "):
+            # Not nested in another import, so not counted yet
+            total_us += int(cumulative)
+    return total_us / 1e6, modules, completed.returncode
+
+def import_budget_command(args):
+    command = args.run or ["--movies", args.movies, "movies", "--limit", "1"]
+    seconds, modules, returncode = import_report(command)
+    forbidden = set(FORBIDDEN_MODULES) - set(args.allow)
+    forbidden = sorted(set(m.split(".")[0] for m in modules) & forbidden)
+    print(f"python -m cli {' '.join(command)}: {len(modules)} modules imported in {seconds * 1000:.1f} ms "
+          f"(budget {args.budget * 1000:.0f} ms)")
+    failures = []
+    if returncode != 0:
+        failures.append(f"command exited with status {returncode}")
+    if seconds > args.budget:
+        failures.append(f"imports took {seconds * 1000:.1f} ms")
+    if forbidden:
+        failures.append(f"imported {', '.join(forbidden)}")
+    if failures:
+        sys.exit("Import budget exceeded: " + "; ".join(failures))
+    print("OK")
+
+def _add_data_options(parser, suppress=False):
+    # Also accepted after the command, where they only override the ones given
+    def default(value):
+        return argparse.SUPPRESS if suppress else value
+    parser.add_argument("--movies", default=default("movies.json"))
+    parser.add_argument("--users", default=default("users.json"))
+    parser.add_argument("--json", action="store_true", default=default(False), help="print JSON instead of text")
+    parser.add_argument("--compact", action="store_true", default=default(False),
+                        help="keep movies as typed arrays instead of dicts")
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m cli", description="Headless movie recommender.")
+    _add_data_options(parser)
+    data_options = argparse.ArgumentParser(add_help=False)
+    _add_data_options(data_options, suppress=True)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    movies = commands.add_parser("movies", parents=[data_options],
+                                 help="list movies, optionally filtered and sorted")
+    movies.add_argument("--genre")
+    movies.add_argument("--since", type=int, help="only movies released in or after this year")
+    movies.add_argument("--sort", choices=sorted(SORT_KEYS), default="rating", help="best or newest first")
+    movies.add_argument("--limit", type=int, default=20)
+    movies.set_defaults(handler=movies_command)
+
+    top_rated = commands.add_parser("top-rated", parents=[data_options], help="highest-rated movies")
+    top_rated.add_argument("-n", type=int, default=3)
+    top_rated.add_argument("--genre")
+    top_rated.set_defaults(handler=top_rated_command)
+
+    favorites = commands.add_parser("favorites", parents=[data_options], help="a user's watched movies")
+    favorites.add_argument("user_id", type=int)
+    favorites.set_defaults(handler=favorites_command)
+
+    recommend = commands.add_parser("recommend", parents=[data_options], help="recommendations for a user")
+    recommend.add_argument("user_id", type=int)
+    recommend.add_argument("--strategy", choices=list(recommenders.ALL_STRATEGIES),
+                           help="default: all but hybrid")
+    recommend.add_argument("-k", type=int, default=3)
+    recommend.set_defaults(handler=recommend_command)
+
+    budget = commands.add_parser("import-budget", help="check the import time of a headless command")
+    budget.add_argument("--budget", type=float, default=IMPORT_BUDGET_SECONDS, help="seconds")
+    budget.add_argument("--allow", action="append", default=[], choices=FORBIDDEN_MODULES,
+                        help="package the command may import")
+    budget.add_argument("run", nargs=argparse.REMAINDER, help="command to measure (default: movies --limit 1)")
+    budget.set_defaults(handler=import_budget_command)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.handler(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import numpy as np
+from scipy import sparse
+from load_data import load_catalog, load_users, uses_catalog_ids
+from ranking import argtop_k
+
+# Collaborative filtering on a sparse user x movie matrix.
+# Row r is a user (in users.json order), column c is a movie ID from the
+# MovieCatalog, and a 1 means "this user watched this movie". Multiplying the
+# matrix by its transpose counts the movies every pair of users has in common,
+# so one sparse product replaces the Python loop over all users.
+
+METRICS = ("overlap", "jaccard", "cosine")
+
+class CollaborativeEngine:
+    def __init__(self, users, catalog):
+        self.catalog = catalog
+        self.rows = {}
+        if uses_catalog_ids(users, catalog):
+            # Compiled users already store watch histories as CSR movie IDs
+            self.users = users
+            self.user_ids = users.user_ids.tolist()
+            for row, user_id in enumerate(self.user_ids):
+                self.rows.setdefault(user_id, row)
+            indptr = np.asarray(users.watch_offsets, dtype=np.int64)
+            indices = np.asarray(users.watch_ids, dtype=np.int64)
+        else:
+            self.users = list(users)
+            self.user_ids = [user["user_id"] for user in self.users]
+            indptr = [0]
+            indices = []
+            for row, user in enumerate(self.users):
+                self.rows.setdefault(user["user_id"], row)
+                # Titles missing from the catalog have no column, duplicates count once
+                movie_ids = set(catalog.movie_id(title) for title in user["watched_movies"])
+                movie_ids.discard(None)
+                indices.extend(sorted(movie_ids))
+                indptr.append(len(indices))
+            indptr = np.array(indptr, dtype=np.int64)
+            indices = np.array(indices, dtype=np.int64)
+        data = np.ones(len(indices), dtype=np.float32)
+        self.matrix = sparse.csr_matrix((data, indices, indptr), shape=(len(self.users), len(catalog)))
+        # Compiled histories keep repeated watches; a movie counts once per user
+        self.matrix.sum_duplicates()
+        self.matrix.data[:] = 1
+        self.transposed = self.matrix.T.tocsr()
+        self.history_sizes = np.diff(self.matrix.indptr).astype(np.float32)
+
+    def row_of(self, user_id):
+        return self.rows.get(user_id)
+
+    def user_id(self, row):
+        return self.user_ids[row]
+
+    def watched_ids(self, row):
+        start, end = self.matrix.indptr[row], self.matrix.indptr[row + 1]
+        return self.matrix.indices[start:end]
+
+    def overlaps(self, rows):
+        # One sparse product: (batch x movies) @ (movies x users) -> common counts
+        return (self.matrix[rows] @ self.transposed).tocsr()
+
+    def _scores(self, row, users, common, metric):
+        if metric == "overlap":
+            return common
+        sizes = self.history_sizes[users]
+        if metric == "jaccard":
+            return common / (self.history_sizes[row] + sizes - common)
+        if metric == "cosine":
+            return common / np.sqrt(self.history_sizes[row] * sizes)
+        raise ValueError(f"Unknown similarity metric: {metric!r} (expected one of {METRICS})")
+
+    def neighbours_batch(self, rows, k=None, metric="overlap"):
+        # For each row return [(neighbour_row, score, common_count), ...] for
+        # every other user with at least one movie in common, best first.
+        # Only the non-zero entries of the product are looked at.
+        rows = list(rows)
+        product = self.overlaps(rows)
+        results = []
+        for i, row in enumerate(rows):
+            start, end = product.indptr[i], product.indptr[i + 1]
+            users = product.indices[start:end]
+            common = product.data[start:end]
+            keep = users != row
+            users, common = users[keep], common[keep]
+            scores = self._scores(row, users, common, metric)
+            # Best score first; ties keep users.json order
+            order = argtop_k(users, scores, k)
+            results.append([(int(users[j]), float(scores[j]), int(common[j])) for j in order])
+        return results
+
+    def neighbours_among(self, row, candidates, k=None, metric="overlap"):
+        # Same as neighbours() but only scores the given candidate rows, e.g.
+        # the ones an approximate index (lsh.py) returned
+        candidates = np.asarray(candidates, dtype=np.int64)
+        candidates = candidates[candidates != row]
+        if len(candidates) == 0:
+            return []
+        common = np.asarray((self.matrix[candidates] @ self.matrix[row].T).todense()).ravel()
+        keep = common > 0
+        users, common = candidates[keep], common[keep]
+        scores = self._scores(row, users, common, metric)
+        order = argtop_k(users, scores, k)
+        return [(int(users[j]), float(scores[j]), int(common[j])) for j in order]
+
+    def neighbours(self, row, k=None, metric="overlap"):
+        return self.neighbours_batch([row], k=k, metric=metric)[0]
+
+    def candidate_movies(self, row, k=10, neighbours=None, metric="overlap"):
+        # Score unwatched movies by the summed similarity of the neighbours who
+        # watched them and return [(movie_id, score), ...], best first
+        if neighbours is None:
+            neighbours = self.neighbours(row, k=20, metric=metric)
+        if not neighbours:
+            return []
+        weights = np.array([score for _, score, _ in neighbours], dtype=np.float32)
+        neighbour_rows = [neighbour for neighbour, _, _ in neighbours]
+        scores = self.matrix[neighbour_rows].T @ weights
+        scores[self.watched_ids(row)] = 0
+        candidates = np.flatnonzero(scores)
+        order = argtop_k(candidates, scores[candidates], k)
+        return [(int(candidates[j]), float(scores[candidates[j]])) for j in order]
+
+if __name__ == "__main__":
+    catalog = load_catalog("movies.json")
+    users = load_users("users.json")
+    engine = CollaborativeEngine(users, catalog)
+
+    alice = engine.row_of(101)
+    for metric in METRICS:
+        neighbours = engine.neighbours(alice, k=2, metric=metric)
+        print(f"Alice's neighbours ({metric}):", [(users[r]["name"], round(s, 3)) for r, s, _ in neighbours])
+
+    candidates = engine.candidate_movies(alice, k=3)
+    print("Candidates for Alice:", [(catalog[m]["title"], s) for m, s in candidates])
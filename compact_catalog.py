@@ -0,0 +1,128 @@
+import argparse
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Mapping
+import numpy as np
+from compiled_catalog import CompiledCatalog, movie_columns
+from load_data import MovieCatalog, iter_movies, load_movies
+from synthetic_data import generate_movies, write_records
+
+# Compact in-memory catalog: the compiled layout (compiled_catalog.py) built
+# straight from movies.json, without compiling to disk first.
+# A movie dict costs hundreds of bytes: the dict itself, a str per title, a
+# list of genre strings, a float and an int, plus the catalog's indexes over
+# them. Here a movie is a handful of array slots instead:
+#   ratings   float64          years  int32
+#   genre_offsets + genre_codes      CSR, genre codes interned to uint8
+#                                    (uint16 past 256 genres)
+#   title_offsets + title pool       UTF-8 bytes of every title, back to back
+# plus the same sort orders, ranks and genre posting lists as a compiled
+# catalog. The movies are streamed from the file and never all held as dicts.
+#
+# catalog[movie_id] returns a MovieRecord: a two-slot view that reads its
+# fields from the arrays on access, so movie["title"] and friends work as
+# before. Records are read-only; use dict(movie) for a mutable copy (or for
+# json.dumps). Pickling or deep-copying a record gives that dict too, so a
+# copy never drags the whole catalog along.
+#
+#   python compact_catalog.py --synthetic 1000000   peak / retained memory
+#                                                   of both loaders
+
+class MovieRecord(Mapping):
+    __slots__ = ("catalog", "movie_id")
+    FIELDS = ("title", "genre", "rating", "release_year")
+
+    def __init__(self, catalog, movie_id):
+        self.catalog = catalog
+        self.movie_id = movie_id
+
+    def __getitem__(self, field):
+        if field == "title":
+            return self.catalog.title(self.movie_id)
+        if field == "genre":
+            return self.catalog.genres_of(self.movie_id)
+        if field == "rating":
+            return float(self.catalog.ratings[self.movie_id])
+        if field == "release_year":
+            return int(self.catalog.years[self.movie_id])
+        raise KeyError(field)
+
+    def __iter__(self):
+        return iter(self.FIELDS)
+
+    def __len__(self):
+        return len(self.FIELDS)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+    def __deepcopy__(self, memo):
+        # Every field is read fresh from the arrays, so this is already a deep copy
+        return dict(self)
+
+def _narrow_codes(codes, genre_count):
+    # Smallest unsigned type that holds every genre code
+    for dtype in (np.uint8, np.uint16):
+        if genre_count <= np.iinfo(dtype).max + 1:
+            return codes.astype(dtype)
+    return codes
+
+class CompactCatalog(CompiledCatalog):
+    # Same read API as load_data.MovieCatalog, backed by in-memory arrays
+    def __init__(self, movies):
+        arrays, title_pool, genre_names = movie_columns(movies)
+        arrays["genre_codes"] = _narrow_codes(arrays["genre_codes"], len(genre_names))
+        self.path = None
+        self._attach(arrays, title_pool, genre_names)
+
+    def __getitem__(self, movie_id):
+        return MovieRecord(self, int(movie_id))
+
+def load_compact_catalog(filename="movies.json"):
+    return CompactCatalog(iter_movies(filename))
+
+def memory_profile(load):
+    # (seconds, peak bytes while loading, bytes still held by the result)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        start = time.perf_counter()
+        catalog = load()
+        seconds = time.perf_counter() - start
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del catalog
+    return seconds, peak - before, retained - before
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the memory used by the dict and the compact catalog.")
+    parser.add_argument("--movies", default="movies.json")
+    parser.add_argument("--synthetic", type=int, default=None,
+                        help="generate this many movies into a temporary file instead")
+    args = parser.parse_args()
+
+    movies_file = args.movies
+    if args.synthetic is not None:
+        directory = tempfile.mkdtemp()
+        movies_file = os.path.join(directory, "movies.json")
+        write_records(generate_movies(args.synthetic), movies_file)
+
+    loaders = {
+        "dicts (load_movies + MovieCatalog)": lambda: MovieCatalog(load_movies(movies_file)),
+        "compact (CompactCatalog)": lambda: load_compact_catalog(movies_file),
+    }
+    for name, load in loaders.items():
+        seconds, peak, retained = memory_profile(load)
+        print(f"{name:<36} {seconds:6.2f} s   peak {peak / 2**20:8.1f} MiB   retained {retained / 2**20:8.1f} MiB")
+
+    if args.synthetic is not None:
+        os.remove(movies_file)
+        os.rmdir(directory)
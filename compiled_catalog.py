@@ -0,0 +1,417 @@
+import argparse
+import json
+import mmap
+import os
+import sys
+from array import array
+import numpy as np
+from load_data import iter_movies, iter_users
+
+# Compiled, column-oriented copy of movies.json and users.json.
+# Parsing JSON into Python dicts at startup costs time proportional to the
+# catalog, and every Streamlit process keeps its own copy. Compiling writes each
+# field as its own NumPy array (.npy) that pages open with mmap_mode="r"
+# (a numpy.memmap): opening is O(1), pages are read from disk only when used,
+# and the OS page cache is shared by every process reading the same files.
+#
+# Layout of the compiled directory:
+#   manifest.json            format version, counts, source file fingerprints
+#   movies/ratings.npy       float64, one per movie
+#   movies/years.npy         int32, one per movie
+#   movies/genres.json       genre names; a genre code is its position here
+#   movies/genre_offsets.npy + genre_codes.npy   CSR: genres of each movie
+#   movies/posting_offsets.npy + posting_ids.npy CSR: movies of each genre
+#   movies/title_offsets.npy + titles.bin        UTF-8 title string pool
+#   movies/title_order.npy   movie IDs sorted by title, for binary search
+#   movies/rating_order.npy, year_order.npy      highest rated / newest first
+#   movies/rating_rank.npy, year_rank.npy        position in those orders
+#   users/user_ids.npy       int64, one per user
+#   users/name_offsets.npy + names.bin           UTF-8 name string pool
+#   users/watch_offsets.npy + watch_ids.npy      CSR: movie IDs each user watched,
+#                            exactly as listed in users.json (order and repeats kept)
+# A compiled user reads back the same watch history as its JSON user, so
+# compiling refuses users.json files that name movies missing from movies.json.
+
+FORMAT_VERSION = 2
+MANIFEST = "manifest.json"
+MOVIE_ARRAYS = ("ratings", "years", "genre_offsets", "genre_codes", "title_offsets", "title_order",
+                "rating_order", "year_order", "rating_rank", "year_rank")
+POSTING_ARRAYS = ("posting_offsets", "posting_ids")
+
+def _fingerprint(filename):
+    stat = os.stat(filename)
+    return {"path": os.path.abspath(filename), "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+def _string_pool(strings):
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return offsets, b"".join(encoded)
+
+def _csr(lists, dtype):
+    offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+    np.cumsum([len(values) for values in lists], out=offsets[1:])
+    values = np.fromiter((v for values in lists for v in values), dtype=dtype, count=int(offsets[-1]))
+    return offsets, values
+
+def _stable_desc_order(values):
+    # Same order as sorted(..., reverse=True): highest first, ties keep file order
+    return np.argsort(-values, kind="stable").astype(np.int32)
+
+def _ranks(order):
+    rank = np.empty(len(order), dtype=np.int32)
+    rank[order] = np.arange(len(order), dtype=np.int32)
+    return rank
+
+def _title_order(title_pool, title_offsets):
+    # Movie IDs sorted by title, ties in ID order. UTF-8 bytes sort like the
+    # strings they encode, so the pool is sorted without decoding it: NumPy
+    # sorts on the first 8 bytes of each title, and only runs of titles that
+    # share those 8 bytes are compared in full.
+    count = len(title_offsets) - 1
+    pool = np.frombuffer(title_pool, dtype=np.uint8) if len(title_pool) else np.zeros(1, dtype=np.uint8)
+    starts, ends = title_offsets[:-1], title_offsets[1:]
+    prefixes = np.zeros(count, dtype=np.uint64)
+    for i in range(8):
+        positions = starts + i
+        byte = np.where(positions < ends, pool[np.minimum(positions, len(pool) - 1)], 0)
+        prefixes = (prefixes << np.uint64(8)) | byte.astype(np.uint64)
+    order = np.argsort(prefixes, kind="stable")
+    sorted_prefixes = prefixes[order]
+    run_starts = np.flatnonzero(np.r_[True, sorted_prefixes[1:] != sorted_prefixes[:-1]])
+    run_ends = np.r_[run_starts[1:], count]
+    for start, end in zip(run_starts[run_ends - run_starts > 1].tolist(),
+                          run_ends[run_ends - run_starts > 1].tolist()):
+        run = order[start:end].tolist()
+        run.sort(key=lambda i: title_pool[int(starts[i]):int(ends[i])])
+        order[start:end] = run
+    return order.astype(np.int32)
+
+def movie_columns(movies):
+    # The movie arrays of the compiled layout, built from a stream of movie
+    # dicts without keeping them: each movie is appended to typed arrays and
+    # the title pool, then dropped. Returns (arrays by name, title pool, genre
+    # names in code order).
+    ratings = array("d")
+    years = array("i")
+    genre_offsets = array("q", [0])
+    genre_codes = array("i")
+    title_offsets = array("q", [0])
+    title_pool = bytearray()
+    codes = {}
+    for movie in movies:
+        title_pool += movie["title"].encode("utf-8")
+        title_offsets.append(len(title_pool))
+        genre_codes.extend(codes.setdefault(g, len(codes)) for g in movie["genre"])
+        genre_offsets.append(len(genre_codes))
+        ratings.append(movie["rating"])
+        years.append(movie["release_year"])
+
+    arrays = {
+        "ratings": np.frombuffer(ratings, dtype=np.float64),
+        "years": np.frombuffer(years, dtype=np.int32),
+        "genre_offsets": np.frombuffer(genre_offsets, dtype=np.int64),
+        "genre_codes": np.frombuffer(genre_codes, dtype=np.int32),
+        "title_offsets": np.frombuffer(title_offsets, dtype=np.int64),
+    }
+    count = len(ratings)
+    # Posting lists: every (genre, movie) pair once, grouped by genre in movie ID order
+    movie_of_code = np.repeat(np.arange(count, dtype=np.int64), np.diff(arrays["genre_offsets"]))
+    pairs = np.unique(arrays["genre_codes"].astype(np.int64) * max(count, 1) + movie_of_code)
+    arrays["posting_offsets"] = np.zeros(len(codes) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(pairs // max(count, 1), minlength=len(codes)), out=arrays["posting_offsets"][1:])
+    arrays["posting_ids"] = (pairs % max(count, 1)).astype(np.int32)
+    arrays["title_order"] = _title_order(title_pool, arrays["title_offsets"])
+    arrays["rating_order"] = _stable_desc_order(arrays["ratings"])
+    arrays["year_order"] = _stable_desc_order(arrays["years"])
+    arrays["rating_rank"] = _ranks(arrays["rating_order"])
+    arrays["year_rank"] = _ranks(arrays["year_order"])
+    return arrays, title_pool, list(codes)
+
+def compile_catalog(movies_file="movies.json", users_file="users.json", out_dir="catalog.compiled"):
+    movies_dir = os.path.join(out_dir, "movies")
+    users_dir = os.path.join(out_dir, "users")
+    os.makedirs(movies_dir, exist_ok=True)
+    os.makedirs(users_dir, exist_ok=True)
+    # Drop any old manifest first so a half-written directory is never considered fresh
+    if os.path.exists(os.path.join(out_dir, MANIFEST)):
+        os.remove(os.path.join(out_dir, MANIFEST))
+
+    arrays, title_pool, genre_names = movie_columns(iter_movies(movies_file))
+    count = len(arrays["ratings"])
+    movie_ids = {}
+    for movie_id in range(count):
+        movie_ids.setdefault(_pool_string(title_pool, arrays["title_offsets"], movie_id), movie_id)
+
+    user_ids, names, watched = [], [], []
+    unknown = {}
+    for user in iter_users(users_file):
+        user_ids.append(user["user_id"])
+        names.append(user["name"])
+        ids = [movie_ids.get(title) for title in user["watched_movies"]]
+        for title, movie_id in zip(user["watched_movies"], ids):
+            if movie_id is None:
+                unknown.setdefault(title, user["user_id"])
+        watched.append(ids)
+    if unknown:
+        examples = ", ".join(f"{title!r} (user {user_id})" for title, user_id in list(unknown.items())[:5])
+        raise ValueError(f"{len(unknown)} watched titles in {users_file} are not in {movies_file}, "
+                         f"e.g. {examples}; fix them before compiling")
+
+    for name in MOVIE_ARRAYS + POSTING_ARRAYS:
+        np.save(os.path.join(movies_dir, f"{name}.npy"), arrays[name])
+    with open(os.path.join(movies_dir, "titles.bin"), "wb") as file:
+        file.write(title_pool)
+    with open(os.path.join(movies_dir, "genres.json"), "w") as file:
+        json.dump(genre_names, file)
+    name_offsets, name_pool = _string_pool(names)
+    watch_offsets, watch_ids = _csr(watched, np.int32)
+    np.save(os.path.join(users_dir, "user_ids.npy"), np.array(user_ids, dtype=np.int64))
+    np.save(os.path.join(users_dir, "name_offsets.npy"), name_offsets)
+    np.save(os.path.join(users_dir, "watch_offsets.npy"), watch_offsets)
+    np.save(os.path.join(users_dir, "watch_ids.npy"), watch_ids)
+    with open(os.path.join(users_dir, "names.bin"), "wb") as file:
+        file.write(name_pool)
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "movies": {"count": count, "genres": len(genre_names), "source": _fingerprint(movies_file)},
+        "users": {"count": len(user_ids), "source": _fingerprint(users_file)},
+    }
+    # Written last: its presence marks the directory as complete
+    with open(os.path.join(out_dir, MANIFEST), "w") as file:
+        json.dump(manifest, file, indent=2)
+    return manifest
+
+def _open_array(directory, name):
+    # A plain ndarray view of the memmap: still backed by the mapped file, but
+    # indexing it skips the numpy.memmap subclass overhead
+    return np.asarray(np.load(os.path.join(directory, name), mmap_mode="r"))
+
+def _open_pool(directory, name):
+    # String pools are mapped with the standard mmap module: slicing it returns
+    # bytes directly, which is much cheaper than going through a NumPy view
+    path = os.path.join(directory, name)
+    if os.path.getsize(path) == 0:
+        return b""
+    with open(path, "rb") as file:
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+def _pool_string(pool, offsets, i):
+    return pool[int(offsets[i]):int(offsets[i + 1])].decode("utf-8")
+
+def read_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, MANIFEST), "r") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+def is_fresh(out_dir, kind, source_file):
+    # True when out_dir holds a compiled copy of exactly this source file.
+    # Compiled users store movie IDs, so they also go stale with movies.json.
+    manifest = read_manifest(out_dir)
+    if not manifest or manifest.get("format_version") != FORMAT_VERSION:
+        return False
+    try:
+        if manifest[kind]["source"] != _fingerprint(source_file):
+            return False
+        movies_source = manifest["movies"]["source"]
+        return movies_source == _fingerprint(movies_source["path"])
+    except (KeyError, OSError):
+        return False
+
+class _RecordView:
+    # Read-only list-like view that builds movie dicts on demand
+    def __init__(self, catalog, order=None):
+        self.catalog = catalog
+        self.order = order
+
+    def __len__(self):
+        return len(self.catalog)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        movie_id = index if self.order is None else self.order[index]
+        return self.catalog[movie_id]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+class CompiledGenreIndex:
+    def __init__(self, names, posting_offsets, posting_ids):
+        self.codes = {genre: code for code, genre in enumerate(names)}
+        self.names = names
+        self.genres = sorted(names)
+        self.posting_offsets = posting_offsets
+        self.posting_ids = posting_ids
+
+    def ids(self, genre):
+        code = self.codes.get(genre)
+        if code is None:
+            return self.posting_ids[:0]
+        return self.posting_ids[self.posting_offsets[code]:self.posting_offsets[code + 1]]
+
+    def any_of(self, genres):
+        result = np.empty(0, dtype=np.int32)
+        for genre in genres:
+            result = np.union1d(result, self.ids(genre))
+        return result
+
+    def all_of(self, genres):
+        genres = list(genres)
+        if not genres:
+            return np.empty(0, dtype=np.int32)
+        postings = sorted((self.ids(genre) for genre in genres), key=len)
+        result = np.asarray(postings[0])
+        for posting in postings[1:]:
+            result = np.intersect1d(result, posting, assume_unique=True)
+        return result
+
+class CompiledCatalog:
+    # Same read API as load_data.MovieCatalog, backed by memory-mapped arrays
+    def __init__(self, out_dir):
+        directory = os.path.join(out_dir, "movies")
+        self.path = out_dir
+        arrays = {name: _open_array(directory, f"{name}.npy") for name in MOVIE_ARRAYS + POSTING_ARRAYS}
+        with open(os.path.join(directory, "genres.json"), "r") as file:
+            genre_names = json.load(file)
+        self._attach(arrays, _open_pool(directory, "titles.bin"), genre_names)
+
+    def _attach(self, arrays, title_pool, genre_names):
+        for name in MOVIE_ARRAYS:
+            setattr(self, name, arrays[name])
+        self.title_pool = title_pool
+        self.genre_index = CompiledGenreIndex(genre_names, arrays["posting_offsets"], arrays["posting_ids"])
+        self.genres = self.genre_index.genres
+        self.movies = _RecordView(self)
+        self.by_rating = _RecordView(self, self.rating_order)
+        self.by_year = _RecordView(self, self.year_order)
+
+    def __len__(self):
+        return len(self.ratings)
+
+    def __iter__(self):
+        return iter(self.movies)
+
+    def title(self, movie_id):
+        return _pool_string(self.title_pool, self.title_offsets, movie_id)
+
+    def genres_of(self, movie_id):
+        start, end = self.genre_offsets[movie_id], self.genre_offsets[movie_id + 1]
+        return [self.genre_index.names[code] for code in self.genre_codes[start:end].tolist()]
+
+    def __getitem__(self, movie_id):
+        return {
+            "title": self.title(movie_id),
+            "genre": self.genres_of(movie_id),
+            "rating": float(self.ratings[movie_id]),
+            "release_year": int(self.years[movie_id]),
+        }
+
+    def movie_id(self, title):
+        # Binary search over the title-sorted IDs; first ID wins on duplicates
+        low, high = 0, len(self.title_order)
+        while low < high:
+            middle = (low + high) // 2
+            if self.title(self.title_order[middle]) < title:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self.title_order) and self.title(self.title_order[low]) == title:
+            return int(self.title_order[low])
+        return None
+
+    def __contains__(self, title):
+        return self.movie_id(title) is not None
+
+    def get(self, title, default=None):
+        movie_id = self.movie_id(title)
+        return default if movie_id is None else self[movie_id]
+
+    def lookup(self, titles):
+        movie_ids = (self.movie_id(title) for title in titles)
+        return [self[movie_id] for movie_id in movie_ids if movie_id is not None]
+
+    def ids_of(self, titles):
+        movie_ids = (self.movie_id(title) for title in titles)
+        return {movie_id for movie_id in movie_ids if movie_id is not None}
+
+    def movies_in_genre(self, genre):
+        return [self[i] for i in self.genre_index.ids(genre)]
+
+    def movies_in_any_genre(self, genres):
+        return [self[i] for i in self.genre_index.any_of(genres)]
+
+    def movies_in_all_genres(self, genres):
+        return [self[i] for i in self.genre_index.all_of(genres)]
+
+    def sort_ids(self, movie_ids, by="rating"):
+        rank = self.rating_rank if by == "rating" else self.year_rank
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        return movie_ids[np.argsort(rank[movie_ids], kind="stable")]
+
+    def top_rated(self, top_n=3, exclude=()):
+        result = []
+        for movie_id in self.rating_order:
+            if len(result) >= top_n:
+                break
+            if self.title(movie_id) not in exclude:
+                result.append(self[movie_id])
+        return result
+
+class CompiledUsers:
+    # Read-only list of user dicts backed by memory-mapped arrays
+    def __init__(self, out_dir, catalog=None):
+        directory = os.path.join(out_dir, "users")
+        self.catalog = catalog if catalog is not None else CompiledCatalog(out_dir)
+        self.user_ids = _open_array(directory, "user_ids.npy")
+        self.name_offsets = _open_array(directory, "name_offsets.npy")
+        self.name_pool = _open_pool(directory, "names.bin")
+        self.watch_offsets = _open_array(directory, "watch_offsets.npy")
+        self.watch_ids = _open_array(directory, "watch_ids.npy")
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(*row.indices(len(self)))]
+        start, end = self.watch_offsets[row], self.watch_offsets[row + 1]
+        return {
+            "user_id": int(self.user_ids[row]),
+            "name": _pool_string(self.name_pool, self.name_offsets, row),
+            "watched_movies": [self.catalog.title(i) for i in self.watch_ids[start:end]],
+        }
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self[row]
+
+    def name(self, row):
+        return _pool_string(self.name_pool, self.name_offsets, row)
+
+    def watched_ids(self, row):
+        # In watch order; a movie watched twice is listed twice
+        return self.watch_ids[self.watch_offsets[row]:self.watch_offsets[row + 1]].tolist()
+
+def open_catalog(out_dir="catalog.compiled"):
+    return CompiledCatalog(out_dir)
+
+def open_users(out_dir="catalog.compiled", catalog=None):
+    return CompiledUsers(out_dir, catalog)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile movies.json and users.json into memory-mapped arrays.")
+    parser.add_argument("--movies", default="movies.json")
+    parser.add_argument("--users", default="users.json")
+    parser.add_argument("--out", default="catalog.compiled")
+    args = parser.parse_args()
+
+    try:
+        manifest = compile_catalog(args.movies, args.users, args.out)
+    except ValueError as error:
+        sys.exit(str(error))
+    print(f"Compiled {manifest['movies']['count']} movies and {manifest['users']['count']} users into {args.out}")
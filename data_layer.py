@@ -0,0 +1,570 @@
+import os
+import threading
+import time
+import weakref
+from fingerprint import content_hash as _content_hash
+from load_data import UserDirectory, load_catalog
+from ranking import Leaderboards
+from profiles import UserProfileStore
+from recommenders import RecommenderContext, load_stored
+from result_cache import ResultCache
+from watch_log import WATCH_LOG_DIR, WatchLog, events_file, load_users_with_log
+
+# Shared data layer for the Streamlit pages.
+# Streamlit re-runs the whole page script on every widget interaction, but
+# imported modules stay loaded for the life of the server process. Keeping the
+# parsed catalog, the users and anything derived from them in this module means
+# they are built once per process and shared by every rerun and every session.
+#
+# Each cached value remembers the files it was built from. On every request we
+# only stat() those files (no read). If the mtime or size changed we hash the
+# content: if the hash is unchanged (e.g. the file was just touched) the cached
+# value is kept, otherwise it is rebuilt. A file is hashed once per stat()
+# change, however many cached values were built from it.
+#
+# Watch events recorded in the watch log (watch_log.py) count as part of the
+# users: once the log exists, its active file is a source of everything built
+# from users.json, so a new event rebuilds them with the updated histories.
+
+MOVIES_FILE = "movies.json"
+USERS_FILE = "users.json"
+RECOMMENDATIONS_FILE = "recommendations.jsonl"
+SIMILARITY_INDEX_FILE = "similar_users.lsh.npz"
+ITEM_INDEX_FILE = "similar_movies.npz"
+POPULARITY_FILE = "popularity.npz"
+# Keep movies as typed arrays (compact_catalog.py) instead of one dict each;
+# worth it for large catalogs, since every server process holds its own copy
+COMPACT_MOVIES = False
+
+def _stat(filename):
+    stat = os.stat(filename)
+    return (stat.st_mtime_ns, stat.st_size)
+
+# path -> ((mtime_ns, size), content hash): every value built from a file
+# reuses one hash of it until its stat() changes
+_digests = {}
+_digests_lock = threading.Lock()
+
+def _file_digest(filename, stat):
+    # (content hash of the file as of stat, True if it had to be read)
+    with _digests_lock:
+        known = _digests.get(filename)
+    if known is not None and known[0] == stat:
+        return known[1], False
+    digest = _content_hash(filename)
+    with _digests_lock:
+        _digests[filename] = (stat, digest)
+    return digest, True
+
+class DataCache:
+    def __init__(self, frozen=False):
+        # A frozen cache (one snapshot, see below) never checks its files again
+        self.frozen = frozen
+        self.entries = {}
+        self.lock = threading.RLock()
+        # key -> lock held while that key is being built
+        self.building = {}
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.files_hashed = 0
+
+    def _is_valid(self, entry):
+        # Cheap stat() check first, content hash only when the stat changed
+        for filename, (stat, content_hash) in list(entry["sources"].items()):
+            current = _stat(filename)
+            if current == stat:
+                continue
+            digest, hashed = _file_digest(filename, current)
+            self.files_hashed += hashed
+            if digest != content_hash:
+                return False
+            entry["sources"][filename] = (current, content_hash)
+            self.revalidations += 1
+        return True
+
+    def _current(self, entry, sources):
+        # A value built from other files (e.g. before the watch log existed) is stale too
+        return entry is not None and (self.frozen or (set(entry["sources"]) == set(sources) and self._is_valid(entry)))
+
+    def _recorded(self, filename):
+        # (stat, hash) of a file as some cached value was built from it, or None
+        for entry in self.entries.values():
+            if filename in entry["sources"]:
+                return entry["sources"][filename]
+        return None
+
+    def get(self, key, sources, build):
+        # Hits only stat() the source files; misses hash and re-parse them.
+        # A miss is built with the cache lock released, so lookups of other
+        # keys never wait for it; two lookups of the same key build it once.
+        with self.lock:
+            entry = self.entries.get(key)
+            if self._current(entry, sources):
+                self.hits += 1
+                return entry["value"]
+            building = self.building.setdefault(key, threading.Lock())
+        with building:
+            with self.lock:
+                entry = self.entries.get(key)
+                if self._current(entry, sources):
+                    self.hits += 1
+                    return entry["value"]
+                self.misses += 1
+                # A frozen cache labels a value with the version of a file its
+                # other values were built from: the value is derived from them
+                recorded = {filename: self._recorded(filename) for filename in sources} if self.frozen else {}
+            # Fingerprint before building so a write during the build is noticed next time
+            fingerprints = {}
+            for filename in sources:
+                if recorded.get(filename) is not None:
+                    fingerprints[filename] = recorded[filename]
+                    continue
+                stat = _stat(filename)
+                digest, hashed = _file_digest(filename, stat)
+                fingerprints[filename] = (stat, digest)
+                with self.lock:
+                    self.files_hashed += hashed
+            value = build()
+            with self.lock:
+                self.entries[key] = {"sources": fingerprints, "value": value, "build": build}
+            return value
+
+    def _refresh_sources(self, sources):
+        # Updates sources to the files' current stat(); (False if any content
+        # changed, number of files read)
+        hashed = 0
+        for filename, (stat, content_hash) in sources.items():
+            current = _stat(filename)
+            if current == stat:
+                continue
+            digest, read = _file_digest(filename, current)
+            hashed += read
+            if digest != content_hash:
+                return False, hashed
+            sources[filename] = (current, content_hash)
+        return True, hashed
+
+    def revalidate(self):
+        # ({key: entry} still valid, {key: entry} stale), in the order the
+        # values were built. Changed files are hashed with the lock released,
+        # so lookups never wait for a hash.
+        with self.lock:
+            entries = {key: dict(entry, sources=dict(entry["sources"])) for key, entry in self.entries.items()}
+        hashed = 0
+        valid, stale = {}, {}
+        for key, entry in entries.items():
+            try:
+                current, read = self._refresh_sources(entry["sources"])
+                hashed += read
+            except OSError:
+                current = False
+            if current:
+                valid[key] = entry
+            else:
+                stale[key] = entry
+        with self.lock:
+            self.files_hashed += hashed
+            for key, entry in valid.items():
+                # A touched file with the same content is not hashed again next time
+                cached = self.entries.get(key)
+                if cached is not None and cached["value"] is entry["value"] and cached["sources"] != entry["sources"]:
+                    cached["sources"] = entry["sources"]
+                    self.revalidations += 1
+        return valid, stale
+
+    def is_current(self):
+        # True while every file any cached value was built from is unchanged
+        _, stale = self.revalidate()
+        return not stale
+
+    def seed(self, entries):
+        # Start from entries of another cache, e.g. the still-valid part of an old snapshot
+        with self.lock:
+            for key, entry in entries.items():
+                self.entries[key] = {"sources": dict(entry["sources"]), "value": entry["value"], "build": entry["build"]}
+
+    def source_files(self):
+        with self.lock:
+            return {filename for entry in self.entries.values() for filename in entry["sources"]}
+
+    def content_hash(self, key, filename):
+        # Hash of a source file as of the cached value's build, None if not cached
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or filename not in entry["sources"]:
+                return None
+            return entry["sources"][filename][1]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "revalidations": self.revalidations,
+                "files_hashed": self.files_hashed,
+                "entries": len(self.entries),
+            }
+
+# One cache per server process
+cache = DataCache()
+
+# Computed recommendation lists, shared by every session of this process. Keys
+# carry the catalog and profile versions, so they never need a file check.
+results = ResultCache()
+
+# Hot reload. With HOT_RELOAD on, a page rerun reads one snapshot of the data
+# from start to finish instead of checking the files on every call: it pins
+# the current snapshot at the top (pin_snapshot) and every get_* function reads
+# that snapshot's frozen cache until release_snapshot(). A snapshot builds each
+# value the first time a page asks for it, like the shared cache, so the first
+# snapshot starts out empty. A background thread checks every RELOAD_INTERVAL
+# seconds whether any file the current snapshot was built from changed (stat,
+# then content hash, as above, without holding the snapshot's lock). If so it
+# builds a new snapshot off the request path and swaps it in with one
+# assignment under a lock, with the next version number. The new snapshot
+# starts with every value of the old one whose files did not change; only the
+# out-of-date values the old one had built (say, the users and everything
+# derived from them after a watch event) are rebuilt before the swap, anything
+# else is left for first use. Reruns already running keep the snapshot they pinned.
+# The manager only references the current snapshot, so an old one is freed
+# as soon as the last rerun pinned to it releases it. A build that fails (say,
+# a half-written movies.json) keeps the old snapshot and is retried when the
+# files change again.
+HOT_RELOAD = True
+RELOAD_INTERVAL = 2.0
+
+_pinned = threading.local()
+
+def _cache():
+    snapshot = getattr(_pinned, "snapshot", None)
+    return cache if snapshot is None else snapshot.cache
+
+class DataSnapshot:
+    def __init__(self, version):
+        self.version = version
+        # Never checks its files: replaced by a new snapshot when they change
+        self.cache = DataCache(frozen=True)
+        self.built_at = time.time()
+
+def _build_snapshot(version, entries=None, rebuild=None):
+    # A new snapshot that starts with the given still-valid entries of the
+    # previous one and builds the values of rebuild ({key: (sources, build)})
+    # on this thread; everything else is built on first use
+    snapshot = DataSnapshot(version)
+    if entries:
+        snapshot.cache.seed(entries)
+    previous = getattr(_pinned, "snapshot", None)
+    _pinned.snapshot = snapshot
+    try:
+        for key, (sources, build) in (rebuild or {}).items():
+            snapshot.cache.get(key, sources, build)
+    finally:
+        _pinned.snapshot = previous
+    return snapshot
+
+class SnapshotManager:
+    def __init__(self, interval=RELOAD_INTERVAL):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.current = None
+        # Replaced snapshots that some rerun still holds (entries vanish when freed)
+        self.retired = weakref.WeakSet()
+        self.wake = threading.Event()
+        self.watcher = None
+        self.reloads = 0
+        self.failures = 0
+        self.last_error = None
+        self.failed_stats = None
+
+    def get(self):
+        with self.lock:
+            if self.current is None:
+                # Empty: its values are built as the pages ask for them
+                self.current = _build_snapshot(1)
+                self.watcher = threading.Thread(target=self._watch, daemon=True)
+                self.watcher.start()
+            return self.current
+
+    def _source_stats(self, snapshot):
+        stats = {}
+        for filename in snapshot.cache.source_files() | set(_user_sources(USERS_FILE)):
+            try:
+                stats[filename] = _stat(filename)
+            except OSError:
+                stats[filename] = None
+        return stats
+
+    def refresh(self):
+        # Build and swap in a new snapshot if the files changed; True if swapped
+        snapshot = self.current
+        if snapshot is None:
+            return False
+        # Only stat() here: files that failed to build are not hashed again until they change
+        stats = self._source_stats(snapshot)
+        if stats == self.failed_stats:
+            return False
+        valid, stale = snapshot.cache.revalidate()
+        # Values built from users.json before the log existed are rebuilt with it
+        user_sources = set(_user_sources(USERS_FILE))
+        for key, entry in list(valid.items()):
+            if user_sources & set(entry["sources"]) and not user_sources <= set(entry["sources"]):
+                stale[key] = valid.pop(key)
+        if not stale:
+            return False
+        # Rebuild what the old snapshot had built, dependencies first; a value
+        # whose files are gone (say, a deleted saved index) is left for first use
+        with snapshot.cache.lock:
+            order = {key: position for position, key in enumerate(snapshot.cache.entries)}
+        rebuild = {}
+        for key in sorted(stale, key=order.get):
+            sources = _current_sources(stale[key]["sources"])
+            if all(os.path.exists(filename) for filename in sources):
+                rebuild[key] = (sources, stale[key]["build"])
+        try:
+            new = _build_snapshot(snapshot.version + 1, valid, rebuild)
+        except Exception as error:
+            self.failures += 1
+            self.last_error = f"{type(error).__name__}: {error}"
+            self.failed_stats = stats
+            return False
+        with self.lock:
+            self.retired.add(self.current)
+            self.current = new
+            self.reloads += 1
+            self.failed_stats = None
+        return True
+
+    def _watch(self):
+        while True:
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            self.refresh()
+
+    def stats(self):
+        with self.lock:
+            current = self.current
+            return {
+                "version": current.version if current is not None else None,
+                "built_at": current.built_at if current is not None else None,
+                "reloads": self.reloads,
+                "failed_builds": self.failures,
+                "last_error": self.last_error,
+                "old_versions_in_use": sorted(s.version for s in self.retired),
+            }
+
+snapshots = SnapshotManager()
+
+def pin_snapshot():
+    # Pins the current snapshot to this thread (a page rerun) until
+    # release_snapshot(); a rerun that stopped early is replaced at the next pin
+    if not HOT_RELOAD:
+        return None
+    _pinned.snapshot = snapshots.get()
+    return _pinned.snapshot
+
+def release_snapshot():
+    _pinned.snapshot = None
+
+def request_reload():
+    # Check the files now instead of at the next interval
+    snapshots.wake.set()
+
+# The watch log this process writes to, opened on first use
+_watch_log = None
+_watch_log_lock = threading.Lock()
+
+def _user_sources(users_file):
+    # users.json, plus the watch log's active file once there is a log
+    log_file = events_file(WATCH_LOG_DIR)
+    return [users_file, log_file] if os.path.exists(log_file) else [users_file]
+
+def _current_sources(sources):
+    # The files a value built from sources is built from now: the watch log is
+    # one of them exactly when it exists and users.json is another
+    log_file = events_file(WATCH_LOG_DIR)
+    files = [filename for filename in sources if filename != log_file]
+    if USERS_FILE in files:
+        files += _user_sources(USERS_FILE)[1:]
+    return files
+
+def _newest_mtime(sources):
+    return max(_stat(filename)[0] for filename in sources)
+
+def get_catalog(filename=MOVIES_FILE):
+    return _cache().get(("catalog", filename), [filename], lambda: load_catalog(filename, compact=COMPACT_MOVIES))
+
+def get_users(filename=USERS_FILE):
+    return _cache().get(("users", filename), _user_sources(filename), lambda: load_users_with_log(filename, WATCH_LOG_DIR))
+
+def get_user_directory(filename=USERS_FILE):
+    # ID, name and word indexes over the users for the user pickers
+    return _cache().get(("directory", filename), _user_sources(filename), lambda: UserDirectory(get_users(filename)))
+
+def get_engine(movies_file=MOVIES_FILE, users_file=USERS_FILE):
+    # SciPy is only imported by the pages that need similar-user search
+    from collaborative import CollaborativeEngine
+    return _cache().get(
+        ("engine", movies_file, users_file),
+        [movies_file] + _user_sources(users_file),
+        lambda: CollaborativeEngine(get_users(users_file), get_catalog(movies_file)),
+    )
+
+def get_leaderboards(filename=MOVIES_FILE):
+    # Per-genre and global top-rated lists, built once per catalog version
+    return _cache().get(("leaderboards", filename), [filename], lambda: Leaderboards(get_catalog(filename)))
+
+def get_popularity(movies_file=MOVIES_FILE, users_file=USERS_FILE, rankings_file=POPULARITY_FILE):
+    # Bayesian-averaged popularity boards for new users. Saved rankings
+    # (python popularity.py) are used while newer than the data files.
+    from popularity import PopularityRankings
+    try:
+        rankings_mtime = os.stat(rankings_file).st_mtime_ns
+    except OSError:
+        rankings_mtime = None
+    if rankings_mtime is not None and rankings_mtime >= _newest_mtime([movies_file] + _user_sources(users_file)):
+        return _cache().get(
+            ("popularity", rankings_file),
+            [rankings_file, movies_file],
+            lambda: PopularityRankings.load(rankings_file, get_catalog(movies_file)),
+        )
+    return _cache().get(
+        ("popularity", movies_file, users_file),
+        [movies_file] + _user_sources(users_file),
+        lambda: PopularityRankings.from_users(get_catalog(movies_file), get_users(users_file)),
+    )
+
+def get_catalog_version(filename=MOVIES_FILE):
+    # Short content hash of the movies file the cached catalog was built from
+    get_catalog(filename)
+    return _cache().content_hash(("catalog", filename), filename)[:12]
+
+def get_data_version(movies_file=MOVIES_FILE, users_file=USERS_FILE):
+    # Identifies the movies and users files the cached values were built from
+    get_users(users_file)
+    users_hash = _cache().content_hash(("users", users_file), users_file)
+    log_hash = _cache().content_hash(("users", users_file), events_file(WATCH_LOG_DIR))
+    if log_hash is not None:
+        return f"{get_catalog_version(movies_file)}-{users_hash[:12]}-{log_hash[:12]}"
+    return f"{get_catalog_version(movies_file)}-{users_hash[:12]}"
+
+def get_movie_cards(filename=MOVIES_FILE):
+    # Pre-rendered movie-card fragments, dropped with the catalog they belong to
+    from cards import MovieCards
+    return _cache().get(
+        ("cards", filename),
+        [filename],
+        lambda: MovieCards(get_catalog(filename), version=get_catalog_version(filename)),
+    )
+
+def get_movie_listing(genre="All", sort_option="Rating (High to Low)", filename=MOVIES_FILE):
+    # Movie IDs of one genre (or all movies) in the requested order. Cached per
+    # genre and sort option so flipping pages only slices the list.
+    def build():
+        catalog = get_catalog(filename)
+        # Order with the catalog's precomputed ranks instead of re-sorting by rating/year
+        by = "year" if sort_option.startswith("Year") else "rating"
+        if genre == "All":
+            movie_ids = catalog.year_order if by == "year" else catalog.rating_order
+        else:
+            movie_ids = catalog.sort_ids(catalog.genre_index.ids(genre), by=by)
+        if sort_option in ("Rating (Low to High)", "Year (Oldest First)"):
+            movie_ids = movie_ids[::-1]
+        return movie_ids
+    return _cache().get(("listing", filename, genre, sort_option), [filename], build)
+
+def get_scorer(movies_file=MOVIES_FILE, users_file=USERS_FILE):
+    # Per-movie arrays and the genre matrix for hybrid scoring
+    from hybrid import HybridScorer
+    return _cache().get(
+        ("scorer", movies_file, users_file),
+        [movies_file] + _user_sources(users_file),
+        lambda: HybridScorer(get_catalog(movies_file), get_engine(movies_file, users_file)),
+    )
+
+def get_profiles(movies_file=MOVIES_FILE, users_file=USERS_FILE):
+    # Genre profiles of every user; pages copy a profile before simulating changes
+    return _cache().get(
+        ("profiles", movies_file, users_file),
+        [movies_file] + _user_sources(users_file),
+        lambda: UserProfileStore(get_catalog(movies_file), get_users(users_file)),
+    )
+
+def get_context(movies_file=MOVIES_FILE, users_file=USERS_FILE):
+    # Everything the recommendation strategies read, all served from the cache
+    return RecommenderContext(
+        get_catalog(movies_file),
+        get_users(users_file),
+        get_engine(movies_file, users_file),
+        get_leaderboards(movies_file),
+        get_profiles(movies_file, users_file),
+        get_scorer(movies_file, users_file),
+    )
+
+def get_precomputed_recommendations(filename=RECOMMENDATIONS_FILE, movies_file=MOVIES_FILE, users_file=USERS_FILE):
+    # Batch results are only served while they are newer than the data files
+    try:
+        batch_mtime = os.stat(filename).st_mtime_ns
+    except OSError:
+        return None
+    if batch_mtime < _newest_mtime([movies_file] + _user_sources(users_file)):
+        return None
+    return _cache().get(("precomputed", filename), [filename], lambda: load_stored(filename))
+
+def get_similarity_index(movies_file=MOVIES_FILE, users_file=USERS_FILE, index_file=SIMILARITY_INDEX_FILE):
+    # MinHash/LSH index for approximate similar-user search. A saved index
+    # (python lsh.py) is used while it is newer than the data files, otherwise
+    # one is built from the collaborative engine's matrix.
+    from lsh import MinHashLSH, build_user_index
+    try:
+        index_mtime = os.stat(index_file).st_mtime_ns
+    except OSError:
+        index_mtime = None
+    if index_mtime is not None and index_mtime >= _newest_mtime([movies_file] + _user_sources(users_file)):
+        return _cache().get(("similarity_index", index_file), [index_file], lambda: MinHashLSH.load(index_file))
+    return _cache().get(
+        ("similarity_index", movies_file, users_file),
+        [movies_file] + _user_sources(users_file),
+        lambda: build_user_index(get_engine(movies_file, users_file)),
+    )
+
+def get_item_index(movies_file=MOVIES_FILE, index_file=ITEM_INDEX_FILE):
+    # Content-based similar-movie lists, saved by python item_similarity.py.
+    # None while there is no saved index newer than the movies file: building
+    # one compares every pair of movies, which is never done for a page.
+    from item_similarity import ItemSimilarityIndex
+    try:
+        index_mtime = os.stat(index_file).st_mtime_ns
+    except OSError:
+        return None
+    if index_mtime < _stat(movies_file)[0]:
+        return None
+    return _cache().get(("item_index", index_file), [index_file], lambda: ItemSimilarityIndex.load(index_file))
+
+def get_watch_log():
+    # Events recorded here reach every page on its next rerun (see _user_sources).
+    # Raises WatchLogLocked while another process (e.g. server.py --watch-log)
+    # writes to WATCH_LOG_DIR.
+    global _watch_log
+    with _watch_log_lock:
+        if _watch_log is None:
+            _watch_log = WatchLog(WATCH_LOG_DIR)
+        return _watch_log
+
+def get_result_cache():
+    return results
+
+def cache_stats():
+    stats = _cache().stats()
+    if snapshots.current is not None:
+        stats["snapshot"] = snapshots.stats()
+    return stats
+
+def result_cache_stats():
+    return results.stats()
@@ -0,0 +1,17 @@
+import hashlib
+
+# Content hashes of data files, for telling one version of a file from another.
+# Kept apart from data_layer.py so headless code (service.py, batch jobs) can
+# version its data without importing the Streamlit data layer and everything
+# it loads.
+
+def content_hash(filename):
+    digest = hashlib.sha256()
+    with open(filename, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def file_version(filename):
+    # Short content hash identifying one version of a data file
+    return content_hash(filename)[:12]
@@ -0,0 +1,146 @@
+import numpy as np
+from scipy import sparse
+from ranking import argtop_k
+
+# Hybrid scoring: the signals behind the four strategies, blended into one
+# score per movie and computed for the whole catalog at once.
+#   genre          how much of the user's history is in the movie's genres
+#   collaborative  how many similar users watched it, weighted by similarity
+#   rating         the movie's rating, scaled to 0..1
+#   recency        1 for the newest release year, halving every RECENCY_HALF_LIFE years
+# Each component is an array with one value in 0..1 per movie. The final score
+# is their weighted sum with watched movies masked out, and only the top k
+# movies are turned into dicts, with each component's contribution kept so the
+# "Recommended because" text can say why a movie was picked.
+
+COMPONENTS = ("genre", "collaborative", "rating", "recency")
+DEFAULT_WEIGHTS = {"genre": 0.4, "collaborative": 0.3, "rating": 0.2, "recency": 0.1}
+RECENCY_HALF_LIFE = 10
+NEIGHBOURS = 20
+
+def _catalog_arrays(catalog):
+    if hasattr(catalog, "ratings"):
+        # Compiled catalogs already keep ratings and years as arrays
+        return np.asarray(catalog.ratings, dtype=np.float64), np.asarray(catalog.years, dtype=np.float64)
+    ratings = np.array([movie["rating"] for movie in catalog.movies], dtype=np.float64)
+    years = np.array([movie["release_year"] for movie in catalog.movies], dtype=np.float64)
+    return ratings, years
+
+def _scale(values):
+    low, high = (values.min(), values.max()) if len(values) else (0.0, 0.0)
+    if high <= low:
+        return np.zeros_like(values)
+    return (values - low) / (high - low)
+
+class HybridScorer:
+    def __init__(self, catalog, engine=None, weights=None):
+        self.catalog = catalog
+        self.engine = engine
+        self.weights = dict(DEFAULT_WEIGHTS if weights is None else weights)
+        self.genres = list(catalog.genres)
+        self.genre_columns = {genre: column for column, genre in enumerate(self.genres)}
+        ratings, years = _catalog_arrays(catalog)
+        self.rating_scores = _scale(ratings)
+        newest = years.max() if len(years) else 0.0
+        self.recency_scores = np.power(0.5, (newest - years) / RECENCY_HALF_LIFE)
+        # movies x genres 0/1 matrix from the genre posting lists
+        rows, columns = [], []
+        for column, genre in enumerate(self.genres):
+            movie_ids = np.asarray(catalog.genre_index.ids(genre), dtype=np.int64)
+            rows.append(movie_ids)
+            columns.append(np.full(len(movie_ids), column, dtype=np.int64))
+        rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+        columns = np.concatenate(columns) if columns else np.empty(0, dtype=np.int64)
+        self.genre_matrix = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, columns)),
+            shape=(len(catalog), len(self.genres)),
+        )
+
+    def genre_scores(self, genre_counts):
+        # Share of the user's watched movies in each genre, summed over the
+        # movie's genres and scaled so the best-matching movie scores 1
+        affinity = np.zeros(len(self.genres), dtype=np.float32)
+        for genre, count in genre_counts.items():
+            column = self.genre_columns.get(genre)
+            if column is not None:
+                affinity[column] = count
+        if not affinity.any():
+            return np.zeros(len(self.catalog), dtype=np.float32)
+        scores = self.genre_matrix @ affinity
+        return scores / scores.max()
+
+    def collaborative_scores(self, user_id):
+        # Watches by the user's nearest neighbours, weighted by similarity
+        scores = np.zeros(len(self.catalog), dtype=np.float32)
+        row = self.engine.row_of(user_id) if self.engine is not None else None
+        if row is None:
+            return scores
+        neighbours = self.engine.neighbours(row, k=NEIGHBOURS, metric="jaccard")
+        if not neighbours:
+            return scores
+        weights = np.array([score for _, score, _ in neighbours], dtype=np.float32)
+        scores = np.asarray(self.engine.matrix[[n for n, _, _ in neighbours]].T @ weights, dtype=np.float32)
+        top = scores.max()
+        return scores / top if top > 0 else scores
+
+    def components(self, user_id, genre_counts, weights=None):
+        # The neighbour search is the only costly part; skip it when it is switched off
+        weights = self.weights if weights is None else weights
+        collaborative = (
+            self.collaborative_scores(user_id) if weights.get("collaborative")
+            else np.zeros(len(self.catalog), dtype=np.float32)
+        )
+        return {
+            "genre": self.genre_scores(genre_counts),
+            "collaborative": collaborative,
+            "rating": self.rating_scores,
+            "recency": self.recency_scores,
+        }
+
+    def score(self, user_id, genre_counts, watched_ids=(), k=10, weights=None):
+        # [{"movie_id", "score", "contributions": {component: weighted value}}, ...]
+        # best first, for the k best movies the user has not watched
+        weights = self.weights if weights is None else weights
+        if not any(weights.get(name, 0) > 0 for name in COMPONENTS):
+            # Nothing to rank by: every movie would score 0
+            return []
+        components = self.components(user_id, genre_counts, weights)
+        total = np.zeros(len(self.catalog), dtype=np.float64)
+        for name in COMPONENTS:
+            if weights.get(name):
+                total += weights[name] * components[name]
+        watched = np.fromiter(watched_ids, dtype=np.int64, count=len(watched_ids))
+        candidates = np.ones(len(self.catalog), dtype=bool)
+        candidates[watched] = False
+        movie_ids = np.flatnonzero(candidates)
+        order = argtop_k(movie_ids, total[movie_ids], k)
+        return [
+            {
+                "movie_id": int(movie_ids[i]),
+                "score": float(total[movie_ids[i]]),
+                "contributions": {
+                    name: float(weights.get(name, 0) * components[name][movie_ids[i]]) for name in COMPONENTS
+                },
+            }
+            for i in order
+        ]
+
+    def explain(self, movie, contributions, genre_counts):
+        # Reason text naming the components that contributed most
+        parts = []
+        for name in sorted(COMPONENTS, key=lambda c: -contributions[c]):
+            if contributions[name] <= 0 or len(parts) == 2:
+                break
+            if name == "genre":
+                liked = [g for g in movie["genre"] if genre_counts.get(g)]
+                liked.sort(key=lambda g: (-genre_counts[g], g))
+                parts.append(f"matches your taste for {', '.join(liked[:2])}")
+            elif name == "collaborative":
+                parts.append("popular with users who watch what you watch")
+            elif name == "rating":
+                parts.append(f"highly rated ({movie['rating']})")
+            else:
+                parts.append(f"a recent release ({movie['release_year']})")
+        summary = ", ".join(f"{name} {contributions[name]:.2f}" for name in COMPONENTS)
+        reason = " and ".join(parts) if parts else "a good overall match"
+        return f"{reason[0].upper()}{reason[1:]} (score breakdown: {summary})"
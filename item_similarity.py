@@ -0,0 +1,244 @@
+import argparse
+import numpy as np
+from load_data import load_catalog
+
+# Content-based item-item similarity for "more like this" and new movies.
+# A movie nobody has watched yet has no collaborative signal, but it has genres,
+# a release year and a rating. Two movies are compared on those alone:
+#   similarity = GENRE_WEIGHT  * cosine of their genre vectors
+#              + YEAR_WEIGHT   * 0.5 ** (years apart / YEAR_HALF_LIFE)
+#              + RATING_WEIGHT * (1 - rating difference / RATING_RANGE)
+# so identical movies score 1 and the score falls as they drift apart.
+#
+# Layout: the k nearest neighbours of every movie are kept in two fixed-width
+# arrays, neighbours[movie_id] (movie IDs, -1 when there are fewer than k
+# other movies) and scores[movie_id], best first. "More like this" is a single
+# row read. The per-movie features (unit genre vectors, years, ratings) are kept
+# too, so insert() can place one new movie without rebuilding: it scores the new
+# movie against every movie in one vectorized pass, takes its top k, and slots
+# it into the lists of the movies it now beats the last neighbour of.
+#
+# build() compares every pair of movies, a block of rows at a time; a block's
+# score matrix (rows x all movies, float32) is kept near _BLOCK_BYTES, so the
+# number of rows shrinks as the catalog grows. It is meant to run offline
+# (python item_similarity.py) and the result is saved as .npz.
+
+GENRE_WEIGHT = 0.7
+YEAR_WEIGHT = 0.15
+RATING_WEIGHT = 0.15
+YEAR_HALF_LIFE = 10
+RATING_RANGE = 10.0
+NEIGHBOURS = 10
+_BLOCK_BYTES = 64 << 20
+
+class ItemSimilarityIndex:
+    def __init__(self, genres, k=NEIGHBOURS):
+        self.k = k
+        self.genres = list(genres)
+        self.genre_columns = {genre: column for column, genre in enumerate(self.genres)}
+        self.count = 0
+        self.genre_vectors = np.empty((0, len(self.genres)), dtype=np.float32)
+        self.years = np.empty(0, dtype=np.float32)
+        self.ratings = np.empty(0, dtype=np.float32)
+        self.neighbours = np.empty((0, k), dtype=np.int32)
+        self.scores = np.empty((0, k), dtype=np.float32)
+
+    def __len__(self):
+        return self.count
+
+    def _grow(self, count):
+        # Arrays double in size so a run of inserts stays amortized O(1) in copying
+        capacity = len(self.years)
+        if count <= capacity:
+            return
+        capacity = max(count, 2 * capacity, 16)
+        def grown(array, fill):
+            new = np.full((capacity,) + array.shape[1:], fill, dtype=array.dtype)
+            new[:len(array)] = array
+            return new
+        self.genre_vectors = grown(self.genre_vectors, 0)
+        self.years = grown(self.years, 0)
+        self.ratings = grown(self.ratings, 0)
+        self.neighbours = grown(self.neighbours, -1)
+        self.scores = grown(self.scores, -np.inf)
+
+    def _add_genre(self, genre):
+        # A genre first seen in an inserted movie becomes a new zero column
+        self.genre_columns[genre] = len(self.genres)
+        self.genres.append(genre)
+        column = np.zeros((len(self.genre_vectors), 1), dtype=np.float32)
+        self.genre_vectors = np.hstack([self.genre_vectors, column])
+
+    def genre_vector(self, genres, add=False):
+        vector = np.zeros(len(self.genres), dtype=np.float32)
+        for genre in set(genres):
+            if genre not in self.genre_columns:
+                if not add:
+                    continue
+                self._add_genre(genre)
+                vector = np.append(vector, np.float32(0))
+            vector[self.genre_columns[genre]] = 1
+        norm = np.sqrt(vector.sum())
+        return vector / norm if norm else vector
+
+    def similarity(self, genre_vectors, years, ratings, movie_ids=None):
+        # Similarity of each given movie (rows) to the indexed movies
+        # (columns, all of them or only movie_ids)
+        if movie_ids is None:
+            movie_ids = slice(0, self.count)
+        # In-place steps: a build block is block rows x all movies
+        scores = genre_vectors @ self.genre_vectors[movie_ids].T
+        scores *= GENRE_WEIGHT
+        year = np.abs(years[:, None] - self.years[movie_ids])
+        year *= -1 / YEAR_HALF_LIFE
+        np.exp2(year, out=year)
+        year *= YEAR_WEIGHT
+        scores += year
+        rating = np.abs(ratings[:, None] - self.ratings[movie_ids], out=year)
+        rating *= -1 / RATING_RANGE
+        rating += 1
+        np.maximum(rating, 0, out=rating)
+        rating *= RATING_WEIGHT
+        scores += rating
+        return scores
+
+    def _top(self, scores, exclude=None):
+        # Columns and scores of the k best columns of each row, best first;
+        # ties go to the lower movie ID (padded with -1 / -inf). Same rule as
+        # ranking.argtop_k, for a whole block of rows at once: everything above
+        # the k-th best score, then the lowest IDs among those equal to it.
+        if exclude is not None:
+            scores[np.arange(len(scores)), exclude] = -np.inf
+        k = min(self.k, scores.shape[1])
+        top = np.full((len(scores), self.k), -1, dtype=np.int64)
+        top_scores = np.full((len(scores), self.k), -np.inf, dtype=np.float32)
+        if k == 0:
+            return top, top_scores
+        columns = scores.shape[1]
+        cutoff = np.partition(scores, columns - k, axis=1)[:, columns - k]
+        rows, candidates = np.nonzero(scores >= cutoff[:, None])
+        values = scores[rows, candidates]
+        order = np.lexsort((candidates, -values, rows))
+        rows, candidates, values = rows[order], candidates[order], values[order]
+        rank = np.arange(len(rows)) - np.searchsorted(rows, rows)
+        keep = (rank < k) & np.isfinite(values)
+        top[rows[keep], rank[keep]] = candidates[keep]
+        top_scores[rows[keep], rank[keep]] = values[keep]
+        return top, top_scores
+
+    def _store(self, rows, top, top_scores):
+        self.neighbours[rows] = top
+        self.scores[rows] = top_scores
+
+    def build(self, catalog):
+        # Index every movie of a MovieCatalog or CompiledCatalog, movie ID = row
+        count = len(catalog)
+        self._grow(count)
+        self.count = count
+        if hasattr(catalog, "ratings"):
+            self.years[:count] = catalog.years
+            self.ratings[:count] = catalog.ratings
+        else:
+            self.years[:count] = [movie["release_year"] for movie in catalog.movies]
+            self.ratings[:count] = [movie["rating"] for movie in catalog.movies]
+        for genre in catalog.genres:
+            if genre not in self.genre_columns:
+                self._add_genre(genre)
+            movie_ids = np.asarray(catalog.genre_index.ids(genre), dtype=np.int64)
+            self.genre_vectors[movie_ids, self.genre_columns[genre]] = 1
+        norms = np.sqrt(self.genre_vectors[:count].sum(axis=1, keepdims=True))
+        np.divide(self.genre_vectors[:count], norms, out=self.genre_vectors[:count], where=norms > 0)
+        block_rows = max(1, _BLOCK_BYTES // (4 * max(count, 1)))
+        for start in range(0, count, block_rows):
+            rows = np.arange(start, min(start + block_rows, count))
+            scores = self.similarity(self.genre_vectors[rows], self.years[rows], self.ratings[rows])
+            self._store(rows, *self._top(scores, exclude=rows))
+        return self
+
+    def place(self, genres, release_year, rating):
+        # [(movie_id, score), ...]: where a movie with these features would sit,
+        # without adding it
+        vector = self.genre_vector(genres)[None, :]
+        scores = self.similarity(vector, np.array([release_year], dtype=np.float32),
+                                 np.array([rating], dtype=np.float32))
+        top, top_scores = self._top(scores)
+        # Fewer than k indexed movies leave -1 padding, as in more_like_this()
+        valid = top[0] >= 0
+        return [(int(m), float(s)) for m, s in zip(top[0][valid], top_scores[0][valid])]
+
+    def insert(self, genres, release_year, rating):
+        # Add one movie with the next movie ID and return that ID. Only the
+        # lists the new movie gets into are rewritten.
+        vector = self.genre_vector(genres, add=True)
+        movie_id = self.count
+        self._grow(movie_id + 1)
+        self.genre_vectors[movie_id] = vector
+        self.years[movie_id] = release_year
+        self.ratings[movie_id] = rating
+        scores = self.similarity(vector[None, :], self.years[movie_id:movie_id + 1],
+                                 self.ratings[movie_id:movie_id + 1])[0]
+        top, top_scores = self._top(scores[None, :])
+        self._store([movie_id], top, top_scores)
+
+        # Similarity is symmetric: the new movie enters every list whose
+        # weakest neighbour it beats (ties keep the older movie)
+        others = scores[:movie_id]
+        rows = np.flatnonzero(others > self.scores[:movie_id, -1])
+        if len(rows):
+            merged = np.hstack([self.neighbours[rows], np.full((len(rows), 1), movie_id, dtype=np.int32)])
+            merged_scores = np.hstack([self.scores[rows], others[rows, None]])
+            order = np.lexsort((np.where(merged < 0, np.iinfo(np.int32).max, merged), -merged_scores), axis=1)
+            self.neighbours[rows] = np.take_along_axis(merged, order, axis=1)[:, :self.k]
+            self.scores[rows] = np.take_along_axis(merged_scores, order, axis=1)[:, :self.k]
+        self.count = movie_id + 1
+        return movie_id
+
+    def more_like_this(self, movie_id, k=None):
+        # [(movie_id, score), ...] best first, straight from the stored row
+        neighbours = self.neighbours[movie_id]
+        scores = self.scores[movie_id]
+        valid = neighbours >= 0
+        neighbours, scores = neighbours[valid][:k], scores[valid][:k]
+        return [(int(m), float(s)) for m, s in zip(neighbours, scores)]
+
+    def save(self, filename):
+        count = self.count
+        np.savez(
+            filename,
+            k=np.array(self.k),
+            genres=np.array(self.genres, dtype=str),
+            genre_vectors=self.genre_vectors[:count],
+            years=self.years[:count],
+            ratings=self.ratings[:count],
+            neighbours=self.neighbours[:count],
+            scores=self.scores[:count],
+        )
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename) as data:
+            index = cls(data["genres"].tolist(), int(data["k"]))
+            index.genre_vectors = data["genre_vectors"]
+            index.years = data["years"]
+            index.ratings = data["ratings"]
+            index.neighbours = data["neighbours"]
+            index.scores = data["scores"]
+        index.count = len(index.years)
+        return index
+
+def build_item_index(catalog, k=NEIGHBOURS):
+    return ItemSimilarityIndex(catalog.genres, k).build(catalog)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build and save the content-based similar-movie index.")
+    parser.add_argument("--movies", default="movies.json")
+    parser.add_argument("--out", default="similar_movies.npz")
+    parser.add_argument("-k", type=int, default=NEIGHBOURS, help="neighbours kept per movie")
+    args = parser.parse_args()
+
+    catalog = load_catalog(args.movies)
+    index = build_item_index(catalog, args.k)
+    index.save(args.out)
+    print(f"Indexed {len(index)} movies ({args.k} neighbours each) into {args.out}")
+    first = catalog[0]
+    print(f"More like {first['title']}:", [catalog[m]["title"] for m, _ in index.more_like_this(0, 3)])
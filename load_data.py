@@ -1,7 +1,15 @@
 import json  # Built-in module for working with JSON files
+import os
+from bisect import bisect_left
+from heapq import merge
+from ranking import top_k
+from metrics import timed
 
 # Step 2: Opening a JSON File
+@timed("load_data.load_movies")
 def load_movies(filename):
+    if is_ndjson(filename):
+        return list(iter_movies(filename))
     with open(filename, "r") as file:
         return json.load(file)
 
@@ -15,7 +23,11 @@ def print_movie_titles(movies):
         print("Movie Title:", movie["title"])
 
 # Step 5: Extracting Movies by Genre
+@timed("load_data.get_movies_by_genre")
 def get_movies_by_genre(movies, genre):
+    # Any catalog (MovieCatalog, CompiledCatalog, CompactCatalog) answers from its genre index
+    if hasattr(movies, "movies_in_genre"):
+        return movies.movies_in_genre(genre)
     return [movie for movie in movies if genre in movie["genre"]]
 
 # Step 6: Displaying Filtered Movies
@@ -24,26 +36,424 @@ def print_sci_fi_movies(movies):
     print(sci_fi_movies)
 
 # Step 7: Finding Top-Rated Movies
+@timed("load_data.get_top_rated_movies")
 def get_top_rated_movies(movies, top_n=3):
-    sorted_movies = sorted(movies, key=lambda x: x["rating"], reverse=True)
-    return sorted_movies[:top_n]
+    if hasattr(movies, "top_rated"):
+        return movies.top_rated(top_n)
+    # Keep only the best top_n in a heap instead of sorting every movie
+    return top_k(movies, top_n, key=lambda x: x["rating"])
 
 # Step 8: Filtering Movies by Release Year
+@timed("load_data.get_movies_by_year")
 def get_movies_by_year(movies, year):
     return [movie for movie in movies if movie["release_year"] >= year]
 
 # Step 9: Loading User Data
+@timed("load_data.load_users")
 def load_users(filename):
+    compiled = _load_compiled(filename, "users")
+    if compiled is not None:
+        return compiled
+    if is_ndjson(filename):
+        return list(iter_users(filename))
     with open(filename, "r") as file:
         return json.load(file)
 
 # Step 10: Finding a User’s Favorite Movies
+@timed("load_data.get_user_favorites")
 def get_user_favorites(users, user_id):
+    if isinstance(users, UserDirectory):
+        return users.favorites(user_id)
     for user in users:
         if user["user_id"] == user_id:
             return user["watched_movies"]
     return []
 
+# Step 11: Indexing the Catalog
+# Looking a movie up by title in a plain list means scanning every movie.
+# MovieCatalog is built once and keeps a title -> movie dictionary, so a lookup
+# is a single hash probe. Every movie also gets a stable integer ID (its
+# position in movies.json) and the catalog keeps pre-sorted views by rating
+# and by release year, so the pages never have to sort the whole list again.
+class MovieCatalog:
+    def __init__(self, movies):
+        self.movies = list(movies)
+        self.by_title = {}
+        self.ids = {}
+        for movie_id, movie in enumerate(self.movies):
+            # Keep the first movie if a title appears twice
+            if movie["title"] not in self.by_title:
+                self.by_title[movie["title"]] = movie
+                self.ids[movie["title"]] = movie_id
+        # Highest rated / newest first; stable, so ties keep file order
+        ids = range(len(self.movies))
+        self.rating_order = sorted(ids, key=lambda i: self.movies[i]["rating"], reverse=True)
+        self.year_order = sorted(ids, key=lambda i: self.movies[i]["release_year"], reverse=True)
+        self.by_rating = [self.movies[i] for i in self.rating_order]
+        self.by_year = [self.movies[i] for i in self.year_order]
+        # rank[movie_id] = position of the movie in the sorted view
+        self.rating_rank = _ranks(self.rating_order)
+        self.year_rank = _ranks(self.year_order)
+        self.genre_index = GenreIndex(self.movies)
+        self.genres = self.genre_index.genres
+
+    def __len__(self):
+        return len(self.movies)
+
+    def __iter__(self):
+        return iter(self.movies)
+
+    def __getitem__(self, movie_id):
+        return self.movies[movie_id]
+
+    def __contains__(self, title):
+        return title in self.by_title
+
+    def get(self, title, default=None):
+        return self.by_title.get(title, default)
+
+    def movie_id(self, title):
+        return self.ids.get(title)
+
+    def lookup(self, titles):
+        # Resolve a list of titles, skipping any that are not in the catalog
+        return [self.by_title[title] for title in titles if title in self.by_title]
+
+    def genres_of(self, movie_id):
+        return self.movies[movie_id]["genre"]
+
+    def ids_of(self, titles):
+        return {self.ids[title] for title in titles if title in self.ids}
+
+    def movies_in_genre(self, genre):
+        return [self.movies[i] for i in self.genre_index.ids(genre)]
+
+    def movies_in_any_genre(self, genres):
+        return [self.movies[i] for i in self.genre_index.any_of(genres)]
+
+    def movies_in_all_genres(self, genres):
+        return [self.movies[i] for i in self.genre_index.all_of(genres)]
+
+    def sort_ids(self, movie_ids, by="rating"):
+        # Order a subset of movie IDs the same way as the matching sorted view
+        rank = self.rating_rank if by == "rating" else self.year_rank
+        return sorted(movie_ids, key=rank.__getitem__)
+
+    def top_rated(self, top_n=3, exclude=()):
+        # Walk the pre-sorted view and stop as soon as we have enough movies
+        result = []
+        for movie in self.by_rating:
+            if len(result) >= top_n:
+                break
+            if movie["title"] not in exclude:
+                result.append(movie)
+        return result
+
+def uses_catalog_ids(users, catalog):
+    # True for compiled users whose watch histories are stored as movie IDs of
+    # this very catalog, so callers can skip the title lookups
+    users_catalog = getattr(users, "catalog", None)
+    return hasattr(users, "watch_ids") and getattr(users_catalog, "path", None) == getattr(catalog, "path", False)
+
+def _ranks(order):
+    rank = [0] * len(order)
+    for position, movie_id in enumerate(order):
+        rank[movie_id] = position
+    return rank
+
+# Step 12: Indexing Genres
+# GenreIndex is an inverted index: for every genre it stores the sorted list of
+# movie IDs in that genre (a "posting list"). Each genre also gets one bit, and
+# every movie gets a bitmask of its genres, so "does this movie have Action or
+# Sci-Fi?" is a single AND instead of a loop over the movie's genre list.
+class GenreIndex:
+    def __init__(self, movies):
+        self.genres = sorted(set(genre for movie in movies for genre in movie["genre"]))
+        self.bits = {genre: 1 << bit for bit, genre in enumerate(self.genres)}
+        self.postings = {genre: [] for genre in self.genres}
+        self.masks = []
+        for movie_id, movie in enumerate(movies):
+            for genre in set(movie["genre"]):
+                self.postings[genre].append(movie_id)
+            self.masks.append(self.mask_for(movie["genre"]))
+
+    def mask_for(self, genres):
+        # Unknown genres get no bit, so they never match anything
+        mask = 0
+        for genre in genres:
+            mask |= self.bits.get(genre, 0)
+        return mask
+
+    def ids(self, genre):
+        return self.postings.get(genre, [])
+
+    def any_of(self, genres):
+        # Union of the posting lists, kept in movie ID order
+        ids = set()
+        for genre in genres:
+            ids.update(self.ids(genre))
+        return sorted(ids)
+
+    def all_of(self, genres):
+        genres = list(genres)
+        if not genres:
+            return []
+        if any(genre not in self.bits for genre in genres):
+            return []
+        wanted = self.mask_for(genres)
+        # Start from the shortest posting list and keep movies whose mask
+        # contains every wanted bit
+        shortest = min(genres, key=lambda genre: len(self.postings[genre]))
+        return [i for i in self.postings[shortest] if self.masks[i] & wanted == wanted]
+
+    def matches_any(self, movie_id, mask):
+        return self.masks[movie_id] & mask != 0
+
+    def matches_all(self, movie_id, mask):
+        return self.masks[movie_id] & mask == mask
+
+@timed("load_data.load_catalog")
+def load_catalog(filename="movies.json", compact=False):
+    compiled = _load_compiled(filename, "movies")
+    if compiled is not None:
+        return compiled
+    if compact:
+        # Typed arrays instead of one dict per movie (compact_catalog.py, needs NumPy)
+        from compact_catalog import load_compact_catalog
+        return load_compact_catalog(filename)
+    return MovieCatalog(load_movies(filename))
+
+# A compiled copy made by compiled_catalog.py sits next to the JSON files.
+# When it was built from the current file we open it instead of parsing JSON.
+COMPILED_DIR = "catalog.compiled"
+
+def _load_compiled(filename, kind):
+    compiled_dir = os.path.join(os.path.dirname(os.path.abspath(filename)), COMPILED_DIR)
+    if not os.path.exists(os.path.join(compiled_dir, "manifest.json")):
+        return None
+    import compiled_catalog  # Needs NumPy, so only imported when there is something to open
+    if not compiled_catalog.is_fresh(compiled_dir, kind, filename):
+        return None
+    if kind == "movies":
+        return compiled_catalog.open_catalog(compiled_dir)
+    return compiled_catalog.open_users(compiled_dir)
+
+# Step 13: Streaming Large Files
+# json.load needs the whole file and every record in memory before we can use
+# any of it. iter_records reads the file a chunk at a time and yields one record
+# at a time instead. It understands two layouts:
+#   - newline-delimited JSON (.ndjson / .jsonl): one object per line
+#   - a regular JSON array like movies.json: [ {...}, {...}, ... ]
+# Only the record being decoded has to fit in memory.
+NDJSON_SUFFIXES = (".ndjson", ".jsonl")
+READ_CHUNK_SIZE = 1 << 16
+
+def is_ndjson(filename):
+    # True for files with one record per line (.ndjson/.jsonl), else a JSON array
+    return str(filename).endswith(NDJSON_SUFFIXES)
+
+def _iter_ndjson(file):
+    for line_number, line in enumerate(file, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as error:
+            raise ValueError(f"Line {line_number}: invalid JSON ({error.msg})") from None
+
+def _iter_json_array(file):
+    decoder = json.JSONDecoder()
+    buffer = ""
+    while not buffer:
+        chunk = file.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        buffer = chunk.lstrip()
+    if not buffer.startswith("["):
+        raise ValueError("Expected a JSON array of records")
+    pos = 1
+    eof = False
+    while True:
+        # Skip whitespace and the comma between records
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buffer) or eof:
+                break
+            chunk = file.read(READ_CHUNK_SIZE)
+            eof = not chunk
+            buffer, pos = chunk, 0
+        if pos >= len(buffer):
+            raise ValueError("Unexpected end of file inside JSON array")
+        if buffer[pos] == "]":
+            return
+        if buffer[pos] != "{":
+            raise ValueError("Expected a JSON object in the array")
+        try:
+            record, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # The object is cut off at the end of the buffer: read more and retry
+            chunk = file.read(READ_CHUNK_SIZE)
+            if not chunk:
+                raise ValueError("Invalid or truncated JSON object in array") from None
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+        yield record
+        pos = end
+
+def iter_records(filename):
+    with open(filename, "r") as file:
+        if is_ndjson(filename):
+            yield from _iter_ndjson(file)
+        else:
+            yield from _iter_json_array(file)
+
+def validate_movie(movie):
+    if not isinstance(movie, dict):
+        raise ValueError(f"Movie must be an object, got {type(movie).__name__}")
+    if not isinstance(movie.get("title"), str):
+        raise ValueError(f"Movie is missing a string 'title': {movie!r}")
+    if not isinstance(movie.get("genre"), list) or not all(isinstance(g, str) for g in movie["genre"]):
+        raise ValueError(f"Movie {movie['title']!r} needs a list of genre strings")
+    if isinstance(movie.get("rating"), bool) or not isinstance(movie.get("rating"), (int, float)):
+        raise ValueError(f"Movie {movie['title']!r} needs a numeric 'rating'")
+    if isinstance(movie.get("release_year"), bool) or not isinstance(movie.get("release_year"), int):
+        raise ValueError(f"Movie {movie['title']!r} needs an integer 'release_year'")
+    return movie
+
+def validate_user(user):
+    if not isinstance(user, dict):
+        raise ValueError(f"User must be an object, got {type(user).__name__}")
+    if isinstance(user.get("user_id"), bool) or not isinstance(user.get("user_id"), int):
+        raise ValueError(f"User is missing an integer 'user_id': {user!r}")
+    if not isinstance(user.get("name"), str):
+        raise ValueError(f"User {user['user_id']} needs a string 'name'")
+    if not isinstance(user.get("watched_movies"), list) or not all(isinstance(t, str) for t in user["watched_movies"]):
+        raise ValueError(f"User {user['user_id']} needs a list of watched movie titles")
+    return user
+
+def iter_movies(filename):
+    for movie in iter_records(filename):
+        yield validate_movie(movie)
+
+def iter_users(filename):
+    for user in iter_records(filename):
+        yield validate_user(user)
+
+def iter_chunks(records, chunk_size=10000):
+    # Group any record stream into lists of at most chunk_size records
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+# Step 14: Indexing Users
+# Finding a user by ID or by name in a plain list means scanning every user.
+# UserDirectory is built once and keeps hash indexes from user ID and from name
+# to the user's row. Names are not unique, so every user also gets a label that
+# is: the name itself, or "Name (#user_id)" when several users share it. For
+# search, every word of every name is kept in one sorted list, so "all users
+# with a word starting with 'al'" is a binary search plus a short walk.
+class UserDirectory:
+    def __init__(self, users):
+        self.users = users
+        if hasattr(users, "user_ids"):
+            # Compiled users: read IDs and names without building user dicts
+            user_ids = users.user_ids.tolist()
+            names = [users.name(row) for row in range(len(users))]
+        else:
+            user_ids = [user["user_id"] for user in users]
+            names = [user["name"] for user in users]
+        self.user_ids = user_ids
+        self.names = names
+        self.by_id = {}
+        self.by_name = {}
+        for row, (user_id, name) in enumerate(zip(user_ids, names)):
+            # Keep the first user if an ID appears twice, like a scan would
+            self.by_id.setdefault(user_id, row)
+            self.by_name.setdefault(name, []).append(row)
+        self.labels = [
+            name if len(self.by_name[name]) == 1 else f"{name} (#{user_id})"
+            for user_id, name in zip(user_ids, names)
+        ]
+        self.by_label = {}
+        for row, label in enumerate(self.labels):
+            self.by_label.setdefault(label, row)
+        self.words = sorted(
+            (word, row) for row, name in enumerate(names) for word in set(name.lower().split())
+        )
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def __getitem__(self, row):
+        return self.users[row]
+
+    def row_of(self, user_id):
+        return self.by_id.get(user_id)
+
+    def get(self, user_id, default=None):
+        row = self.by_id.get(user_id)
+        return default if row is None else self.users[row]
+
+    def with_name(self, name):
+        # Every user with exactly this name, in file order
+        return [self.users[row] for row in self.by_name.get(name, ())]
+
+    def label(self, row):
+        return self.labels[row]
+
+    def from_label(self, label, default=None):
+        row = self.by_label.get(label)
+        return default if row is None else self.users[row]
+
+    def _prefix_range(self, prefix):
+        # Positions in self.words of the words that start with prefix
+        return bisect_left(self.words, (prefix,)), bisect_left(self.words, (prefix + chr(0x10FFFF),))
+
+    def _rows_in_order(self, start, end):
+        # Rows of self.words[start:end] in file order, each once. The rows of one
+        # word form a sorted run, so the runs are merged lazily.
+        runs = []
+        while start < end:
+            run_end = bisect_left(self.words, (self.words[start][0], len(self)), start, end)
+            runs.append(self.words[i][1] for i in range(start, run_end))
+            start = run_end
+        last = None
+        for row in merge(*runs):
+            if row != last:
+                last = row
+                yield row
+
+    def search(self, query, limit=50):
+        # Rows of the users with a name word starting with every query word,
+        # in file order; an empty query matches everyone. Users are read from
+        # the smallest word range and the walk stops at limit matches.
+        query_words = query.lower().split()
+        if not query_words:
+            return list(range(min(limit, len(self))))
+        ranges = [(self._prefix_range(word), word) for word in query_words]
+        (start, end), first = min(ranges, key=lambda item: item[0][1] - item[0][0])
+        others = [word for word in query_words if word != first]
+        rows = []
+        for row in self._rows_in_order(start, end):
+            if len(rows) >= limit:
+                break
+            name_words = self.names[row].lower().split()
+            if all(any(name_word.startswith(word) for name_word in name_words) for word in others):
+                rows.append(row)
+        return rows
+
+    def favorites(self, user_id):
+        user = self.get(user_id)
+        return user["watched_movies"] if user is not None else []
+
+
 if __name__ == "__main__":
     # Load movies and users
     movies = load_movies("movies.json")
@@ -69,3 +479,15 @@ if __name__ == "__main__":
     # Print user favorite movies
     user_101_favorites = get_user_favorites(users, 101)
     print("User 101's Favorite Movies:", user_101_favorites)
+
+    # Look movies up through the catalog index
+    catalog = MovieCatalog(movies)
+    print("Inception:", catalog.get("Inception"))
+    print("Top 3 Rated Movies (catalog):", catalog.top_rated(3))
+    print("Genres:", catalog.genres)
+    print("Sci-Fi or Drama:", [m["title"] for m in catalog.movies_in_any_genre(["Sci-Fi", "Drama"])])
+    print("Sci-Fi and Action:", [m["title"] for m in catalog.movies_in_all_genres(["Sci-Fi", "Action"])])
+
+    # Stream the same file record by record, in chunks of 3
+    for chunk in iter_chunks(iter_movies("movies.json"), chunk_size=3):
+        print("Chunk:", [m["title"] for m in chunk])
@@ -0,0 +1,240 @@
+import argparse
+import numpy as np
+from load_data import load_catalog, load_users
+
+# Approximate similar-user search with MinHash and locality-sensitive hashing.
+# Exact search (collaborative.py) compares a user with every other user. Here
+# each watch history is summarised by a MinHash signature: for each of num_perm
+# random hash functions, the smallest hash of any watched movie ID. Two users
+# agree on one signature position with probability equal to the Jaccard
+# similarity of their histories.
+#
+# The signature is cut into `bands` bands of rows_per_band positions and each
+# band is hashed into a bucket. Users that share a bucket in any band become
+# candidates, so a query only looks at a few buckets instead of every user. A
+# pair with similarity s becomes a candidate with probability
+#   1 - (1 - s ** rows_per_band) ** bands
+# More bands (fewer rows each) find more true neighbours but return more
+# candidates to check: that is the recall/latency trade-off.
+#
+# Bucket layout: for each band, every user's bucket key sorted once in a NumPy
+# array (lookup by binary search), plus small dictionaries for users inserted
+# or updated since the arrays were last sorted. An updated user keeps stale
+# entries in the sorted arrays; those are skipped by checking the user's
+# current bucket key. compact() folds the dictionaries back into the arrays.
+
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+_MIX = np.uint64(0x100000001B3)
+_CHUNK_ENTRIES = 1 << 16
+
+class MinHashLSH:
+    def __init__(self, num_perm=96, bands=32, seed=1):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self.seed = seed
+        # Multiply-shift hashes: h(x) = (a * x + b) mod 2**64 >> 32, a odd
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 1 << 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self.b = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64)
+        self.keys = []
+        self.positions = {}
+        self.signatures = np.empty((0, num_perm), dtype=np.uint32)
+        self.band_keys = np.empty((0, bands), dtype=np.uint64)
+        self._sorted_keys = np.empty((bands, 0), dtype=np.uint64)
+        self._sorted_positions = np.empty((bands, 0), dtype=np.int64)
+        self._recent = [{} for _ in range(bands)]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.positions
+
+    @property
+    def threshold(self):
+        # Similarity at which a pair is about equally likely to be found or missed
+        return (1 / self.bands) ** (1 / self.rows_per_band)
+
+    def probability(self, similarity):
+        # Chance that a pair with this Jaccard similarity becomes a candidate
+        return 1 - (1 - similarity ** self.rows_per_band) ** self.bands
+
+    def signature(self, movie_ids):
+        movie_ids = np.unique(np.asarray(movie_ids, dtype=np.uint64))
+        if len(movie_ids) == 0:
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint32)
+        with np.errstate(over="ignore"):
+            hashes = (self.a[:, None] * movie_ids[None, :] + self.b[:, None]) >> np.uint64(32)
+        return hashes.min(axis=1).astype(np.uint32)
+
+    def signatures_csr(self, indptr, indices):
+        # Signatures of many users at once from CSR watch lists (one row per
+        # user), a chunk of entries at a time to bound memory
+        indptr = np.asarray(indptr, dtype=np.int64)
+        indices = np.asarray(indices, dtype=np.uint64)
+        count = len(indptr) - 1
+        result = np.full((count, self.num_perm), _MAX_HASH, dtype=np.uint32)
+        start = 0
+        while start < count:
+            end = int(np.searchsorted(indptr, indptr[start] + _CHUNK_ENTRIES, side="right")) - 1
+            end = min(max(end, start + 1), count)
+            offsets = indptr[start:end + 1] - indptr[start]
+            ids = indices[indptr[start]:indptr[end]]
+            if len(ids):
+                with np.errstate(over="ignore"):
+                    hashes = ((ids[:, None] * self.a[None, :] + self.b[None, :]) >> np.uint64(32)).astype(np.uint32)
+                # reduceat needs a valid start for every row; empty rows are reset below
+                nonempty = offsets[:-1] < offsets[1:]
+                starts = offsets[:-1][nonempty]
+                result[start:end][nonempty] = np.minimum.reduceat(hashes, starts, axis=0)
+            start = end
+        return result
+
+    def _band_keys(self, signatures):
+        # One 64-bit key per band, mixed from the band's signature rows
+        signatures = np.atleast_2d(signatures).reshape(-1, self.bands, self.rows_per_band).astype(np.uint64)
+        keys = np.full(signatures.shape[:2], 0xCBF29CE484222325, dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            for row in range(self.rows_per_band):
+                keys = (keys ^ signatures[:, :, row]) * _MIX
+        return keys
+
+    def _grow(self, count):
+        if count > len(self.signatures):
+            capacity = max(count, 2 * len(self.signatures), 16)
+            signatures = np.empty((capacity, self.num_perm), dtype=np.uint32)
+            band_keys = np.empty((capacity, self.bands), dtype=np.uint64)
+            signatures[:len(self.keys)] = self.signatures[:len(self.keys)]
+            band_keys[:len(self.keys)] = self.band_keys[:len(self.keys)]
+            self.signatures, self.band_keys = signatures, band_keys
+
+    def build(self, keys, indptr, indices):
+        # Replace the index with the given users (CSR watch lists) and sort it
+        keys = list(keys)
+        self.keys = []
+        self.positions = {}
+        self.signatures = np.empty((0, self.num_perm), dtype=np.uint32)
+        self.band_keys = np.empty((0, self.bands), dtype=np.uint64)
+        signatures = self.signatures_csr(indptr, indices)
+        self._grow(len(keys))
+        self.signatures[:len(keys)] = signatures
+        self.band_keys[:len(keys)] = self._band_keys(signatures)
+        for position, key in enumerate(keys):
+            self.positions.setdefault(key, position)
+        self.keys = keys
+        self.compact()
+        return self
+
+    def insert(self, key, movie_ids):
+        # Add a user, or replace their signature after their history changed
+        signature = self.signature(movie_ids)
+        band_keys = self._band_keys(signature)[0]
+        position = self.positions.get(key)
+        if position is None:
+            position = len(self.keys)
+            self._grow(position + 1)
+            self.keys.append(key)
+            self.positions[key] = position
+        else:
+            for band, old_key in enumerate(self.band_keys[position].tolist()):
+                bucket = self._recent[band].get(old_key)
+                if bucket:
+                    bucket.discard(position)
+        self.signatures[position] = signature
+        self.band_keys[position] = band_keys
+        if (signature != _MAX_HASH).any():
+            for band, band_key in enumerate(band_keys.tolist()):
+                self._recent[band].setdefault(band_key, set()).add(position)
+
+    def compact(self):
+        # Sort every user's current bucket keys into the per-band arrays
+        count = len(self.keys)
+        nonempty = np.flatnonzero((self.signatures[:count] != _MAX_HASH).any(axis=1))
+        band_keys = self.band_keys[nonempty].T
+        order = np.argsort(band_keys, axis=1, kind="stable")
+        self._sorted_keys = np.take_along_axis(band_keys, order, axis=1)
+        self._sorted_positions = nonempty[order]
+        self._recent = [{} for _ in range(self.bands)]
+
+    def _candidates(self, band_keys):
+        found = []
+        for band, band_key in enumerate(band_keys.tolist()):
+            keys = self._sorted_keys[band]
+            start = np.searchsorted(keys, band_key, side="left")
+            end = np.searchsorted(keys, band_key, side="right")
+            if end > start:
+                positions = self._sorted_positions[band, start:end]
+                # Skip users whose bucket changed since the arrays were sorted
+                found.append(positions[self.band_keys[positions, band] == band_key])
+            recent = self._recent[band].get(band_key)
+            if recent:
+                found.append(np.fromiter(recent, dtype=np.int64, count=len(recent)))
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(found))
+
+    def query(self, movie_ids, k=None, exclude=None):
+        # [(key, estimated_similarity), ...] for the candidate users, most
+        # similar first (ties in insertion order); exclude skips one key
+        signature = self.signature(movie_ids)
+        if (signature == _MAX_HASH).all():
+            return []
+        positions = self._candidates(self._band_keys(signature)[0])
+        if exclude is not None and exclude in self.positions:
+            positions = positions[positions != self.positions[exclude]]
+        estimates = (self.signatures[positions] == signature).mean(axis=1)
+        order = np.lexsort((positions, -estimates))
+        if k is not None:
+            order = order[:k]
+        return [(self.keys[positions[i]], float(estimates[i])) for i in order]
+
+    def save(self, filename):
+        # The hash parameters come back from the seed; buckets are re-sorted on load
+        count = len(self.keys)
+        np.savez(
+            filename,
+            params=np.array([self.num_perm, self.bands, self.seed], dtype=np.int64),
+            keys=np.array(self.keys, dtype=np.int64),
+            signatures=self.signatures[:count],
+        )
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename) as data:
+            num_perm, bands, seed = data["params"].tolist()
+            index = cls(num_perm, bands, seed)
+            keys = data["keys"].tolist()
+            signatures = data["signatures"]
+            index._grow(len(keys))
+            index.signatures[:len(keys)] = signatures
+            index.band_keys[:len(keys)] = index._band_keys(signatures)
+        index.keys = keys
+        index.positions = {}
+        for position, key in enumerate(keys):
+            index.positions.setdefault(key, position)
+        index.compact()
+        return index
+
+def build_user_index(engine, num_perm=96, bands=32, seed=1):
+    # Index every user of a CollaborativeEngine, keyed by user ID
+    keys = [engine.user_id(row) for row in range(engine.matrix.shape[0])]
+    return MinHashLSH(num_perm, bands, seed).build(keys, engine.matrix.indptr, engine.matrix.indices)
+
+if __name__ == "__main__":
+    from collaborative import CollaborativeEngine
+    parser = argparse.ArgumentParser(description="Build and save a MinHash/LSH index of users' watch histories.")
+    parser.add_argument("--movies", default="movies.json")
+    parser.add_argument("--users", default="users.json")
+    parser.add_argument("--out", default="similar_users.lsh.npz")
+    parser.add_argument("--num-perm", type=int, default=96, help="signature length")
+    parser.add_argument("--bands", type=int, default=32, help="LSH bands (more bands: higher recall, more candidates)")
+    args = parser.parse_args()
+
+    engine = CollaborativeEngine(load_users(args.users), load_catalog(args.movies))
+    index = build_user_index(engine, args.num_perm, args.bands)
+    index.save(args.out)
+    print(f"Indexed {len(index)} users ({args.bands} bands x {index.rows_per_band} rows, "
+          f"threshold ~{index.threshold:.2f}) into {args.out}")
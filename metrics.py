@@ -0,0 +1,208 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from functools import wraps
+
+# Lightweight timing spans and counters.
+#   with span("user_recommendations.similar_users"): ...   time a block
+#   @timed("load_data.load_movies")                       time every call
+#   count("app.cards_rendered", 25)                       add to a counter
+# A page starts a run at the top of the script and finishes it at the end.
+# Spans inside a run are summed per stage (a stage can be entered several
+# times per rerun), and finish_run() adds each stage's total, plus the whole
+# rerun as "<page>.total", to a rolling window of the last WINDOW values for
+# the p50/p95 columns. Spans outside a run (scripts, the HTTP service) go
+# straight into the window. Runs are per thread, like Streamlit reruns; a run
+# that never finished is dropped with abandon_run() and counted as
+# "<page>.stopped".
+#
+# export() writes everything to a file for scraping: Prometheus text format
+# for .prom/.txt files, one JSON object per line for .jsonl. The file is
+# written next to the target and renamed over it, so a scraper never reads a
+# half-written file. Where it goes is server configuration, not something a
+# page visitor chooses: EXPORT_FILE, and with AUTO_EXPORT on every finished
+# run of the process exports there.
+
+WINDOW = 500
+PREFIX = "nano_recommender"
+EXPORT_FILE = "metrics.prom"
+AUTO_EXPORT = False
+
+def percentile(values, p):
+    # Nearest-rank percentile of a non-empty list
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+class Run:
+    def __init__(self, page):
+        self.page = page
+        self.started = time.perf_counter()
+        # stage -> milliseconds in this rerun, in the order stages were first entered
+        self.stages = {}
+        self.total_ms = None
+
+class Metrics:
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.sums = {}
+        self.counts = {}
+        self.counters = {}
+        self.local = threading.local()
+        # When set, every finished run also exports to this file
+        self.export_file = EXPORT_FILE if AUTO_EXPORT else None
+
+    def _record(self, stage, ms):
+        with self.lock:
+            samples = self.samples.get(stage)
+            if samples is None:
+                samples = self.samples[stage] = deque(maxlen=self.window)
+            samples.append(ms)
+            self.sums[stage] = self.sums.get(stage, 0.0) + ms
+            self.counts[stage] = self.counts.get(stage, 0) + 1
+
+    def add(self, stage, ms):
+        run = getattr(self.local, "run", None)
+        if run is None:
+            self._record(stage, ms)
+        else:
+            run.stages[stage] = run.stages.get(stage, 0.0) + ms
+
+    def span(self, stage):
+        return _Span(self, stage)
+
+    def timed(self, stage):
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with _Span(self, stage):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def start_run(self, page):
+        self.local.run = Run(page)
+        self.count(f"{page}.reruns")
+        return self.local.run
+
+    def abandon_run(self):
+        # Drops this thread's unfinished run without recording it (its rerun
+        # was stopped part-way); the run, or None
+        run = getattr(self.local, "run", None)
+        if run is None:
+            return None
+        self.local.run = None
+        self.count(f"{run.page}.stopped")
+        return run
+
+    def finish_run(self):
+        run = getattr(self.local, "run", None)
+        if run is None:
+            return None
+        self.local.run = None
+        run.total_ms = (time.perf_counter() - run.started) * 1000
+        for stage, ms in run.stages.items():
+            self._record(stage, ms)
+        self._record(f"{run.page}.total", run.total_ms)
+        if self.export_file:
+            self.export(self.export_file)
+        return run
+
+    def summary(self):
+        # {stage: {"count", "last_ms", "p50_ms", "p95_ms", "sum_ms"}}
+        with self.lock:
+            samples = {stage: list(values) for stage, values in self.samples.items()}
+            sums = dict(self.sums)
+            counts = dict(self.counts)
+        return {
+            stage: {
+                "count": counts[stage],
+                "last_ms": values[-1],
+                "p50_ms": percentile(values, 50),
+                "p95_ms": percentile(values, 95),
+                "sum_ms": sums[stage],
+            }
+            for stage, values in sorted(samples.items())
+        }
+
+    def counter_values(self):
+        with self.lock:
+            return dict(sorted(self.counters.items()))
+
+    def to_prometheus(self):
+        lines = [
+            f"# HELP {PREFIX}_stage_seconds Time spent per stage (quantiles over the last {self.window} values)",
+            f"# TYPE {PREFIX}_stage_seconds summary",
+        ]
+        for stage, stats in self.summary().items():
+            label = _label(stage)
+            lines.append(f'{PREFIX}_stage_seconds{{stage="{label}",quantile="0.5"}} {stats["p50_ms"] / 1000:.6f}')
+            lines.append(f'{PREFIX}_stage_seconds{{stage="{label}",quantile="0.95"}} {stats["p95_ms"] / 1000:.6f}')
+            lines.append(f'{PREFIX}_stage_seconds_sum{{stage="{label}"}} {stats["sum_ms"] / 1000:.6f}')
+            lines.append(f'{PREFIX}_stage_seconds_count{{stage="{label}"}} {stats["count"]}')
+        lines.append(f"# HELP {PREFIX}_events_total Counted events")
+        lines.append(f"# TYPE {PREFIX}_events_total counter")
+        for name, value in self.counter_values().items():
+            lines.append(f'{PREFIX}_events_total{{name="{_label(name)}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def to_json_lines(self):
+        timestamp = time.time()
+        lines = [
+            json.dumps({"timestamp": timestamp, "type": "stage", "stage": stage, **stats})
+            for stage, stats in self.summary().items()
+        ]
+        lines += [
+            json.dumps({"timestamp": timestamp, "type": "counter", "name": name, "value": value})
+            for name, value in self.counter_values().items()
+        ]
+        return "".join(line + "\n" for line in lines)
+
+    def export(self, filename):
+        text = self.to_json_lines() if filename.endswith(".jsonl") else self.to_prometheus()
+        temporary = f"{filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "w") as file:
+            file.write(text)
+        os.replace(temporary, filename)
+
+    def reset(self):
+        with self.lock:
+            self.samples.clear()
+            self.sums.clear()
+            self.counts.clear()
+            self.counters.clear()
+
+class _Span:
+    __slots__ = ("metrics", "stage", "started")
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.add(self.stage, (time.perf_counter() - self.started) * 1000)
+        return False
+
+def _label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+# One registry per process
+metrics = Metrics()
+span = metrics.span
+timed = metrics.timed
+count = metrics.count
+start_run = metrics.start_run
+finish_run = metrics.finish_run
+abandon_run = metrics.abandon_run
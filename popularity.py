@@ -0,0 +1,125 @@
+import argparse
+import numpy as np
+from load_data import load_catalog, load_users, uses_catalog_ids
+from ranking import Leaderboard, Leaderboards
+
+# Popularity rankings for users we know nothing about yet.
+# Sorting by raw rating puts a 9.5 that two people watched above a 9.0 that
+# thousands watched. Here every movie gets a Bayesian average instead:
+#   score = (watches * rating + prior_watches * prior_rating) / (watches + prior_watches)
+# A movie with few watches is pulled towards prior_rating (the catalog's mean
+# rating); the more people watched it, the closer its score is to its own
+# rating. prior_watches defaults to the mean number of watches per movie.
+#
+# The scores are kept in Leaderboards (ranking.py), one global and one per
+# genre, so top(k) only walks the first k entries. A watch event changes one
+# movie's count, so add_watch() re-scores that movie and moves it within the
+# boards it is in; the priors stay fixed until the rankings are rebuilt.
+# save() stores the counts, priors and the ordered boards, and load() restores
+# them without sorting again.
+
+def watch_counts(catalog, users):
+    # Number of distinct users who watched each movie ID
+    if uses_catalog_ids(users, catalog):
+        # One (user, movie) pair per user and movie, so repeated watches count once
+        count = max(len(catalog), 1)
+        rows = np.repeat(np.arange(len(users), dtype=np.int64), np.diff(users.watch_offsets))
+        pairs = np.unique(rows * count + np.asarray(users.watch_ids, dtype=np.int64))
+        return np.bincount(pairs % count, minlength=len(catalog)).tolist()
+    counts = [0] * len(catalog)
+    for user in users:
+        for movie_id in set(catalog.movie_id(title) for title in user["watched_movies"]):
+            if movie_id is not None:
+                counts[movie_id] += 1
+    return counts
+
+class PopularityRankings(Leaderboards):
+    def __init__(self, catalog, counts, prior_watches=None, prior_rating=None):
+        if hasattr(catalog, "ratings"):
+            self.movie_ratings = catalog.ratings.tolist()
+        else:
+            self.movie_ratings = [movie["rating"] for movie in catalog.movies]
+        self.counts = list(counts)
+        if prior_rating is None:
+            prior_rating = sum(self.movie_ratings) / len(self.movie_ratings) if self.movie_ratings else 0.0
+        if prior_watches is None:
+            prior_watches = max(sum(self.counts) / len(self.counts), 1.0) if self.counts else 1.0
+        self.prior_rating = float(prior_rating)
+        self.prior_watches = float(prior_watches)
+        super().__init__(catalog, [self.score(i) for i in range(len(self.counts))])
+
+    @classmethod
+    def from_users(cls, catalog, users, prior_watches=None, prior_rating=None):
+        return cls(catalog, watch_counts(catalog, users), prior_watches, prior_rating)
+
+    def score(self, movie_id):
+        watches = self.counts[movie_id]
+        return (watches * self.movie_ratings[movie_id] + self.prior_watches * self.prior_rating) / (
+            watches + self.prior_watches)
+
+    def watches(self, movie_id):
+        return self.counts[movie_id]
+
+    def add_watch(self, movie_id, count=1):
+        # One more viewer (or count more): O(log n) per board the movie is in
+        self.counts[movie_id] += count
+        self.set_rating(movie_id, self.score(movie_id))
+
+    def reason(self, movie):
+        movie_id = self.catalog.movie_id(movie["title"])
+        return f"Popular pick: watched by {self.counts[movie_id]} users, rated {movie['rating']}"
+
+    def save(self, filename):
+        genres = list(self.by_genre)
+        genre_orders = [list(self.by_genre[genre].ids()) for genre in genres]
+        np.savez(
+            filename,
+            priors=np.array([self.prior_watches, self.prior_rating], dtype=np.float64),
+            counts=np.array(self.counts, dtype=np.int64),
+            overall=np.array(list(self.overall.ids()), dtype=np.int64),
+            genres=np.array(genres, dtype=str),
+            genre_offsets=np.cumsum([0] + [len(order) for order in genre_orders], dtype=np.int64),
+            genre_ids=np.array([i for order in genre_orders for i in order], dtype=np.int64),
+        )
+
+    @classmethod
+    def load(cls, filename, catalog):
+        # The saved boards are already in order, so no sorting is needed
+        rankings = cls.__new__(cls)
+        with np.load(filename) as data:
+            rankings.prior_watches, rankings.prior_rating = data["priors"].tolist()
+            rankings.counts = data["counts"].tolist()
+            overall = data["overall"].tolist()
+            genres = data["genres"].tolist()
+            offsets = data["genre_offsets"].tolist()
+            genre_ids = data["genre_ids"].tolist()
+        rankings.catalog = catalog
+        if hasattr(catalog, "ratings"):
+            rankings.movie_ratings = catalog.ratings.tolist()
+        else:
+            rankings.movie_ratings = [movie["rating"] for movie in catalog.movies]
+        rankings.ratings = [rankings.score(i) for i in range(len(rankings.counts))]
+        scores = rankings.ratings
+        rankings.overall = Leaderboard([(-scores[i], i) for i in overall])
+        rankings.by_genre = {
+            genre: Leaderboard([(-scores[i], i) for i in genre_ids[offsets[g]:offsets[g + 1]]])
+            for g, genre in enumerate(genres)
+        }
+        return rankings
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build and save the popularity rankings used for new users.")
+    parser.add_argument("--movies", default="movies.json")
+    parser.add_argument("--users", default="users.json")
+    parser.add_argument("--out", default="popularity.npz")
+    parser.add_argument("--prior-watches", type=float, default=None,
+                        help="weight of the catalog mean rating (default: mean watches per movie)")
+    args = parser.parse_args()
+
+    catalog = load_catalog(args.movies)
+    rankings = PopularityRankings.from_users(catalog, load_users(args.users), args.prior_watches)
+    rankings.save(args.out)
+    print(f"Ranked {len(rankings.counts)} movies (prior: {rankings.prior_watches:.1f} watches "
+          f"at rating {rankings.prior_rating:.2f}) into {args.out}")
+    for movie in rankings.top(5):
+        print(f"  {movie['title']} - {rankings.reason(movie)}")
@@ -0,0 +1,141 @@
+from load_data import load_catalog, load_users, uses_catalog_ids
+
+# User taste profiles that are kept up to date instead of recomputed.
+# A profile holds the IDs of the movies a user watched, how many of them are in
+# each genre, and the genres ordered from most to least watched. Adding or
+# removing one movie only touches that movie's genres: each genre count moves
+# by one and the genre swaps with its neighbours in the ordering until it is
+# back in place. Reading the favourite genres never has to look at the history.
+
+class UserProfile:
+    def __init__(self):
+        self.watched = set()
+        self.genre_counts = {}
+        self.favorites = []
+        self.positions = {}
+        # Bumped on every change, so results computed from the profile can be versioned
+        self.version = 0
+
+    def copy(self):
+        profile = UserProfile()
+        profile.watched = set(self.watched)
+        profile.genre_counts = dict(self.genre_counts)
+        profile.favorites = list(self.favorites)
+        profile.positions = dict(self.positions)
+        profile.version = self.version
+        return profile
+
+    def _before(self, a, b):
+        # Most watched first; ties in alphabetical order
+        return (-self.genre_counts[a], a) < (-self.genre_counts[b], b)
+
+    def _swap(self, i, j):
+        favorites = self.favorites
+        favorites[i], favorites[j] = favorites[j], favorites[i]
+        self.positions[favorites[i]] = i
+        self.positions[favorites[j]] = j
+
+    def _change(self, genre, delta):
+        if genre not in self.positions:
+            self.positions[genre] = len(self.favorites)
+            self.favorites.append(genre)
+            self.genre_counts[genre] = 0
+        self.genre_counts[genre] += delta
+        i = self.positions[genre]
+        if delta > 0:
+            while i > 0 and self._before(genre, self.favorites[i - 1]):
+                self._swap(i, i - 1)
+                i -= 1
+        else:
+            while i < len(self.favorites) - 1 and self._before(self.favorites[i + 1], genre):
+                self._swap(i, i + 1)
+                i += 1
+            if self.genre_counts[genre] == 0:
+                # A genre with no movies left has sunk to the end of the list
+                self.favorites.pop()
+                del self.positions[genre]
+                del self.genre_counts[genre]
+
+    def add(self, movie_id, genres):
+        if movie_id in self.watched:
+            return False
+        self.watched.add(movie_id)
+        for genre in set(genres):
+            self._change(genre, 1)
+        self.version += 1
+        return True
+
+    def remove(self, movie_id, genres):
+        if movie_id not in self.watched:
+            return False
+        self.watched.remove(movie_id)
+        for genre in set(genres):
+            self._change(genre, -1)
+        self.version += 1
+        return True
+
+    def favorite_genres(self, n=None):
+        # [(genre, count), ...], most watched first
+        return [(genre, self.genre_counts[genre]) for genre in self.favorites[:n]]
+
+class UserProfileStore:
+    def __init__(self, catalog, users=()):
+        self.catalog = catalog
+        self.profiles = {}
+        if uses_catalog_ids(users, catalog):
+            # Compiled users already store movie IDs: no title lookups needed
+            for row, user_id in enumerate(users.user_ids.tolist()):
+                profile = self.profiles.setdefault(user_id, UserProfile())
+                for movie_id in users.watched_ids(row):
+                    profile.add(movie_id, catalog.genres_of(movie_id))
+            return
+        for user in users:
+            for title in user["watched_movies"]:
+                self.add(user["user_id"], title)
+            # Users with no known movies still get an (empty) profile
+            self.profiles.setdefault(user["user_id"], UserProfile())
+
+    def get(self, user_id):
+        return self.profiles.get(user_id) or UserProfile()
+
+    def _movie(self, title):
+        movie_id = self.catalog.movie_id(title)
+        if movie_id is None:
+            return None, ()
+        return movie_id, self.catalog.genres_of(movie_id)
+
+    def add(self, user_id, title):
+        # Titles missing from the catalog are ignored, like everywhere else
+        movie_id, genres = self._movie(title)
+        if movie_id is None:
+            return False
+        profile = self.profiles.setdefault(user_id, UserProfile())
+        return profile.add(movie_id, genres)
+
+    def remove(self, user_id, title):
+        movie_id, genres = self._movie(title)
+        profile = self.profiles.get(user_id)
+        if movie_id is None or profile is None:
+            return False
+        return profile.remove(movie_id, genres)
+
+    def favorite_genres(self, user_id, n=None):
+        return self.get(user_id).favorite_genres(n)
+
+    def version(self, user_id):
+        return self.get(user_id).version
+
+    def watched_ids(self, user_id):
+        return self.get(user_id).watched
+
+if __name__ == "__main__":
+    catalog = load_catalog("movies.json")
+    users = load_users("users.json")
+    store = UserProfileStore(catalog, users)
+
+    print("Alice's favourite genres:", store.favorite_genres(101))
+    store.add(101, "The Godfather")
+    store.add(101, "Forrest Gump")
+    print("After two dramas:", store.favorite_genres(101))
+    store.remove(101, "Inception")
+    print("After removing Inception:", store.favorite_genres(101))
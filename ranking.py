@@ -0,0 +1,116 @@
+import heapq
+from bisect import bisect_left, insort
+
+# Ranking helpers.
+# The pages only ever show the best three to five movies, so fully sorting the
+# candidates (O(n log n)) is wasted work. top_k keeps a heap of size k instead
+# (O(n log k)), and Leaderboards keeps every genre's movies ordered by rating
+# ahead of time so a top-k query only walks the first few entries.
+
+def top_k(items, k, key, exclude=(), exclude_key=lambda item: item["title"]):
+    # Same result as sorted(items, key=key, reverse=True)[:k], ties keep input
+    # order, skipping items whose exclude_key is in exclude
+    if exclude:
+        items = (item for item in items if exclude_key(item) not in exclude)
+    return heapq.nlargest(k, items, key=key)
+
+def argtop_k(ids, scores, k):
+    # NumPy version for score arrays: positions of the k best scores, best
+    # first, ties broken by lower ID. argpartition finds the k-th best score
+    # without sorting everything; every entry tied with it is kept so the
+    # tie-break stays deterministic.
+    import numpy as np  # Only needed by the NumPy-based engines
+    if k is not None and k < len(ids):
+        cutoff = -np.partition(-scores, k - 1)[k - 1]
+        keep = np.flatnonzero(scores >= cutoff)
+    else:
+        keep = np.arange(len(ids))
+    order = keep[np.lexsort((ids[keep], -scores[keep]))]
+    return order if k is None else order[:k]
+
+class Leaderboard:
+    # Movie IDs ordered by rating (highest first, ties by movie ID). Entries are
+    # (-rating, movie_id) tuples so the list is simply kept in ascending order.
+    def __init__(self, entries=()):
+        self.entries = list(entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, movie_id, rating):
+        insort(self.entries, (-rating, movie_id))
+
+    def remove(self, movie_id, rating):
+        position = bisect_left(self.entries, (-rating, movie_id))
+        if position < len(self.entries) and self.entries[position] == (-rating, movie_id):
+            del self.entries[position]
+
+    def ids(self):
+        for _, movie_id in self.entries:
+            yield movie_id
+
+    def top(self, k, exclude=()):
+        # Walk from the top and stop after k movies that are not excluded
+        result = []
+        for _, movie_id in self.entries:
+            if len(result) >= k:
+                break
+            if movie_id not in exclude:
+                result.append(movie_id)
+        return result
+
+class Leaderboards:
+    # A global leaderboard plus one per genre, built once from the catalog's
+    # ratings and genre posting lists and updated in place when a rating changes.
+    # Any other per-movie score can be ranked the same way by passing ratings
+    # (popularity.py does this with Bayesian-averaged ratings).
+    def __init__(self, catalog, ratings=None):
+        self.catalog = catalog
+        if ratings is not None:
+            self.ratings = list(ratings)
+        elif hasattr(catalog, "ratings"):
+            # Compiled catalogs keep ratings in one array
+            self.ratings = catalog.ratings.tolist()
+        else:
+            self.ratings = [movie["rating"] for movie in catalog.movies]
+        self.overall = Leaderboard(sorted((-rating, i) for i, rating in enumerate(self.ratings)))
+        self.by_genre = {}
+        for genre in catalog.genres:
+            movie_ids = [int(i) for i in catalog.genre_index.ids(genre)]
+            self.by_genre[genre] = Leaderboard(sorted((-self.ratings[i], i) for i in movie_ids))
+
+    def board(self, genre=None):
+        if genre is None:
+            return self.overall
+        return self.by_genre.get(genre, Leaderboard())
+
+    def top(self, k, genre=None, exclude=()):
+        return [self.catalog[i] for i in self.board(genre).top(k, exclude)]
+
+    def top_any(self, k, genres, exclude=()):
+        # Best k movies in any of the genres: merge the genre boards lazily
+        boards = [self.board(genre).entries for genre in set(genres)]
+        result = []
+        seen = set()
+        for _, movie_id in heapq.merge(*boards):
+            if len(result) >= k:
+                break
+            if movie_id in seen or movie_id in exclude:
+                continue
+            seen.add(movie_id)
+            result.append(self.catalog[movie_id])
+        return result
+
+    def set_rating(self, movie_id, rating):
+        # O(log n) search plus a list shift in each board the movie appears in
+        old_rating = self.ratings[movie_id]
+        if rating == old_rating:
+            return
+        genres = set(self.catalog.genres_of(movie_id))
+        for board in [self.overall] + [self.by_genre[g] for g in genres]:
+            board.remove(movie_id, old_rating)
+            board.add(movie_id, rating)
+        self.ratings[movie_id] = rating
+
+    def rating(self, movie_id):
+        return self.ratings[movie_id]
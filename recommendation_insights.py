@@ -1,11 +1,39 @@
 import streamlit as st
 import json
 import copy
-from load_data import load_movies, load_users
+from data_layer import (get_catalog, get_item_index, get_leaderboards, get_movie_cards, get_popularity, get_profiles,
+                        get_result_cache, get_user_directory, get_watch_log, cache_stats, pin_snapshot,
+                        request_reload, result_cache_stats)
+from metrics import count, span
+from watch_log import WatchLogLocked
+from widgets import end_page, start_page, user_picker
 
-# Load data
-movies = load_movies("movies.json")
-users = load_users("users.json")
+start_page("recommendation_insights")
+
+# Load data from one snapshot for the whole rerun; a new snapshot is built in
+# the background when the data files change
+with span("recommendation_insights.load_data"):
+    pin_snapshot()
+    catalog = get_catalog()
+    movies = catalog.movies
+    directory = get_user_directory()
+    leaderboards = get_leaderboards()
+    popularity = get_popularity()
+    profiles = get_profiles()
+    movie_cards = get_movie_cards()
+
+def render_cards(movies, **options):
+    with span("recommendation_insights.render"):
+        st.markdown(movie_cards.cards(movies, **options), unsafe_allow_html=True)
+    count("recommendation_insights.cards_rendered", len(movies))
+
+def item_index_or_hint():
+    # The similar-movie index saved by python item_similarity.py, or a note on building it
+    item_index = get_item_index()
+    if item_index is None:
+        st.info("The similar-movie index is missing or older than movies.json. "
+                "Build it offline with `python item_similarity.py`.")
+    return item_index
 
 st.set_page_config(page_title="Recommendation System Insights", layout="wide")
 
@@ -54,6 +82,10 @@ st.markdown("""
 
 st.markdown('<p class="big-font">🔍 Recommendation System Insights</p>', unsafe_allow_html=True)
 
+with st.sidebar.expander("🗄️ Data Cache"):
+    st.write(cache_stats())
+    st.write({"results": result_cache_stats()})
+
 # Tabs for different sections
 tab1, tab2, tab3 = st.tabs(["Cold Start Problem", "Adding New Ratings", "User Activity Impact"])
 
@@ -110,20 +142,59 @@ with tab1:
         st.subheader("Generic Recommendations for New User")
         st.write("Since we don't know your preferences, here are the most popular movies overall:")
         
-        top_rated = sorted(movies, key=lambda x: x['rating'], reverse=True)[:5]
+        # Precomputed ranking of rating weighted by watch counts
+        with span("recommendation_insights.popularity"):
+            popular = popularity.top(5)
         
-        for movie in top_rated:
-            st.markdown(f"""
-            <div class="movie-card">
-            <p class="movie-title">{movie['title']}</p>
-            <p class="movie-details">
-            <b>Genre:</b> {', '.join(movie['genre'])}<br>
-            <b>Rating:</b> {'⭐' * int(movie['rating']//2)} ({movie['rating']})<br>
-            <b>Release Year:</b> {movie['release_year']}<br>
-            <b>Recommendation reason:</b> One of our highest-rated movies
-            </p>
-            </div>
-            """, unsafe_allow_html=True)
+        reasons = [popularity.reason(movie) for movie in popular]
+        render_cards(popular, reasons=reasons, reason_label="Recommendation reason")
+    
+    st.subheader("Simulation: New Item Cold Start")
+    
+    # Place a movie nobody has watched yet next to its most similar movies by content
+    st.write("Let's simulate adding a new movie that nobody has watched yet:")
+    
+    item_col1, item_col2, item_col3 = st.columns(3)
+    new_movie_title = item_col1.text_input("Title of the new movie", "New Movie")
+    new_movie_genres = item_col1.multiselect("Genres", catalog.genres, default=catalog.genres[:1])
+    new_movie_year = item_col2.number_input("Release year", min_value=1900, max_value=2100, value=2024)
+    new_movie_rating = item_col3.slider("Rating", 0.0, 10.0, 7.5, 0.1)
+    
+    # Both lookups read the similar-movie index saved by python item_similarity.py,
+    # and only when asked: it is never built while serving the page
+    simulate = st.button("Simulate New Movie")
+    item_index = item_index_or_hint() if simulate else None
+    if item_index is not None:
+        with span("recommendation_insights.item_similarity"):
+            placed = item_index.place(new_movie_genres, new_movie_year, new_movie_rating)[:5]
+        st.markdown("""
+        <div class="info-box">
+        <h4>Content-Based Placement</h4>
+        <p>No one has watched this movie, but its genres, release year and rating place it next to
+        the movies below. It can be suggested to the people who enjoyed them right away.</p>
+        </div>
+        """, unsafe_allow_html=True)
+    
+        st.subheader(f"Movies most like {new_movie_title}")
+        similar_movies = [catalog[movie_id] for movie_id, _ in placed]
+        reasons = [f"Content similarity {score:.2f}" for _, score in placed]
+        render_cards(similar_movies, reasons=reasons, reason_label="Why it's similar")
+    
+    st.subheader("More Like This")
+    with st.form("more_like_this_form"):
+        liked_title = st.text_input("Movie title", movies[0]["title"] if movies else "", key="more_like_this")
+        find_similar = st.form_submit_button("Find Similar Movies")
+    liked_id = catalog.movie_id(liked_title) if find_similar else None
+    if find_similar and liked_id is None:
+        st.write("No movie with that title in the catalog.")
+    item_index = item_index_or_hint() if liked_id is not None else None
+    if item_index is not None:
+        # A single row of the precomputed neighbour lists
+        with span("recommendation_insights.item_similarity"):
+            neighbours = item_index.more_like_this(liked_id, 5)
+        similar_movies = [catalog[movie_id] for movie_id, _ in neighbours]
+        reasons = [f"Content similarity {score:.2f}" for _, score in neighbours]
+        render_cards(similar_movies, reasons=reasons, reason_label="Why it's similar")
     
     st.markdown("""
     <div class="success-box">
@@ -149,50 +220,32 @@ with tab2:
     """, unsafe_allow_html=True)
     
     # Select a user to simulate
-    selected_name = st.selectbox("Choose a user to simulate:", [user['name'] for user in users])
-    selected_user = next((user for user in users if user['name'] == selected_name), None)
+    selected_user = user_picker(directory, "Choose a user to simulate:", "simulation_user")
     
     if selected_user:
-        # Make a copy of the user to simulate changes
-        simulation_user = copy.deepcopy(selected_user)
+        # Make a copy of the user and their profile to simulate changes
+        with span("recommendation_insights.genre_profile"):
+            simulation_user = copy.deepcopy(selected_user)
+            simulation_profile = profiles.get(selected_user['user_id']).copy()
         watched_titles = set(simulation_user['watched_movies'])
         
         # Current recommendations before new ratings
         st.subheader("Current Recommendations")
         
-        # Calculate current genre preferences
-        genre_counts = {}
-        for title in watched_titles:
-            movie = next((m for m in movies if m['title'] == title), None)
-            if movie:
-                for genre in movie['genre']:
-                    genre_counts[genre] = genre_counts.get(genre, 0) + 1
-        
-        favorite_genres = sorted(genre_counts.items(), key=lambda x: x[1], reverse=True)[:2]
+        # Current genre preferences, read from the profile store
+        favorite_genres = simulation_profile.favorite_genres(2)
         favorite_genre_names = [genre for genre, _ in favorite_genres]
         
-        # Get initial recommendations based on genre preferences
-        unwatched_movies = [m for m in movies if m['title'] not in watched_titles]
-        initial_recommendations = []
+        # Get initial recommendations based on genre preferences: merge the
+        # two genre leaderboards and stop after three unwatched movies
+        with span("recommendation_insights.rankings"):
+            initial_recommendations = leaderboards.top_any(3, favorite_genre_names, exclude=simulation_profile.watched)
         
-        for movie in unwatched_movies:
-            if any(genre in movie['genre'] for genre in favorite_genre_names):
-                initial_recommendations.append(movie)
-        
-        initial_recommendations = sorted(initial_recommendations, key=lambda x: x['rating'], reverse=True)[:3]
-        
-        for movie in initial_recommendations:
-            matching_genres = [g for g in movie['genre'] if g in favorite_genre_names]
-            st.markdown(f"""
-            <div class="movie-card">
-            <p class="movie-title">{movie['title']}</p>
-            <p class="movie-details">
-            <b>Genre:</b> {', '.join(movie['genre'])}<br>
-            <b>Rating:</b> {'⭐' * int(movie['rating']//2)} ({movie['rating']})<br>
-            <b>Recommended because:</b> Matches your preferred genres ({', '.join(matching_genres)})
-            </p>
-            </div>
-            """, unsafe_allow_html=True)
+        reasons = [
+            f"Matches your preferred genres ({', '.join(g for g in movie['genre'] if g in favorite_genre_names)})"
+            for movie in initial_recommendations
+        ]
+        render_cards(initial_recommendations, layout="genre_rating", reasons=reasons)
         
         # Let user add new ratings
         st.subheader("Add New Movies to Your Watch History")
@@ -200,15 +253,14 @@ with tab2:
         available_to_add = [m for m in movies if m['title'] not in watched_titles]
         
         # Group movies by genre for better selection
-        genre_options = list(set(genre for movie in movies for genre in movie['genre']))
         selected_add_genre = st.selectbox(
             "Filter by genre:", 
-            ["All Genres"] + genre_options
+            ["All Genres"] + catalog.genres
         )
         
         # Filter movies by selected genre
         if selected_add_genre != "All Genres":
-            filtered_to_add = [m for m in available_to_add if selected_add_genre in m['genre']]
+            filtered_to_add = [m for m in catalog.movies_in_genre(selected_add_genre) if m['title'] not in watched_titles]
         else:
             filtered_to_add = available_to_add
             
@@ -223,27 +275,46 @@ with tab2:
                         if st.checkbox(f"{movie['title']} ({movie['rating']}⭐)", key=f"add_{movie['title']}"):
                             selected_titles.append(movie['title'])
         
+        save_history = st.checkbox(
+            "Save to the watch log", key="save_watch_history",
+            help="Keep the selected movies in the user's watch history instead of only simulating them"
+        )
+        
         if st.button("Update Watch History"):
             # Update the simulation user's watched movies
             simulation_user['watched_movies'].extend(selected_titles)
-            updated_watched = set(simulation_user['watched_movies'])
+            saved = False
+            if save_history and selected_titles:
+                # Appends one event per movie to the watch log (users.json is not
+                # rewritten); the pages read the new history from the next snapshot
+                with span("recommendation_insights.watch_log"):
+                    try:
+                        watch_log = get_watch_log()
+                    except WatchLogLocked as error:
+                        st.error(f"Not saved: {error} (e.g. server.py --watch-log).")
+                    else:
+                        watch_log.wait(watch_log.watch(selected_user['user_id'], selected_titles))
+                        saved = True
+                        # The next snapshot has a new data version, so lists cached
+                        # for the old history are never read again; free them now
+                        get_result_cache().invalidate_user(selected_user['user_id'])
+                request_reload()
             
-            st.markdown("""
+            updated_text = "saved to the watch log" if saved else "updated with the selected movies"
+            st.markdown(f"""
             <div class="success-box">
             <h4>Watch History Updated!</h4>
-            <p>Your simulated watch history has been updated with the selected movies.</p>
+            <p>Your simulated watch history has been {updated_text}.</p>
             </div>
             """, unsafe_allow_html=True)
             
-            # Recalculate genre preferences
-            updated_genre_counts = {}
-            for title in updated_watched:
-                movie = next((m for m in movies if m['title'] == title), None)
-                if movie:
-                    for genre in movie['genre']:
-                        updated_genre_counts[genre] = updated_genre_counts.get(genre, 0) + 1
+            # Apply only the new movies to the copied profile
+            for title in selected_titles:
+                movie_id = catalog.movie_id(title)
+                if movie_id is not None:
+                    simulation_profile.add(movie_id, catalog[movie_id]['genre'])
             
-            updated_favorite_genres = sorted(updated_genre_counts.items(), key=lambda x: x[1], reverse=True)[:2]
+            updated_favorite_genres = simulation_profile.favorite_genres(2)
             updated_genre_names = [genre for genre, _ in updated_favorite_genres]
             
             # Before and after genre comparison
@@ -261,27 +332,14 @@ with tab2:
             st.subheader("Updated Recommendations")
             
             # Get new recommendations
-            updated_unwatched = [m for m in movies if m['title'] not in updated_watched]
-            updated_recommendations = []
-            
-            for movie in updated_unwatched:
-                if any(genre in movie['genre'] for genre in updated_genre_names):
-                    updated_recommendations.append(movie)
+            with span("recommendation_insights.rankings"):
+                updated_recommendations = leaderboards.top_any(3, updated_genre_names, exclude=simulation_profile.watched)
             
-            updated_recommendations = sorted(updated_recommendations, key=lambda x: x['rating'], reverse=True)[:3]
-            
-            for movie in updated_recommendations:
-                matching_genres = [g for g in movie['genre'] if g in updated_genre_names]
-                st.markdown(f"""
-                <div class="movie-card">
-                <p class="movie-title">{movie['title']}</p>
-                <p class="movie-details">
-                <b>Genre:</b> {', '.join(movie['genre'])}<br>
-                <b>Rating:</b> {'⭐' * int(movie['rating']//2)} ({movie['rating']})<br>
-                <b>Recommended because:</b> Matches your updated preferences ({', '.join(matching_genres)})
-                </p>
-                </div>
-                """, unsafe_allow_html=True)
+            reasons = [
+                f"Matches your updated preferences ({', '.join(g for g in movie['genre'] if g in updated_genre_names)})"
+                for movie in updated_recommendations
+            ]
+            render_cards(updated_recommendations, layout="genre_rating", reasons=reasons)
             
             # Show changes in recommendations
             initial_titles = set(m['title'] for m in initial_recommendations)
@@ -365,8 +423,7 @@ with tab3:
         st.subheader("Simulation: Rating Impact")
         
         # Create a simple rating simulation
-        user_to_rate = st.selectbox("Select user:", [user['name'] for user in users])
-        selected_user = next((user for user in users if user['name'] == user_to_rate), None)
+        selected_user = user_picker(directory, "Select user:", "rating_user")
         
         if selected_user:
             watched_movies = selected_user['watched_movies']
@@ -376,7 +433,7 @@ with tab3:
             rating = st.slider("Your rating:", 1, 10, 8)
             
             if st.button("Submit Rating"):
-                movie_info = next((m for m in movies if m['title'] == movie_to_rate), None)
+                movie_info = catalog.get(movie_to_rate)
                 
                 st.markdown(f"""
                 <div class="success-box">
@@ -416,10 +473,10 @@ with tab3:
         # Group movies by genre for browsing
         genre_for_browsing = st.selectbox(
             "You're browsing this genre:", 
-            list(set(genre for movie in movies for genre in movie['genre']))
+            catalog.genres
         )
         
-        genre_movies = [m for m in movies if genre_for_browsing in m['genre']]
+        genre_movies = catalog.movies_in_genre(genre_for_browsing)
         
         viewed_movies = []
         for i in range(0, len(genre_movies), 3):
@@ -448,21 +505,12 @@ with tab3:
                 st.write(f"✅ More {genre_for_browsing} movies will be recommended")
                 
                 # Show some recommended movies in this genre
-                other_genre_movies = [m for m in movies if genre_for_browsing in m['genre'] and m['title'] not in viewed_movies]
-                other_genre_movies = sorted(other_genre_movies, key=lambda x: x['rating'], reverse=True)[:3]
+                with span("recommendation_insights.rankings"):
+                    other_genre_movies = leaderboards.top(3, genre=genre_for_browsing, exclude=catalog.ids_of(viewed_movies))
                 
                 st.subheader(f"Recommended {genre_for_browsing} Movies")
-                for movie in other_genre_movies:
-                    st.markdown(f"""
-                    <div class="movie-card">
-                    <p class="movie-title">{movie['title']}</p>
-                    <p class="movie-details">
-                    <b>Rating:</b> {'⭐' * int(movie['rating']//2)} ({movie['rating']})<br>
-                    <b>Release Year:</b> {movie['release_year']}<br>
-                    <b>Recommended because:</b> You showed interest in {genre_for_browsing} movies
-                    </p>
-                    </div>
-                    """, unsafe_allow_html=True)
+                reasons = [f"You showed interest in {genre_for_browsing} movies"] * len(other_genre_movies)
+                render_cards(other_genre_movies, layout="rating_year", reasons=reasons)
             else:
                 st.write("👎 Not enough browsing activity to detect strong preferences")
                 st.write("✅ Minor adjustment to your interest profile")
@@ -500,25 +548,14 @@ with tab3:
             recommended_genres = ["Action", "Sci-Fi", "Adventure"]
         
         # Show some recommendations based on the time scenario
-        time_recommendations = []
-        for movie in movies:
-            if any(genre in movie['genre'] for genre in recommended_genres):
-                time_recommendations.append(movie)
-        
-        time_recommendations = sorted(time_recommendations, key=lambda x: x['rating'], reverse=True)[:3]
-        
-        for movie in time_recommendations:
-            matching_genres = [g for g in movie['genre'] if g in recommended_genres]
-            st.markdown(f"""
-            <div class="movie-card">
-            <p class="movie-title">{movie['title']}</p>
-            <p class="movie-details">
-            <b>Genre:</b> {', '.join(movie['genre'])}<br>
-            <b>Rating:</b> {'⭐' * int(movie['rating']//2)} ({movie['rating']})<br>
-            <b>Recommended because:</b> {', '.join(matching_genres)} movies are popular during {time_scenario.lower()}
-            </p>
-            </div>
-            """, unsafe_allow_html=True)
+        with span("recommendation_insights.rankings"):
+            time_recommendations = leaderboards.top_any(3, recommended_genres)
+        
+        reasons = [
+            f"{', '.join(g for g in movie['genre'] if g in recommended_genres)} movies are popular during {time_scenario.lower()}"
+            for movie in time_recommendations
+        ]
+        render_cards(time_recommendations, layout="genre_rating", reasons=reasons)
     
     st.markdown("""
     <div class="success-box">
@@ -526,4 +563,6 @@ with tab3:
     <p>Modern recommendation systems continuously update their models based on user activity.
     The more you interact with the system, the better it gets at predicting what you'll enjoy.</p>
     </div>
-    """, unsafe_allow_html=True) 
\ No newline at end of file
+    """, unsafe_allow_html=True)
+
+end_page()
@@ -0,0 +1,200 @@
+import json
+from load_data import load_catalog, load_users
+from ranking import Leaderboards
+from profiles import UserProfileStore
+
+# The four recommendation strategies from user_recommendations.py as plain
+# functions, so they can run outside Streamlit (batch jobs, scripts, services).
+# STRATEGIES holds those four, and recommend_all() runs them. The hybrid blend
+# is opt-in: it is in ALL_STRATEGIES, so callers can ask for it by name, but
+# it is left out of "all strategies" results and the batch file.
+# Each strategy takes a RecommenderContext and a user dict and returns a list of
+# {"movie": movie, "reason": "..."} dicts, best first. They only read from the
+# context, so one context can be shared by many users and processes.
+
+RECENT_SINCE = 2015
+
+class RecommenderContext:
+    def __init__(self, catalog, users, engine, leaderboards, profiles, scorer=None):
+        self.catalog = catalog
+        self.users = users
+        self.engine = engine
+        self.leaderboards = leaderboards
+        self.profiles = profiles
+        # HybridScorer (hybrid.py); only the hybrid strategy needs it
+        self.scorer = scorer
+
+def build_context(movies_file="movies.json", users_file="users.json", watch_log_dir=None):
+    from collaborative import CollaborativeEngine  # SciPy, only needed here
+    from hybrid import HybridScorer
+    catalog = load_catalog(movies_file)
+    if watch_log_dir is not None:
+        # users.json with the watch histories recorded since (watch_log.py)
+        from watch_log import load_users_with_log
+        users = load_users_with_log(users_file, watch_log_dir)
+    else:
+        users = load_users(users_file)
+    engine = CollaborativeEngine(users, catalog)
+    return RecommenderContext(
+        catalog,
+        users,
+        engine,
+        Leaderboards(catalog),
+        UserProfileStore(catalog, users),
+        HybridScorer(catalog, engine),
+    )
+
+# Strategy 1: top-rated unwatched movies in the user's favourite genre
+def genre_based(context, user, k=3):
+    favorite_genres = context.profiles.favorite_genres(user["user_id"], 1)
+    if not favorite_genres:
+        return []
+    top_genre = favorite_genres[0][0]
+    watched_ids = context.profiles.watched_ids(user["user_id"])
+    return [
+        {"movie": movie, "reason": f"Contains your favorite genre ({top_genre})"}
+        for movie in context.leaderboards.top(k, genre=top_genre, exclude=watched_ids)
+    ]
+
+# Strategy 2: movies watched by the users who share the most movies with you
+def find_similar_users(context, user, k=None, index=None, max_candidates=None):
+    # [{"user": other_user, "similarity_score": common_count}, ...], best first.
+    # With a MinHash/LSH index (lsh.py) only the users in the same buckets are
+    # scored, and max_candidates caps how many of those are scored exactly.
+    row = context.engine.row_of(user["user_id"])
+    if row is None:
+        return []
+    if index is None:
+        neighbours = context.engine.neighbours(row, k=k)
+    else:
+        watched_ids = context.engine.watched_ids(row)
+        candidates = [
+            context.engine.row_of(user_id)
+            for user_id, _ in index.query(watched_ids, k=max_candidates, exclude=user["user_id"])
+        ]
+        candidates = [candidate for candidate in candidates if candidate is not None]
+        neighbours = context.engine.neighbours_among(row, candidates, k=k)
+    return [
+        {"user": context.users[neighbour], "similarity_score": common_count}
+        for neighbour, _, common_count in neighbours
+    ]
+
+def similar_users(context, user, k=3, neighbours=2, similar=None, index=None):
+    if similar is None:
+        similar = find_similar_users(context, user, k=neighbours, index=index)
+    watched_titles = set(user["watched_movies"])
+    recommendations = []
+    seen = set()
+    for sim_user in similar[:neighbours]:
+        for title in sim_user["user"]["watched_movies"]:
+            if title in watched_titles or title in seen:
+                continue
+            movie = context.catalog.get(title)
+            if movie:
+                seen.add(title)
+                recommendations.append({
+                    "movie": movie,
+                    "reason": f"Watched by {sim_user['user']['name']}, who shares {sim_user['similarity_score']} movies with you",
+                })
+    return recommendations[:k]
+
+# Strategy 3: highest-rated movies the user has not seen
+def top_rated(context, user, k=3):
+    watched_ids = context.profiles.watched_ids(user["user_id"])
+    return [
+        {"movie": movie, "reason": f"Among the highest-rated movies you haven't seen (Rating: {movie['rating']})"}
+        for movie in context.leaderboards.top(k, exclude=watched_ids)
+    ]
+
+# Strategy 4: newest unwatched movies in the user's two favourite genres
+def recent_releases(context, user, k=3, since=RECENT_SINCE):
+    favorite_genres = context.profiles.favorite_genres(user["user_id"], 2)
+    if not favorite_genres:
+        return []
+    top_two_genres = [genre for genre, _ in favorite_genres]
+    watched_titles = set(user["watched_movies"])
+    # Walk the catalog newest first and stop after k matches
+    newest = []
+    for movie_id in context.catalog.year_order:
+        movie = context.catalog[movie_id]
+        if movie["release_year"] < since or len(newest) >= k:
+            break
+        if movie["title"] not in watched_titles and any(g in movie["genre"] for g in top_two_genres):
+            newest.append(movie)
+    recommendations = []
+    for movie in newest:
+        matching_genres = [g for g in movie["genre"] if g in top_two_genres]
+        recommendations.append({
+            "movie": movie,
+            "reason": f"Recent release ({movie['release_year']}) in your preferred genres ({', '.join(matching_genres)})",
+        })
+    return recommendations
+
+# Strategy 5: all of the above blended into one score per movie (hybrid.py)
+def hybrid(context, user, k=3, weights=None):
+    if context.scorer is None:
+        return []
+    profile = context.profiles.get(user["user_id"])
+    scored = context.scorer.score(user["user_id"], profile.genre_counts, profile.watched, k=k, weights=weights)
+    recommendations = []
+    for entry in scored:
+        movie = context.catalog[entry["movie_id"]]
+        recommendations.append({
+            "movie": movie,
+            "reason": context.scorer.explain(movie, entry["contributions"], profile.genre_counts),
+        })
+    return recommendations
+
+STRATEGIES = {
+    "genre_based": genre_based,
+    "similar_users": similar_users,
+    "top_rated": top_rated,
+    "recent_releases": recent_releases,
+}
+
+OPT_IN_STRATEGIES = {
+    "hybrid": hybrid,
+}
+
+ALL_STRATEGIES = {**STRATEGIES, **OPT_IN_STRATEGIES}
+
+def recommend_all(context, user, k=3, similar=None):
+    # similar: precomputed find_similar_users() result, e.g. from a batched lookup
+    recommendations = {}
+    for name, strategy in STRATEGIES.items():
+        if name == "similar_users":
+            recommendations[name] = strategy(context, user, k=k, similar=similar)
+        else:
+            recommendations[name] = strategy(context, user, k=k)
+    return recommendations
+
+# Stored recommendations (written by batch_recommend.py) keep only the title
+# and the reason; the movie is looked up again in the current catalog.
+def to_stored(recommendations):
+    return [{"title": rec["movie"]["title"], "reason": rec["reason"]} for rec in recommendations]
+
+def from_stored(context, entries):
+    recommendations = []
+    for entry in entries:
+        movie = context.catalog.get(entry["title"])
+        if movie:
+            recommendations.append({"movie": movie, "reason": entry["reason"]})
+    return recommendations
+
+def load_stored(filename):
+    # {user_id: {strategy: [{"title", "reason"}, ...]}} from a JSON-lines file
+    stored = {}
+    with open(filename, "r") as file:
+        for line in file:
+            if line.strip():
+                record = json.loads(line)
+                stored[record["user_id"]] = record["recommendations"]
+    return stored
+
+if __name__ == "__main__":
+    context = build_context()
+    alice = context.users[0]
+    for name, recommendations in recommend_all(context, alice).items():
+        print(f"{name}:")
+        for rec in recommendations:
+            print(f"  {rec['movie']['title']} - {rec['reason']}")
@@ -0,0 +1,129 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# Cache of computed recommendation lists.
+# A key is (user_id, strategy, k, version) where version identifies the catalog
+# and the user's profile the list was computed from, so a list computed before
+# the data or the profile changed is never served. Entries also expire after
+# ttl seconds, the least recently used entry is evicted once max_entries is
+# reached, and invalidate_user() drops everything cached for one user as soon
+# as their watch history changes.
+
+# Values under these keys belong to the catalog; a cached list only points at them
+SHARED_KEYS = frozenset({"movie"})
+
+def deep_size(value, seen=None):
+    # Approximate memory held by a value and everything it contains, in bytes.
+    # Objects repeated inside the value are counted once, and the catalog's
+    # movies (values under SHARED_KEYS) not at all: dropping the entry does
+    # not free them, and counting them would charge every entry for them.
+    if seen is None:
+        seen = set()
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(deep_size(k, seen) + (0 if k in SHARED_KEYS else deep_size(v, seen))
+                    for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(deep_size(item, seen) for item in value)
+    return size
+
+class ResultCache:
+    def __init__(self, max_entries=10000, ttl=600, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.lock = threading.RLock()
+        # key -> (expires_at, value, size_in_bytes), least recently used first
+        self.entries = OrderedDict()
+        self.by_user = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _drop(self, key):
+        _, _, size = self.entries.pop(key)
+        self.bytes -= size
+        keys = self.by_user.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.by_user[key[0]]
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            if entry[0] <= self.clock():
+                self._drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self.lock:
+            if key in self.entries:
+                self._drop(key)
+            size = deep_size(value)
+            self.entries[key] = (self.clock() + self.ttl, value, size)
+            self.by_user.setdefault(key[0], set()).add(key)
+            self.bytes += size
+            while len(self.entries) > self.max_entries:
+                self._drop(next(iter(self.entries)))
+                self.evictions += 1
+
+    def get_or_compute(self, user_id, strategy, k, version, compute):
+        # compute() runs outside the lock; two threads missing the same key at
+        # once both compute it and the second result wins
+        key = (user_id, strategy, k, version)
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def invalidate_user(self, user_id):
+        with self.lock:
+            keys = list(self.by_user.get(user_id, ()))
+            for key in keys:
+                self._drop(key)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.by_user.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "memory_bytes": self.bytes,
+            }
@@ -0,0 +1,195 @@
+import argparse
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, unquote, urlsplit
+from service import RecommendationService, UnknownUser
+
+# Minimal JSON-over-HTTP server for the recommendation service, using only
+# asyncio streams. The catalog and indexes are loaded once when the server
+# starts. Requests are parsed on the event loop and the service calls run in a
+# thread pool, so a slow request never stops other connections from being
+# accepted and read.
+#
+#   GET  /health
+#   GET  /stats
+#   GET  /genres
+#   GET  /users/{id}
+#   GET  /users/{id}/recommendations?strategy=genre_based&k=3   (all four without strategy;
+#                                                               hybrid only when asked for)
+#   GET  /users/{id}/similar?k=5
+#   GET  /cold-start?k=5&genres=Drama,Sci-Fi
+#   POST /users/{id}/watched   {"titles": ["Inception", ...], "k": 3}
+#                              (kept across restarts with --watch-log DIR)
+
+MAX_BODY_BYTES = 1 << 20
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+def _check_int(name, value, minimum=1, maximum=1000):
+    # JSON true/false are ints to Python, but not a valid k
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise HTTPError(400, f"{name} must be an integer")
+    if not minimum <= value <= maximum:
+        raise HTTPError(400, f"{name} must be between {minimum} and {maximum}")
+    return value
+
+def _int_param(query, name, default, minimum=1, maximum=1000):
+    values = query.get(name)
+    if not values:
+        return default
+    try:
+        value = int(values[0])
+    except ValueError:
+        raise HTTPError(400, f"{name} must be an integer")
+    return _check_int(name, value, minimum, maximum)
+
+def _user_id(segment):
+    try:
+        return int(segment)
+    except ValueError:
+        raise HTTPError(404, f"Unknown user: {segment}")
+
+def _recommendations_json(recommendations):
+    return [{"movie": dict(rec["movie"]), "reason": rec["reason"]} for rec in recommendations]
+
+class RecommendationServer:
+    def __init__(self, service, workers=4):
+        self.service = service
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    def route(self, method, path, query, body):
+        # Runs in the thread pool; returns a JSON-serialisable value
+        parts = [unquote(part) for part in path.strip("/").split("/") if part]
+        service = self.service
+        if method == "GET":
+            if parts == ["health"]:
+                context = service.context
+                return {"status": "ok", "movies": len(context.catalog), "users": len(context.users)}
+            if parts == ["stats"]:
+                return {"result_cache": service.cache.stats()}
+            if parts == ["genres"]:
+                return list(service.context.catalog.genres)
+            if parts == ["cold-start"]:
+                genres = [g for value in query.get("genres", []) for g in value.split(",") if g]
+                return _recommendations_json(service.cold_start(_int_param(query, "k", 5), genres))
+            if len(parts) == 2 and parts[0] == "users":
+                return service.profile(_user_id(parts[1]))
+            if len(parts) == 3 and parts[0] == "users" and parts[2] == "recommendations":
+                strategy = query.get("strategy", [None])[0]
+                recommendations = service.recommend(_user_id(parts[1]), strategy, _int_param(query, "k", 3))
+                return {name: _recommendations_json(recs) for name, recs in recommendations.items()}
+            if len(parts) == 3 and parts[0] == "users" and parts[2] == "similar":
+                return service.similar_users(_user_id(parts[1]), _int_param(query, "k", 5))
+        elif method == "POST":
+            if len(parts) == 3 and parts[0] == "users" and parts[2] == "watched":
+                try:
+                    payload = json.loads(body or b"{}")
+                except ValueError:
+                    raise HTTPError(400, "Body must be JSON")
+                titles = payload.get("titles") if isinstance(payload, dict) else None
+                if not isinstance(titles, list) or not all(isinstance(t, str) for t in titles):
+                    raise HTTPError(400, 'Body must look like {"titles": ["...", ...]}')
+                k = _check_int("k", payload.get("k", 3))
+                result = service.add_watched(_user_id(parts[1]), titles, k)
+                for state in ("before", "after"):
+                    result[state]["recommendations"] = _recommendations_json(result[state]["recommendations"])
+                return result
+        else:
+            raise HTTPError(405, f"Method {method} not allowed")
+        raise HTTPError(404, f"No route for {method} {path}")
+
+    def _handle(self, method, target, body):
+        url = urlsplit(target)
+        try:
+            return 200, self.route(method, url.path, parse_qs(url.query), body)
+        except HTTPError as error:
+            return error.status, {"error": error.message}
+        except UnknownUser as error:
+            return 404, {"error": f"Unknown user: {error.args[0]}"}
+        except ValueError as error:
+            return 400, {"error": str(error)}
+
+    async def handle_connection(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "Malformed request line"}, False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                # HTTP/1.1 keeps the connection open unless told otherwise, 1.0 only if asked
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection == "keep-alive" or (version == "HTTP/1.1" and connection != "close")
+                try:
+                    length = int(headers.get("content-length", 0) or 0)
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "Bad Content-Length"}, False)
+                    break
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, 413, {"error": "Request body too large"}, False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                try:
+                    status, payload = await loop.run_in_executor(self.executor, self._handle, method, target, body)
+                except Exception as error:  # Never let one request take the server down
+                    status, payload = 500, {"error": f"{type(error).__name__}: {error}"}
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    async def serve(self, host="127.0.0.1", port=8080):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        async with server:
+            await server.serve_forever()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve movie recommendations as JSON over HTTP.")
+    parser.add_argument("--movies", default="movies.json")
+    parser.add_argument("--users", default="users.json")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=4, help="threads running recommendation requests")
+    parser.add_argument("--watch-log", default=None, metavar="DIR",
+                        help="keep watch-history updates in this watch log directory")
+    args = parser.parse_args()
+
+    service = RecommendationService.from_files(args.movies, args.users, args.watch_log)
+    server = RecommendationServer(service, args.workers)
+    print(f"Serving recommendations on http://{args.host}:{args.port}")
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,201 @@
+import copy
+import threading
+import recommenders
+from profiles import UserProfileStore
+from result_cache import ResultCache
+
+# Headless recommendation service: the strategies from user_recommendations.py
+# and the cold-start / watch-history update flows from
+# recommendation_insights.py behind plain method calls that take and return
+# JSON-friendly values. server.py serves it over HTTP; anything else in the
+# same process can call it directly.
+#
+# The context (catalog, users, indexes) is built once. Watch-history updates
+# are applied to the in-memory profiles and remembered per user, so later
+# recommendations for that user skip the newly watched movies. With a watch
+# log (watch_log.py) the new movies are also appended to it, and add_watched
+# returns once they are on disk; the data files themselves are never written.
+# The catalog, engine and leaderboards never change after loading, so
+# strategies run against them without a lock. The lock is only held to read or
+# change the per-user state (added titles, profiles, popularity, LSH index):
+# a read copies the user's profile under it and computes from the copy.
+#
+# Computed lists are kept in a ResultCache keyed by user, strategy, k and the
+# (data version, profile version) pair; an update drops the user's entries.
+
+class UnknownUser(KeyError):
+    pass
+
+class _LockedIndex:
+    # index.query() under the service lock, which add_watched() holds to insert
+    def __init__(self, index, lock):
+        self.index = index
+        self.lock = lock
+
+    def query(self, *args, **kwargs):
+        with self.lock:
+            return self.index.query(*args, **kwargs)
+
+class RecommendationService:
+    def __init__(self, context, index=None, cache=None, version=None, popularity=None, watch_log=None):
+        self.context = context
+        self.index = index
+        # PopularityRankings for cold start; kept up to date by add_watched()
+        self.popularity = popularity
+        self.cache = cache if cache is not None else ResultCache()
+        # Identifies the data the context was built from, e.g. a content hash
+        self.version = version
+        self.lock = threading.RLock()
+        # user_id -> titles watched since the data files were loaded
+        self.added = {}
+        # WatchLog that keeps those titles across restarts
+        self.watch_log = watch_log
+
+    @classmethod
+    def from_files(cls, movies_file="movies.json", users_file="users.json", watch_log_dir=None):
+        from fingerprint import file_version
+        from popularity import PopularityRankings
+        watch_log = None
+        version = f"{file_version(movies_file)}-{file_version(users_file)}"
+        if watch_log_dir is not None:
+            from watch_log import WatchLog
+            # Opened first: it finishes any interrupted write before the users are read
+            watch_log = WatchLog(watch_log_dir)
+            version = f"{version}-{watch_log.seq}"
+        context = recommenders.build_context(movies_file, users_file, watch_log_dir)
+        popularity = PopularityRankings.from_users(context.catalog, context.users)
+        return cls(context, version=version, popularity=popularity, watch_log=watch_log)
+
+    def user(self, user_id):
+        row = self.context.engine.row_of(user_id)
+        if row is None:
+            raise UnknownUser(user_id)
+        user = self.context.users[row]
+        added = self.added.get(user_id)
+        if added:
+            user = dict(user, watched_movies=user["watched_movies"] + added)
+        return user
+
+    def _read(self, user_id):
+        # (user, context, index) for computing without the lock: the context's
+        # profiles hold a copy of this user's profile taken under it
+        with self.lock:
+            user = self.user(user_id)
+            profiles = UserProfileStore(self.context.catalog)
+            profiles.profiles[user_id] = self.context.profiles.get(user_id).copy()
+        context = copy.copy(self.context)
+        context.profiles = profiles
+        index = _LockedIndex(self.index, self.lock) if self.index is not None else None
+        return user, context, index
+
+    def profile(self, user_id):
+        with self.lock:
+            user = self.user(user_id)
+            favorite_genres = self.context.profiles.favorite_genres(user_id)
+        return {
+            "user_id": user["user_id"],
+            "name": user["name"],
+            "watched_movies": user["watched_movies"],
+            "favorite_genres": favorite_genres,
+        }
+
+    def recommend(self, user_id, strategy=None, k=3):
+        # {strategy: [{"movie": movie, "reason": "..."}, ...]} for one strategy
+        # (hybrid included) or, without a strategy, for the four in STRATEGIES
+        if strategy is not None and strategy not in recommenders.ALL_STRATEGIES:
+            raise ValueError(f"Unknown strategy: {strategy!r} (expected one of {sorted(recommenders.ALL_STRATEGIES)})")
+        user, context, index = self._read(user_id)
+        version = (self.version, context.profiles.version(user_id))
+        names = [strategy] if strategy is not None else list(recommenders.STRATEGIES)
+        recommendations = {}
+        for name in names:
+            if name == "similar_users":
+                compute = lambda: recommenders.similar_users(context, user, k=k, index=index)
+            else:
+                compute = lambda: recommenders.ALL_STRATEGIES[name](context, user, k=k)
+            recommendations[name] = self.cache.get_or_compute(user_id, name, k, version, compute)
+        return recommendations
+
+    def similar_users(self, user_id, k=5):
+        user, context, index = self._read(user_id)
+        return [
+            {"user_id": sim["user"]["user_id"], "name": sim["user"]["name"], "common_movies": sim["similarity_score"]}
+            for sim in recommenders.find_similar_users(context, user, k=k, index=index)
+        ]
+
+    def cold_start(self, k=5, genres=None):
+        # A new user with no history gets the most popular movies overall, or
+        # in the genres they picked during onboarding (best-rated without
+        # popularity rankings)
+        if genres:
+            unknown = [genre for genre in genres if genre not in self.context.catalog.genres]
+            if unknown:
+                raise ValueError(f"Unknown genres: {', '.join(unknown)}")
+        if self.popularity is not None:
+            # add_watched() reorders the popularity rankings; the leaderboards never change
+            with self.lock:
+                movies = self.popularity.top_any(k, genres) if genres else self.popularity.top(k)
+                return [{"movie": movie, "reason": self.popularity.reason(movie)} for movie in movies]
+        rankings = self.context.leaderboards
+        movies = rankings.top_any(k, genres) if genres else rankings.top(k)
+        if genres:
+            reason = f"Among the highest-rated movies in {', '.join(genres)}"
+        else:
+            reason = "One of our highest-rated movies"
+        return [{"movie": movie, "reason": reason} for movie in movies]
+
+    def _preference_recommendations(self, watched_ids, genre_names, k):
+        # Best unwatched movies in the user's top genres, as on the insights page
+        return [
+            {
+                "movie": movie,
+                "reason": f"Matches your preferred genres ({', '.join(g for g in movie['genre'] if g in genre_names)})",
+            }
+            for movie in self.context.leaderboards.top_any(k, genre_names, exclude=watched_ids)
+        ]
+
+    def add_watched(self, user_id, titles, k=3):
+        # Record newly watched movies and return the genre preferences and
+        # preference-based recommendations before and after the update
+        with self.lock:
+            user = self.user(user_id)
+            unknown = [title for title in titles if title not in self.context.catalog]
+            if unknown:
+                raise ValueError(f"Unknown movies: {', '.join(unknown)}")
+            profiles = self.context.profiles
+            before_genres = profiles.favorite_genres(user_id, 2)
+            before_watched = set(profiles.watched_ids(user_id))
+
+            already_watched = set(user["watched_movies"])
+            added = []
+            seq = None
+            for title in titles:
+                if title not in already_watched and profiles.add(user_id, title):
+                    already_watched.add(title)
+                    added.append(title)
+            if added:
+                if self.watch_log is not None:
+                    seq = self.watch_log.watch(user_id, added)
+                self.added.setdefault(user_id, []).extend(added)
+                self.cache.invalidate_user(user_id)
+                if self.popularity is not None:
+                    for title in added:
+                        self.popularity.add_watch(self.context.catalog.movie_id(title))
+                if self.index is not None:
+                    movie_ids = [self.context.catalog.movie_id(t) for t in user["watched_movies"] + added]
+                    self.index.insert(user_id, [m for m in movie_ids if m is not None])
+
+            after_genres = profiles.favorite_genres(user_id, 2)
+            after_watched = set(profiles.watched_ids(user_id))
+
+        # Appended under the lock so the log has each user's events in order;
+        # waiting for the fsync does not hold up other requests
+        if seq is not None:
+            self.watch_log.wait(seq)
+        before = self._preference_recommendations(before_watched, [g for g, _ in before_genres], k)
+        after = self._preference_recommendations(after_watched, [g for g, _ in after_genres], k)
+        return {
+            "added": added,
+            "before": {"favorite_genres": before_genres, "recommendations": before},
+            "after": {"favorite_genres": after_genres, "recommendations": after},
+        }
@@ -0,0 +1,258 @@
+import argparse
+import sqlite3
+from load_data import iter_movies, iter_users
+
+# Optional SQLite storage for the movie catalog and the users.
+# The JSON files have to be loaded completely and scanned for every query, and
+# changing one user means rewriting users.json. Here the same data lives in
+# normalized tables with indexes, so lookups by title, user, year, rating or
+# genre are index searches and a new watch event is a single INSERT.
+#
+# The module mirrors load_data.py: load_movies, get_movies_by_genre,
+# get_top_rated_movies, get_movies_by_year, load_users and get_user_favorites
+# have the same names, arguments and results, except that they take a database
+# file or an open SQLiteStore instead of JSON files and lists.
+#
+# Movie IDs are positions in movies.json, like everywhere else. Watched titles
+# that are not in the catalog are dropped on import.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS movies (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    rating REAL NOT NULL,
+    release_year INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS genres (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS movie_genres (
+    movie_id INTEGER NOT NULL REFERENCES movies(id),
+    genre_id INTEGER NOT NULL REFERENCES genres(id),
+    position INTEGER NOT NULL,
+    PRIMARY KEY (movie_id, genre_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS watch_events (
+    user_row INTEGER NOT NULL REFERENCES users(id),
+    position INTEGER NOT NULL,
+    movie_id INTEGER NOT NULL REFERENCES movies(id),
+    PRIMARY KEY (user_row, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS movies_title ON movies(title);
+CREATE INDEX IF NOT EXISTS movies_release_year ON movies(release_year);
+CREATE INDEX IF NOT EXISTS movies_rating ON movies(rating DESC, id);
+CREATE INDEX IF NOT EXISTS movie_genres_genre ON movie_genres(genre_id, movie_id);
+CREATE INDEX IF NOT EXISTS users_user_id ON users(user_id);
+CREATE INDEX IF NOT EXISTS watch_events_movie ON watch_events(movie_id);
+"""
+
+# Genres of every movie in a result, in their original order, as one string
+_MOVIE_COLUMNS = """
+    m.id, m.title, m.rating, m.release_year,
+    (SELECT group_concat(name, char(31)) FROM (
+        SELECT g.name FROM movie_genres mg JOIN genres g ON g.id = mg.genre_id
+        WHERE mg.movie_id = m.id ORDER BY mg.position))
+"""
+
+def _movie(row):
+    _, title, rating, release_year, genres = row
+    return {
+        "title": title,
+        "genre": genres.split("\x1f") if genres else [],
+        "rating": rating,
+        "release_year": release_year,
+    }
+
+class SQLiteStore:
+    def __init__(self, filename, check_same_thread=True):
+        self.filename = filename
+        self.connection = sqlite3.connect(filename, check_same_thread=check_same_thread)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _movies(self, where="", params=(), order="m.id", limit=None):
+        sql = f"SELECT {_MOVIE_COLUMNS} FROM movies m {where} ORDER BY {order}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params = tuple(params) + (limit,)
+        return [_movie(row) for row in self.connection.execute(sql, params)]
+
+    def import_json(self, movies_file="movies.json", users_file="users.json", batch_size=10000):
+        # Replace everything with the contents of the JSON files in a single
+        # transaction: readers see either the old data or all of the new data
+        connection = self.connection
+        with connection:
+            for table in ("watch_events", "users", "movie_genres", "genres", "movies"):
+                connection.execute(f"DELETE FROM {table}")
+            genre_ids = {}
+            title_ids = {}
+            movies, links = [], []
+            for movie_id, movie in enumerate(iter_movies(movies_file)):
+                movies.append((movie_id, movie["title"], movie["rating"], movie["release_year"]))
+                title_ids.setdefault(movie["title"], movie_id)
+                for position, genre in enumerate(dict.fromkeys(movie["genre"])):
+                    if genre not in genre_ids:
+                        genre_ids[genre] = len(genre_ids)
+                        connection.execute("INSERT INTO genres (id, name) VALUES (?, ?)", (genre_ids[genre], genre))
+                    links.append((movie_id, genre_ids[genre], position))
+                if len(movies) >= batch_size:
+                    self._insert_movies(movies, links)
+                    movies, links = [], []
+            self._insert_movies(movies, links)
+
+            users, events = [], []
+            for row, user in enumerate(iter_users(users_file)):
+                users.append((row, user["user_id"], user["name"]))
+                seen = set()
+                for title in user["watched_movies"]:
+                    movie_id = title_ids.get(title)
+                    if movie_id is not None and movie_id not in seen:
+                        seen.add(movie_id)
+                        events.append((row, len(seen) - 1, movie_id))
+                if len(users) >= batch_size:
+                    self._insert_users(users, events)
+                    users, events = [], []
+            self._insert_users(users, events)
+        connection.execute("ANALYZE")
+
+    def _insert_movies(self, movies, links):
+        self.connection.executemany("INSERT INTO movies VALUES (?, ?, ?, ?)", movies)
+        self.connection.executemany("INSERT INTO movie_genres VALUES (?, ?, ?)", links)
+
+    def _insert_users(self, users, events):
+        self.connection.executemany("INSERT INTO users VALUES (?, ?, ?)", users)
+        self.connection.executemany("INSERT INTO watch_events VALUES (?, ?, ?)", events)
+
+    def all_movies(self):
+        return self._movies()
+
+    def all_users(self):
+        return [self._user(row) for row in self.connection.execute("SELECT id, user_id, name FROM users ORDER BY id")]
+
+    def _user(self, row):
+        user_row, user_id, name = row
+        return {"user_id": user_id, "name": name, "watched_movies": self._watched_titles(user_row)}
+
+    def _watched_titles(self, user_row):
+        return [title for (title,) in self.connection.execute(
+            "SELECT m.title FROM watch_events w JOIN movies m ON m.id = w.movie_id "
+            "WHERE w.user_row = ? ORDER BY w.position", (user_row,))]
+
+    def _user_row(self, user_id):
+        # The first user with this ID, like a scan of users.json would find
+        row = self.connection.execute("SELECT min(id) FROM users WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0]
+
+    def movie(self, title):
+        movies = self._movies("WHERE m.title = ?", (title,), limit=1)
+        return movies[0] if movies else None
+
+    def movies_in_genre(self, genre):
+        return self._movies(
+            "JOIN movie_genres mg ON mg.movie_id = m.id JOIN genres g ON g.id = mg.genre_id WHERE g.name = ?",
+            (genre,),
+        )
+
+    def movies_since(self, year):
+        return self._movies("WHERE m.release_year >= ?", (year,))
+
+    def top_rated(self, top_n=3, genre=None, exclude_user=None):
+        # Best-rated movies, optionally only in one genre and only movies the
+        # given user has not watched, as one indexed query
+        # Walks movies_rating from the top and stops after top_n matches; the
+        # genre and watched checks are primary-key lookups per movie
+        conditions, params = [], []
+        if genre is not None:
+            conditions.append(
+                "EXISTS (SELECT 1 FROM movie_genres mg WHERE mg.movie_id = m.id "
+                "AND mg.genre_id = (SELECT id FROM genres WHERE name = ?))"
+            )
+            params.append(genre)
+        if exclude_user is not None:
+            conditions.append(
+                "NOT EXISTS (SELECT 1 FROM watch_events w WHERE w.movie_id = m.id "
+                "AND w.user_row = (SELECT min(id) FROM users WHERE user_id = ?))"
+            )
+            params.append(exclude_user)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return self._movies(where, params, order="m.rating DESC, m.id", limit=top_n)
+
+    def favorites(self, user_id):
+        user_row = self._user_row(user_id)
+        return [] if user_row is None else self._watched_titles(user_row)
+
+    def add_watched(self, user_id, title):
+        # Record one more watched movie; returns False if the user or movie is
+        # unknown or the movie was already watched
+        movie_id = self.connection.execute("SELECT min(id) FROM movies WHERE title = ?", (title,)).fetchone()[0]
+        user_row = self._user_row(user_id)
+        if movie_id is None or user_row is None:
+            return False
+        with self.connection:
+            already = self.connection.execute(
+                "SELECT 1 FROM watch_events WHERE user_row = ? AND movie_id = ?", (user_row, movie_id)).fetchone()
+            if already:
+                return False
+            self.connection.execute(
+                "INSERT INTO watch_events (user_row, position, movie_id) "
+                "SELECT ?, coalesce(max(position) + 1, 0), ? FROM watch_events WHERE user_row = ?",
+                (user_row, movie_id, user_row),
+            )
+        return True
+
+def connect(filename, check_same_thread=True):
+    return SQLiteStore(filename, check_same_thread)
+
+def _query(store, method, *args):
+    # Accept an open store, or a database file name that is opened just for this call
+    if isinstance(store, SQLiteStore):
+        return getattr(store, method)(*args)
+    with SQLiteStore(store) as opened:
+        return getattr(opened, method)(*args)
+
+# The load_data.py functions
+def load_movies(filename):
+    return _query(filename, "all_movies")
+
+def get_movies_by_genre(store, genre):
+    return _query(store, "movies_in_genre", genre)
+
+def get_top_rated_movies(store, top_n=3):
+    return _query(store, "top_rated", top_n)
+
+def get_movies_by_year(store, year):
+    return _query(store, "movies_since", year)
+
+def load_users(filename):
+    return _query(filename, "all_users")
+
+def get_user_favorites(store, user_id):
+    return _query(store, "favorites", user_id)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import movies.json and users.json into a SQLite database.")
+    parser.add_argument("--movies", default="movies.json")
+    parser.add_argument("--users", default="users.json")
+    parser.add_argument("--out", default="movies.sqlite3")
+    args = parser.parse_args()
+
+    with connect(args.out) as store:
+        store.import_json(args.movies, args.users)
+        print(f"Imported {len(store.all_movies())} movies and {len(store.all_users())} users into {args.out}")
+        print("Top 3 Rated Movies:", [m["title"] for m in get_top_rated_movies(store)])
+        print("Alice's unwatched Sci-Fi:", [m["title"] for m in store.top_rated(3, genre="Sci-Fi", exclude_user=101)])
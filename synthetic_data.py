@@ -0,0 +1,122 @@
+import argparse
+import bisect
+import itertools
+import json
+import random
+from load_data import is_ndjson
+
+# Seeded synthetic data in the same format as movies.json and users.json, for
+# trying the code at realistic sizes (the sample files only have 8 movies and
+# 5 users). The same seed and sizes always give the same files.
+#
+# Popularity is skewed like real viewing data: movie i is watched with weight
+# 1 / (i + 1) ** ZIPF_EXPONENT, so a few blockbusters appear in many histories
+# and most of the catalog is rarely watched. Genres are skewed the same way and
+# history lengths are long-tailed (most users watched a handful of movies, a
+# few watched hundreds).
+
+GENRES = [
+    "Drama", "Comedy", "Action", "Thriller", "Romance", "Adventure", "Crime",
+    "Sci-Fi", "Horror", "Fantasy", "Mystery", "Animation", "Family",
+    "Documentary", "War", "History", "Music", "Western",
+]
+ZIPF_EXPONENT = 1.0
+FIRST_YEAR = 1920
+LAST_YEAR = 2024
+
+_ADJECTIVES = [
+    "Silent", "Broken", "Golden", "Hidden", "Last", "Dark", "Lost", "Crimson",
+    "Frozen", "Wild", "Secret", "Burning", "Distant", "Final", "Midnight",
+    "Electric", "Savage", "Quiet", "Endless", "Fallen",
+]
+_NOUNS = [
+    "River", "Empire", "Horizon", "Shadow", "Storm", "Garden", "Signal",
+    "Frontier", "Harbor", "Kingdom", "Witness", "Voyage", "Machine", "Echo",
+    "Citadel", "Orchard", "Tide", "Mirror", "Summit", "Protocol",
+]
+_FIRST_NAMES = [
+    "Alice", "Bob", "Charlie", "David", "Emma", "Fatima", "George", "Hana",
+    "Ivan", "Julia", "Kenji", "Laura", "Mateo", "Nina", "Omar", "Priya",
+    "Quinn", "Rosa", "Sven", "Tara", "Umar", "Vera", "Wei", "Yara", "Zoe",
+]
+
+def _zipf_cum_weights(n, exponent=ZIPF_EXPONENT):
+    return list(itertools.accumulate(1.0 / (i + 1) ** exponent for i in range(n)))
+
+def generate_movies(count, seed=0):
+    rng = random.Random(seed)
+    genre_weights = _zipf_cum_weights(len(GENRES), 0.8)
+    movies = []
+    for movie_id in range(count):
+        genres = []
+        for _ in range(rng.choice((1, 1, 2, 2, 2, 3))):
+            genre = rng.choices(GENRES, cum_weights=genre_weights)[0]
+            if genre not in genres:
+                genres.append(genre)
+        # Most movies are recent; ratings cluster around 6.5
+        year = LAST_YEAR - min(int(rng.expovariate(1 / 15)), LAST_YEAR - FIRST_YEAR)
+        rating = round(min(max(rng.gauss(6.5, 1.2), 1.0), 10.0), 1)
+        title = f"The {rng.choice(_ADJECTIVES)} {rng.choice(_NOUNS)} {movie_id + 1}"
+        movies.append({"title": title, "genre": genres, "rating": rating, "release_year": year})
+    return movies
+
+def generate_users(count, movies, seed=0, mean_history=20, first_user_id=101):
+    # Movies are popular in a random order, not in file order, so popularity
+    # does not line up with movie IDs, ratings or release years
+    rng = random.Random(seed + 1)
+    popularity = list(range(len(movies)))
+    rng.shuffle(popularity)
+    cum_weights = _zipf_cum_weights(len(movies))
+    total = cum_weights[-1] if cum_weights else 0.0
+    users = []
+    for offset in range(count):
+        # Long-tailed history length with the requested mean
+        length = min(max(1, int(rng.paretovariate(1.5) * mean_history / 3)), len(movies))
+        watched = []
+        seen = set()
+        # Draw by popularity and skip repeats; give up after a bounded number
+        # of tries so very long histories over small catalogs still finish
+        for _ in range(length * 4):
+            if len(watched) >= length:
+                break
+            rank = bisect.bisect(cum_weights, rng.random() * total)
+            movie_id = popularity[min(rank, len(movies) - 1)]
+            if movie_id not in seen:
+                seen.add(movie_id)
+                watched.append(movies[movie_id]["title"])
+        user_id = first_user_id + offset
+        users.append({
+            "user_id": user_id,
+            "name": f"{rng.choice(_FIRST_NAMES)} {user_id}",
+            "watched_movies": watched,
+        })
+    return users
+
+def write_records(records, filename):
+    # Same layout as the sample files, or one record per line for .ndjson/.jsonl
+    with open(filename, "w") as file:
+        if is_ndjson(filename):
+            for record in records:
+                file.write(json.dumps(record) + "\n")
+        else:
+            json.dump(records, file)
+
+def generate_dataset(movies_file, users_file, movie_count, user_count, seed=0, mean_history=20):
+    movies = generate_movies(movie_count, seed)
+    users = generate_users(user_count, movies, seed, mean_history)
+    write_records(movies, movies_file)
+    write_records(users, users_file)
+    return movies, users
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a seeded synthetic movie catalog and user base.")
+    parser.add_argument("--movies", type=int, default=10000, help="number of movies")
+    parser.add_argument("--users", type=int, default=1000, help="number of users")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mean-history", type=int, default=20, help="average number of watched movies per user")
+    parser.add_argument("--movies-out", default="synthetic_movies.json")
+    parser.add_argument("--users-out", default="synthetic_users.json")
+    args = parser.parse_args()
+
+    generate_dataset(args.movies_out, args.users_out, args.movies, args.users, args.seed, args.mean_history)
+    print(f"Wrote {args.movies} movies to {args.movies_out} and {args.users} users to {args.users_out}")
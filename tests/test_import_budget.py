@@ -0,0 +1,36 @@
+import os
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import cli
+
+# The headless commands must start within cli.IMPORT_BUDGET_SECONDS and never
+# import Streamlit, pandas, SciPy or the plotting libraries (see cli.py).
+#   python -m pytest tests
+
+HEADLESS_COMMANDS = [
+    ["movies", "--limit", "1"],
+    ["movies", "--limit", "1", "--json", "--compact"],
+    ["top-rated", "-n", "1"],
+    ["favorites", "101"],
+    ["recommend", "101", "--strategy", "genre_based"],
+    ["recommend", "101", "--strategy", "top_rated"],
+]
+
+@pytest.mark.parametrize("command", HEADLESS_COMMANDS, ids=" ".join)
+def test_import_budget(command, monkeypatch):
+    monkeypatch.chdir(ROOT)
+    seconds, modules, returncode = cli.import_report(command)
+    assert returncode == 0
+    assert seconds <= cli.IMPORT_BUDGET_SECONDS
+    imported = {module.split(".")[0] for module in modules}
+    assert not imported & set(cli.FORBIDDEN_MODULES)
+
+def test_data_options_before_and_after_the_command():
+    parser = cli.build_parser()
+    assert parser.parse_args(["movies", "--json"]).json
+    assert parser.parse_args(["--json", "movies"]).json
+    assert not parser.parse_args(["movies"]).json
+    assert parser.parse_args(["--movies", "a.json", "movies", "--compact"]).movies == "a.json"
@@ -1,10 +1,26 @@
 import streamlit as st
 import json
-from load_data import load_movies, load_users
+from data_layer import (get_catalog, get_context, get_data_version, get_movie_cards,
+                        get_precomputed_recommendations, get_result_cache, get_similarity_index,
+                        get_user_directory, cache_stats, pin_snapshot, result_cache_stats)
+import recommenders
+import hybrid
+from metrics import count, span
+from widgets import end_page, start_page, user_picker
 
-# Load data
-movies = load_movies("movies.json")
-users = load_users("users.json")
+start_page("user_recommendations")
+
+# Load data from one snapshot for the whole rerun; a new snapshot is built in
+# the background when the data files change
+with span("user_recommendations.load_data"):
+    pin_snapshot()
+    catalog = get_catalog()
+    directory = get_user_directory()
+    context = get_context()
+    precomputed = get_precomputed_recommendations()
+    movie_cards = get_movie_cards()
+    results = get_result_cache()
+    data_version = get_data_version()
 
 st.set_page_config(page_title="Movie Recommendation System", layout="wide")
 
@@ -48,9 +64,17 @@ st.write("Compare different recommendation algorithms to see which works best fo
 
 # User selection
 st.sidebar.header("👤 Select User")
-user_names = [user['name'] for user in users]
-selected_name = st.sidebar.selectbox("Choose a user:", user_names)
-selected_user = next((user for user in users if user['name'] == selected_name), None)
+# Searchable picker backed by the user directory's name index
+selected_user = user_picker(directory, "Choose a user:", "selected_user", st.sidebar)
+
+# Approximate similar-user search only scores users from the same LSH buckets
+approximate = st.sidebar.checkbox("⚡ Approximate similar-user search (MinHash/LSH)", value=False)
+with span("user_recommendations.load_data"):
+    similarity_index = get_similarity_index() if approximate else None
+
+with st.sidebar.expander("🗄️ Data Cache"):
+    st.write(cache_stats())
+    st.write({"results": result_cache_stats()})
 
 if selected_user:
     # Basic user profile
@@ -65,33 +89,32 @@ if selected_user:
     
     # Display user's watched movies
     with st.expander("🎞️ Your Watched Movies", expanded=False):
-        for movie_title in selected_user['watched_movies']:
-            movie = next((m for m in movies if m['title'] == movie_title), None)
-            if movie:
-                st.markdown(f"""
-                <div class="movie-card">
-                <p class="movie-title">{movie['title']}</p>
-                <p class="movie-details">
-                <b>Genre:</b> {', '.join(movie['genre'])}<br>
-                <b>Rating:</b> {'⭐' * int(movie['rating']//2)} ({movie['rating']})<br>
-                <b>Release Year:</b> {movie['release_year']}
-                </p>
-                </div>
-                """, unsafe_allow_html=True)
+        with span("user_recommendations.render"):
+            st.markdown(movie_cards.cards(catalog.lookup(selected_user['watched_movies'])), unsafe_allow_html=True)
     
-    # Prepare data for recommendations
-    watched_titles = set(selected_user['watched_movies'])
-    unwatched_movies = [m for m in movies if m['title'] not in watched_titles]
+    # User's genre preferences, kept up to date by the profile store
+    with span("user_recommendations.genre_profile"):
+        favorite_genres = context.profiles.favorite_genres(selected_user['user_id'])
     
-    # Calculate user's genre preferences
-    genre_counts = {}
-    for title in watched_titles:
-        movie = next((m for m in movies if m['title'] == title), None)
-        if movie:
-            for genre in movie['genre']:
-                genre_counts[genre] = genre_counts.get(genre, 0) + 1
+    # Serve the nightly batch results when they are up to date, otherwise compute
+    # live and keep the result for this user, data version and profile version
+    user_precomputed = precomputed.get(selected_user['user_id']) if precomputed else None
+    version = (data_version, context.profiles.version(selected_user['user_id']))
+    search_mode = "lsh" if similarity_index is not None else "exact"
+    def get_recommendations(strategy, k=3, **kwargs):
+        if user_precomputed is not None and strategy in user_precomputed:
+            return recommenders.from_stored(context, user_precomputed[strategy])
+        cache_key = f"{strategy}:{search_mode}" if strategy == "similar_users" else strategy
+        with span(f"user_recommendations.{strategy}"):
+            return results.get_or_compute(
+                selected_user['user_id'], cache_key, k, version,
+                lambda: recommenders.STRATEGIES[strategy](context, selected_user, k=k, **kwargs),
+            )
     
-    favorite_genres = sorted(genre_counts.items(), key=lambda x: x[1], reverse=True)
+    def show_recommendations(recommendations):
+        with span("user_recommendations.render"):
+            st.markdown(movie_cards.recommendations(recommendations), unsafe_allow_html=True)
+        count("user_recommendations.cards_rendered", len(recommendations))
     
     # RECOMMENDATION STRATEGY 1: Genre-based
     st.header("🎬 Strategy 1: Genre-Based Recommendations")
@@ -114,27 +137,11 @@ if selected_user:
         top_genre = favorite_genres[0][0]
         st.write(f"Based on your history, you seem to enjoy **{top_genre}** movies the most.")
         
-        # Get unwatched movies from favorite genre
-        for movie in unwatched_movies:
-            if top_genre in movie['genre']:
-                genre_recommendations.append(movie)
-        
-        # Sort by rating
-        genre_recommendations.sort(key=lambda x: x['rating'], reverse=True)
+        # Top-rated unwatched movies straight from the genre's leaderboard
+        genre_recommendations = get_recommendations("genre_based")
         
         if genre_recommendations:
-            for movie in genre_recommendations[:3]:
-                st.markdown(f"""
-                <div class="movie-card">
-                <p class="movie-title">{movie['title']}</p>
-                <p class="movie-details">
-                <b>Genre:</b> {', '.join(movie['genre'])}<br>
-                <b>Rating:</b> {'⭐' * int(movie['rating']//2)} ({movie['rating']})<br>
-                <b>Release Year:</b> {movie['release_year']}<br>
-                <b>Recommended because:</b> Contains your favorite genre ({top_genre})
-                </p>
-                </div>
-                """, unsafe_allow_html=True)
+            show_recommendations(genre_recommendations)
         else:
             st.write("No genre-based recommendations found.")
     
@@ -148,52 +155,24 @@ if selected_user:
     </div>
     """, unsafe_allow_html=True)
     
-    # Find similar users
-    similar_users = []
-    for user in users:
-        if user['name'] != selected_user['name']:
-            common_movies = set(user['watched_movies']).intersection(watched_titles)
-            if common_movies:
-                similar_users.append({
-                    'user': user,
-                    'common_movies': common_movies,
-                    'similarity_score': len(common_movies)
-                })
-    
-    similar_users.sort(key=lambda x: x['similarity_score'], reverse=True)
+    # Find similar users with one sparse matrix product (already sorted by overlap),
+    # or only among the LSH candidates when approximate search is on
+    with span("user_recommendations.find_similar_users"):
+        similar_users = results.get_or_compute(
+            selected_user['user_id'], f"find_similar_users:{search_mode}", None, version,
+            lambda: recommenders.find_similar_users(context, selected_user, index=similarity_index),
+        )
     
     if similar_users:
         st.write(f"Found {len(similar_users)} users with similar taste:")
         for i, sim_user in enumerate(similar_users[:2]):
             st.write(f"- {sim_user['user']['name']}: {sim_user['similarity_score']} movies in common")
         
-        # Get recommendations from similar users
-        collaborative_recommendations = []
-        for sim_user in similar_users[:2]:  # Use top 2 similar users
-            for movie_title in sim_user['user']['watched_movies']:
-                if movie_title not in watched_titles:
-                    movie = next((m for m in movies if m['title'] == movie_title), None)
-                    if movie and movie not in collaborative_recommendations:
-                        collaborative_recommendations.append({
-                            'movie': movie,
-                            'recommender': sim_user['user']['name'],
-                            'common_count': sim_user['similarity_score']
-                        })
+        # Get recommendations from the top 2 similar users
+        collaborative_recommendations = get_recommendations("similar_users", similar=similar_users)
         
         if collaborative_recommendations:
-            for rec in collaborative_recommendations[:3]:
-                movie = rec['movie']
-                st.markdown(f"""
-                <div class="movie-card">
-                <p class="movie-title">{movie['title']}</p>
-                <p class="movie-details">
-                <b>Genre:</b> {', '.join(movie['genre'])}<br>
-                <b>Rating:</b> {'⭐' * int(movie['rating']//2)} ({movie['rating']})<br>
-                <b>Release Year:</b> {movie['release_year']}<br>
-                <b>Recommended because:</b> Watched by {rec['recommender']}, who shares {rec['common_count']} movies with you
-                </p>
-                </div>
-                """, unsafe_allow_html=True)
+            show_recommendations(collaborative_recommendations)
         else:
             st.write("No recommendations found from similar users.")
     else:
@@ -208,22 +187,11 @@ if selected_user:
     </div>
     """, unsafe_allow_html=True)
     
-    # Sort unwatched movies by rating
-    rating_recommendations = sorted(unwatched_movies, key=lambda x: x['rating'], reverse=True)
+    # Take the highest-rated unwatched movies from the global leaderboard
+    rating_recommendations = get_recommendations("top_rated")
     
     if rating_recommendations:
-        for movie in rating_recommendations[:3]:
-            st.markdown(f"""
-            <div class="movie-card">
-            <p class="movie-title">{movie['title']}</p>
-            <p class="movie-details">
-            <b>Genre:</b> {', '.join(movie['genre'])}<br>
-            <b>Rating:</b> {'⭐' * int(movie['rating']//2)} ({movie['rating']})<br>
-            <b>Release Year:</b> {movie['release_year']}<br>
-            <b>Recommended because:</b> Among the highest-rated movies you haven't seen (Rating: {movie['rating']})
-            </p>
-            </div>
-            """, unsafe_allow_html=True)
+        show_recommendations(rating_recommendations)
     else:
         st.write("No top-rated recommendations found.")
     
@@ -238,34 +206,41 @@ if selected_user:
     
     # Get recent movies (2015 and newer) in favorite genres
     if favorite_genres:
-        top_two_genres = [genre for genre, _ in favorite_genres[:2]]
-        recent_recommendations = []
-        
-        for movie in unwatched_movies:
-            if (movie['release_year'] >= 2015 and 
-                any(genre in movie['genre'] for genre in top_two_genres)):
-                recent_recommendations.append(movie)
-        
-        # Sort by year (newest first)
-        recent_recommendations.sort(key=lambda x: x['release_year'], reverse=True)
+        recent_recommendations = get_recommendations("recent_releases")
         
         if recent_recommendations:
-            for movie in recent_recommendations[:3]:
-                matching_genres = [g for g in movie['genre'] if g in top_two_genres]
-                st.markdown(f"""
-                <div class="movie-card">
-                <p class="movie-title">{movie['title']}</p>
-                <p class="movie-details">
-                <b>Genre:</b> {', '.join(movie['genre'])}<br>
-                <b>Rating:</b> {'⭐' * int(movie['rating']//2)} ({movie['rating']})<br>
-                <b>Release Year:</b> {movie['release_year']}<br>
-                <b>Recommended because:</b> Recent release ({movie['release_year']}) in your preferred genres ({', '.join(matching_genres)})
-                </p>
-                </div>
-                """, unsafe_allow_html=True)
+            show_recommendations(recent_recommendations)
         else:
             st.write("No recent movie recommendations found.")
     
+    # RECOMMENDATION STRATEGY 5: Hybrid
+    st.header("🧪 Strategy 5: Hybrid Recommendations")
+    st.markdown("""
+    <div class="explanation">
+    <p><b>How it works:</b> This strategy scores every movie on genre match, similar users,
+    rating and recency at once, and blends the four scores with the weights below.</p>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    weight_columns = st.columns(len(hybrid.COMPONENTS))
+    hybrid_weights = {
+        name: column.slider(name.capitalize(), 0.0, 1.0, hybrid.DEFAULT_WEIGHTS[name], 0.05, key=f"hybrid_{name}")
+        for name, column in zip(hybrid.COMPONENTS, weight_columns)
+    }
+    weights_key = tuple(hybrid_weights[name] for name in hybrid.COMPONENTS)
+    with span("user_recommendations.hybrid"):
+        hybrid_recommendations = results.get_or_compute(
+            selected_user['user_id'], f"hybrid:{weights_key}", 3, version,
+            lambda: recommenders.hybrid(context, selected_user, k=3, weights=hybrid_weights),
+        )
+    
+    if hybrid_recommendations:
+        show_recommendations(hybrid_recommendations)
+    elif not any(hybrid_weights.values()):
+        st.write("Set at least one weight above 0 to blend the scores.")
+    else:
+        st.write("No hybrid recommendations found.")
+    
     # Final comparison
     st.header("🏆 Which Strategy Works Best?")
     st.write("""
@@ -275,6 +250,9 @@ if selected_user:
     - **Similar users** can help discover unexpected movies from people with similar taste
     - **Top-rated** ensures you don't miss critically acclaimed classics
     - **Recent releases** keeps you up to date with new content you might enjoy
+    - **Hybrid** weighs all of these signals at once, with the balance up to you
     
     The best approach often combines multiple strategies for diverse recommendations!
-    """) 
\ No newline at end of file
+    """)
+
+end_page()
@@ -0,0 +1,348 @@
+import argparse
+import fcntl
+import json
+import os
+import threading
+import time
+from load_data import load_catalog, load_users
+
+# Durable watch history without rewriting users.json.
+# users.json stays the base. Every change is one line appended to a log:
+#   {"seq": 42, "user_id": 101, "movie": "Inception", "action": "watch", "timestamp": 1760781600.0}
+# ("action" is "watch" or "unwatch"). An append is a write() to a file that is
+# already open, so recording an event costs the same however long the log is.
+# The write reaches the OS at once; a background thread fsyncs every
+# FSYNC_INTERVAL seconds, so one fsync covers every event appended since the
+# last one. wait(seq) blocks until an event is on disk.
+#
+# Layout of the log directory:
+#   events.jsonl             the active log, appended to
+#   events.compacting.jsonl  the previous log while it is being compacted
+#   snapshot.jsonl           {"last_seq": N}, then one line per changed user:
+#                            {"user_id", "added": [titles], "removed": [titles]}
+# After COMPACT_AFTER events the active log is renamed to
+# events.compacting.jsonl and a new one is started; a background thread folds
+# the renamed file into a new snapshot (written next to it and renamed over
+# it) and deletes it. Loading therefore reads one snapshot plus at most
+# COMPACT_AFTER events per log file, however many events were ever written.
+#
+# The snapshot keeps, per user, the titles watched on top of users.json and
+# the titles removed from it, so users.json is never needed to compact.
+# Readers go events -> compacting -> snapshot, the reverse of the way events
+# move, and skip events already in the snapshot (seq <= last_seq), so a
+# compaction running at the same time cannot hide an event from them.
+# One WatchLog writes to a directory at a time: it holds an exclusive flock()
+# on LOCK_FILE while open, and a second writer (another process, or a second
+# WatchLog in this one) fails with WatchLogLocked. Any number may read it.
+#
+#   python watch_log.py --watch 101 "Inception"   record an event
+#   python watch_log.py --compact                 fold the log into the snapshot
+
+WATCH_LOG_DIR = "watch_log"
+EVENTS_FILE = "events.jsonl"
+COMPACTING_FILE = "events.compacting.jsonl"
+SNAPSHOT_FILE = "snapshot.jsonl"
+LOCK_FILE = "writer.lock"
+FSYNC_INTERVAL = 0.05
+COMPACT_AFTER = 10000
+ACTIONS = ("watch", "unwatch")
+
+class WatchLogLocked(RuntimeError):
+    pass
+
+def events_file(directory=WATCH_LOG_DIR):
+    return os.path.join(directory, EVENTS_FILE)
+
+def _read_events(filename):
+    # Events of one log file; a last line cut off by a crash is ignored
+    events = []
+    try:
+        with open(filename, "r") as file:
+            for line in file:
+                if not line.endswith("\n"):
+                    break
+                events.append(json.loads(line))
+    except FileNotFoundError:
+        pass
+    return events
+
+def _read_snapshot(directory):
+    # (last_seq, {user_id: {"added": [...], "removed": [...]}})
+    try:
+        with open(os.path.join(directory, SNAPSHOT_FILE), "r") as file:
+            last_seq = json.loads(file.readline())["last_seq"]
+            changes = {}
+            for line in file:
+                change = json.loads(line)
+                changes[change["user_id"]] = {"added": change["added"], "removed": change["removed"]}
+    except FileNotFoundError:
+        return 0, {}
+    return last_seq, changes
+
+def _fold(changes, event):
+    # Apply one event to the per-user changes. A title watched again after
+    # being removed stays in "removed" and moves to the end of "added", which
+    # is where replaying the events on the list would put it.
+    change = changes.setdefault(event["user_id"], {"added": [], "removed": []})
+    title = event["movie"]
+    if event["action"] == "watch":
+        if title not in change["added"]:
+            change["added"].append(title)
+    else:
+        if title in change["added"]:
+            change["added"].remove(title)
+        if title not in change["removed"]:
+            change["removed"].append(title)
+
+def read_changes(directory=WATCH_LOG_DIR):
+    # (last seq, per-user changes) from the snapshot plus the log tail
+    tail = _read_events(events_file(directory))
+    tail = _read_events(os.path.join(directory, COMPACTING_FILE)) + tail
+    last_seq, changes = _read_snapshot(directory)
+    # An event read from both files (rotated while we read) is folded once;
+    # distinct events that share a seq are all kept
+    unique = {json.dumps(event, sort_keys=True): event for event in tail}
+    snapshot_seq = last_seq
+    for event in sorted(unique.values(), key=lambda e: e["seq"]):
+        if event["seq"] > snapshot_seq:
+            _fold(changes, event)
+            last_seq = max(last_seq, event["seq"])
+    return last_seq, changes
+
+def watched_movies(titles, change):
+    # A users.json history with one user's changes applied
+    removed = set(change["removed"])
+    history = [title for title in titles if title not in removed]
+    present = set(history)
+    return history + [title for title in change["added"] if title not in present]
+
+def apply_changes(users, changes):
+    # Users with changes get a new dict; users the file does not have are ignored
+    if not changes:
+        return users
+    result = []
+    for user in users:
+        change = changes.get(user["user_id"])
+        if change is not None:
+            user = dict(user, watched_movies=watched_movies(user["watched_movies"], change))
+        result.append(user)
+    return result
+
+def load_users_with_log(users_file="users.json", directory=WATCH_LOG_DIR):
+    # users.json plus everything recorded in the watch log
+    _, changes = read_changes(directory)
+    return apply_changes(load_users(users_file), changes)
+
+def _fsync_directory(directory):
+    # Makes a rename or a new file in the directory durable
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+class WatchLog:
+    def __init__(self, directory=WATCH_LOG_DIR, fsync_interval=FSYNC_INTERVAL, compact_after=COMPACT_AFTER):
+        self.directory = directory
+        self.compact_after = compact_after
+        os.makedirs(directory, exist_ok=True)
+        # Taken before anything is read, so the seq counter below is ours alone
+        self.lock_file = open(os.path.join(directory, LOCK_FILE), "a")
+        try:
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self.lock_file.close()
+            raise WatchLogLocked(f"Another writer has the watch log {directory!r} open") from None
+        self.lock = threading.Lock()
+        # Held while fsyncing or swapping the active file, so neither sees a closed file
+        self.file_lock = threading.Lock()
+        self.synced = threading.Condition(threading.Lock())
+        self.compact_lock = threading.Lock()
+        self.seq, _ = read_changes(directory)
+        self.synced_seq = self.seq
+        self.tail_events = len(_read_events(events_file(directory)))
+        self.compaction = None
+        self.file = self._open_active()
+        # A pending compaction from before a restart is finished now
+        if os.path.exists(os.path.join(directory, COMPACTING_FILE)):
+            self.compact_in_background()
+        self.stopped = threading.Event()
+        self.flusher = None
+        if fsync_interval:
+            self.flusher = threading.Thread(target=self._flush_loop, args=(fsync_interval,), daemon=True)
+            self.flusher.start()
+
+    def _open_active(self):
+        # Drop a line cut off by a crash, so the next event starts on a new line
+        path = events_file(self.directory)
+        if os.path.exists(path):
+            with open(path, "rb+") as file:
+                data = file.read()
+                if data and not data.endswith(b"\n"):
+                    file.truncate(data.rfind(b"\n") + 1)
+        file = open(path, "a")
+        _fsync_directory(self.directory)
+        return file
+
+    def append(self, user_id, movie, action="watch", timestamp=None):
+        # Record one event and return its sequence number; durable after wait(seq)
+        if action not in ACTIONS:
+            raise ValueError(f"Unknown action: {action!r} (expected one of {', '.join(ACTIONS)})")
+        with self.lock:
+            self.seq += 1
+            event = {
+                "seq": self.seq,
+                "user_id": user_id,
+                "movie": movie,
+                "action": action,
+                "timestamp": time.time() if timestamp is None else timestamp,
+            }
+            self.file.write(json.dumps(event) + "\n")
+            self.file.flush()
+            self.tail_events += 1
+            seq = self.seq
+            if self.tail_events >= self.compact_after:
+                self.compact_in_background()
+        if self.flusher is None:
+            self.sync()
+        return seq
+
+    def watch(self, user_id, titles):
+        # Sequence number of the last event, None when titles is empty
+        seq = None
+        for title in titles:
+            seq = self.append(user_id, title, "watch")
+        return seq
+
+    def unwatch(self, user_id, titles):
+        seq = None
+        for title in titles:
+            seq = self.append(user_id, title, "unwatch")
+        return seq
+
+    def sync(self):
+        # fsync everything appended so far
+        with self.file_lock:
+            with self.lock:
+                seq = self.seq
+                if seq <= self.synced_seq:
+                    return
+                fd = self.file.fileno()
+            os.fsync(fd)
+        with self.synced:
+            self.synced_seq = max(self.synced_seq, seq)
+            self.synced.notify_all()
+
+    def wait(self, seq, timeout=None):
+        # Block until event seq is on disk (one background fsync covers many waiters)
+        if seq is None:
+            return True
+        if self.flusher is None:
+            self.sync()
+        with self.synced:
+            return self.synced.wait_for(lambda: self.synced_seq >= seq, timeout)
+
+    def _flush_loop(self, interval):
+        while not self.stopped.wait(interval):
+            self.sync()
+
+    def _rotate(self):
+        # Start a new active file; the old one becomes the file to compact
+        with self.file_lock:
+            with self.lock:
+                self.file.flush()
+                os.fsync(self.file.fileno())
+                self.file.close()
+                os.replace(events_file(self.directory), os.path.join(self.directory, COMPACTING_FILE))
+                self.file = open(events_file(self.directory), "a")
+                self.tail_events = 0
+            _fsync_directory(self.directory)
+
+    def compact(self):
+        # Fold the log into a new snapshot. Appends continue meanwhile, into
+        # the new active file.
+        with self.compact_lock:
+            compacting = os.path.join(self.directory, COMPACTING_FILE)
+            if not os.path.exists(compacting):
+                self._rotate()
+            last_seq, changes = _read_snapshot(self.directory)
+            for event in _read_events(compacting):
+                if event["seq"] > last_seq:
+                    _fold(changes, event)
+                    last_seq = event["seq"]
+            snapshot = os.path.join(self.directory, SNAPSHOT_FILE)
+            temporary = f"{snapshot}.{os.getpid()}.tmp"
+            with open(temporary, "w") as file:
+                file.write(json.dumps({"last_seq": last_seq}) + "\n")
+                for user_id, change in changes.items():
+                    file.write(json.dumps({"user_id": user_id, **change}) + "\n")
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temporary, snapshot)
+            _fsync_directory(self.directory)
+            os.remove(compacting)
+            return last_seq
+
+    def compact_in_background(self):
+        if self.compaction is not None and self.compaction.is_alive():
+            return self.compaction
+        self.compaction = threading.Thread(target=self.compact, daemon=True)
+        self.compaction.start()
+        return self.compaction
+
+    def close(self):
+        self.stopped.set()
+        if self.flusher is not None:
+            self.flusher.join()
+        if self.compaction is not None:
+            self.compaction.join()
+        self.sync()
+        with self.lock:
+            self.file.close()
+        # Closing the file releases the flock
+        self.lock_file.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record watch events and compact the watch log.")
+    parser.add_argument("--dir", default=WATCH_LOG_DIR)
+    parser.add_argument("--users", default="users.json")
+    parser.add_argument("--movies", default="movies.json")
+    parser.add_argument("--watch", nargs="+", metavar=("USER_ID", "TITLE"), help="record watched movies for a user")
+    parser.add_argument("--unwatch", nargs="+", metavar=("USER_ID", "TITLE"), help="remove movies from a user's history")
+    parser.add_argument("--compact", action="store_true", help="fold the log into the snapshot")
+    args = parser.parse_args()
+
+    # Nothing is appended unless every user and title is known
+    requests = [(action, values) for action, values in (("watch", args.watch), ("unwatch", args.unwatch)) if values]
+    if requests:
+        user_ids = {user["user_id"] for user in load_users(args.users)}
+        catalog = load_catalog(args.movies)
+    for action, values in requests:
+        if len(values) < 2:
+            parser.error(f"--{action} needs a user ID and at least one title")
+        try:
+            user_id = int(values[0])
+        except ValueError:
+            parser.error(f"--{action}: user ID must be an integer, got {values[0]!r}")
+        if user_id not in user_ids:
+            parser.error(f"--{action}: no user with ID {user_id} in {args.users}")
+        unknown = [title for title in values[1:] if catalog.movie_id(title) is None]
+        if unknown:
+            parser.error(f"--{action}: not in {args.movies}: {', '.join(unknown)}")
+
+    log = WatchLog(args.dir, fsync_interval=None)
+    for action, values in requests:
+        for title in values[1:]:
+            log.append(int(values[0]), title, action)
+    if args.compact:
+        log.compact()
+    log.close()
+
+    last_seq, changes = read_changes(args.dir)
+    print(f"{last_seq} events, {len(changes)} users changed, "
+          f"{len(_read_events(events_file(args.dir)))} events since the last compaction")
+    if args.watch or args.unwatch:
+        user_id = int((args.watch or args.unwatch)[0])
+        for user in load_users_with_log(args.users, args.dir):
+            if user["user_id"] == user_id:
+                print(f"{user['name']}: {', '.join(user['watched_movies'])}")
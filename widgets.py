@@ -0,0 +1,62 @@
+import streamlit as st
+from data_layer import release_snapshot
+from metrics import EXPORT_FILE, abandon_run, finish_run, metrics, start_run
+
+# Streamlit widgets shared by the pages.
+
+PICKER_LIMIT = 50
+
+def user_picker(directory, label, key, container=st, limit=PICKER_LIMIT):
+    # Searchable user picker: the selectbox only lists the users whose name
+    # matches the search box (at most `limit`), never the whole user base.
+    # Returns the selected user dict, or None when nothing matches.
+    query = container.text_input("Search users by name", "", key=f"{key}_search",
+                                 placeholder="Type part of a name")
+    rows = directory.search(query, limit)
+    if not rows:
+        container.caption("No users match your search.")
+        return None
+    if len(rows) == limit:
+        container.caption(f"Showing the first {limit} matches, type more to narrow it down.")
+    selected_label = container.selectbox(label, [directory.label(row) for row in rows], key=key)
+    return directory.from_label(selected_label)
+
+def metrics_panel(run, container=st.sidebar):
+    # Toggleable timing panel: where the last rerun's time went and the rolling
+    # p50/p95 of every stage in this process. Call after finish_run().
+    if not container.checkbox("⏱️ Show timings", value=False, key="show_timings"):
+        return
+    summary = metrics.summary()
+    container.caption(f"Last rerun of {run.page}: {run.total_ms:.1f} ms")
+    container.table([
+        {
+            "stage": stage,
+            "last rerun (ms)": round(ms, 2),
+            "p50 (ms)": round(summary[stage]["p50_ms"], 2),
+            "p95 (ms)": round(summary[stage]["p95_ms"], 2),
+        }
+        for stage, ms in run.stages.items()
+    ])
+    with container.expander("All stages and counters"):
+        st.write(summary)
+        st.write(metrics.counter_values())
+    # The file is fixed by metrics.EXPORT_FILE; auto-export is metrics.AUTO_EXPORT
+    if container.button(f"Export metrics to {EXPORT_FILE}", key="metrics_export_now"):
+        metrics.export(EXPORT_FILE)
+        container.caption(f"Wrote {EXPORT_FILE}")
+
+def start_page(page):
+    # Call at the top of a page, with end_page() at the bottom. Streamlit runs
+    # the reruns of a session one after another on the same script thread, and
+    # a rerun stopped part-way (a widget changed, the page raised) never gets
+    # to end_page(): its pinned snapshot and unfinished metrics run are still
+    # on this thread, so they are dropped here. Once the thread exits, its
+    # thread-locals go with it.
+    release_snapshot()
+    abandon_run()
+    return start_run(page)
+
+def end_page():
+    # Releases the rerun's snapshot, records its timings and draws the panel
+    release_snapshot()
+    metrics_panel(finish_run())